@@ -0,0 +1,91 @@
+"""PieceTable edits, line reads and save snapshots vs a plain string buffer
+
+A plain str is what get('1.0', 'end') hands back: every edit or snapshot
+copies the whole document. The piece table only touches the pieces
+around an edit.
+
+    python benchmarks/bench_document.py
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from notepad import LineIndex, PieceTable
+
+from bench_highlight import make_lines
+
+
+def make_edits(length, count, seed=1):
+    """Typing bursts at random places: (offset, text) inserts and (offset, n) deletes"""
+    rng = random.Random(seed)
+    edits = []
+    for _ in range(count // 20):
+        offset = rng.randrange(length)
+        for step in range(20):
+            if rng.random() < 0.8:
+                edits.append(('i', offset + step, rng.choice("abc \n")))
+            else:
+                edits.append(('d', offset + step, 1))
+        length += 20
+    return edits
+
+
+def string_edits(text, edits):
+    """Apply edits by rebuilding a str each time"""
+    for operation, offset, value in edits:
+        if operation == 'i':
+            text = text[:offset] + value + text[offset:]
+        else:
+            text = text[:offset] + text[offset + value:]
+    return text
+
+
+def piece_edits(text, edits):
+    """Apply the same edits to a PieceTable"""
+    document = PieceTable(text)
+    for operation, offset, value in edits:
+        if operation == 'i':
+            document.insert(offset, value)
+        else:
+            document.delete(offset, value)
+    return document
+
+
+def read_lines(document, index, line_numbers):
+    """Slice single lines out of the model, as the highlighter does"""
+    for line in line_numbers:
+        start = index.line_to_offset(line)
+        document.slice(start, start + index.line_length(line))
+
+
+def timed(func, *args):
+    """Seconds taken by one call"""
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+
+def main():
+    print(f"{'lines':>8} {'str edits':>10} {'piece edits':>12} {'1k line reads':>14} {'snapshot':>9}  (ms)")
+    for line_count in (10000, 100000, 500000):
+        text = '\n'.join(make_lines(line_count))
+        edits = make_edits(len(text), 2000)
+        
+        string_time = timed(string_edits, text, edits)
+        piece_time = timed(piece_edits, text, edits)
+        
+        document = piece_edits(text, edits)
+        index = LineIndex(document.text())
+        line_numbers = random.Random(2).sample(range(1, index.line_count + 1), 1000)
+        read_time = timed(read_lines, document, index, line_numbers)
+        snapshot_time = timed(document.snapshot)
+        
+        print(f"{line_count:>8} {string_time * 1000:>10.1f} {piece_time * 1000:>12.1f} "
+              f"{read_time * 1000:>14.2f} {snapshot_time * 1000:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
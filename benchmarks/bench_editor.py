@@ -0,0 +1,258 @@
+"""Editor hot paths driven through a real ModernNotepad with its window withdrawn
+
+Workloads (seconds, lower is better):
+
+    open_<n>mb          open an n MB text file until it is fully loaded
+                        (100 MB is past the large-file threshold, so that
+                        one is the read-only indexing path)
+    highlight_full      apply_syntax_highlighting over a 20,000 line file
+                        until no line is left dirty
+    typing_per_key      one keystroke in code mode on screen: the edit hook,
+                        the refreshes its key release schedules (highlighting,
+                        line numbers, status) run without their delay, and
+                        the redraw
+    spreadsheet_create  switching to spreadsheet mode the first time
+    spreadsheet_paste   paste_to_cells with a 1,000 x 20 block
+    save_csv, save_xlsx save_spreadsheet_data for that sheet
+    image_paste         pasting a 1920x1080 picture until it is stored
+
+Results are printed as JSON and optionally written to --output. With
+--baseline the run is compared against stored results and exits with
+status 1 if any workload got slower than the tolerance allows:
+
+    python benchmarks/bench_editor.py --save-baseline benchmarks/baseline.json
+    python benchmarks/bench_editor.py --baseline benchmarks/baseline.json
+
+Tk needs a display; on Linux without one the script re-runs itself under
+xvfb-run if it is installed.
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Keep recovery files, spilled tabs and the instance socket out of the real home folder
+HOME = tempfile.mkdtemp(prefix='notepad-bench-')
+os.environ['HOME'] = os.environ['USERPROFILE'] = HOME
+
+import notepad
+from bench_highlight import make_lines
+
+# A workload is a regression if it is this much slower than the baseline
+# and slower by more than the noise floor
+DEFAULT_TOLERANCE = 0.25
+NOISE_FLOOR_SECONDS = 0.005
+
+
+def pump(app, done, timeout=600):
+    """Run the Tk event loop until done() is true"""
+    deadline = time.perf_counter() + timeout
+    while not done():
+        if time.perf_counter() > deadline:
+            raise TimeoutError("workload did not finish")
+        app.root.update()
+        time.sleep(0.001)
+
+
+def flush_updates(app):
+    """Run the scheduler's pending refreshes now instead of after their delay"""
+    for delay, job in list(app.scheduler.jobs.items()):
+        app.root.after_cancel(job)
+        app.scheduler.flush(delay)
+
+
+def make_app():
+    """Create an editor whose window is never shown"""
+    app = notepad.ModernNotepad()
+    app.root.withdraw()
+    app.root.update()
+    return app
+
+
+def make_text_file(folder, size_mb):
+    """Write a file of roughly size_mb megabytes of code-like lines"""
+    path = os.path.join(folder, f"text_{size_mb}mb.txt")
+    block = '\n'.join(make_lines(7000)) + '\n'
+    with open(path, 'w', encoding='utf-8') as file:
+        for _ in range(max(1, size_mb * 1024 * 1024 // len(block))):
+            file.write(block)
+    return path
+
+
+def bench_open(folder, size_mb):
+    """Time opening a text file until it has fully loaded"""
+    path = make_text_file(folder, size_mb)
+    app = make_app()
+    try:
+        started = time.perf_counter()
+        app.open_path(path)
+        if app.large_file:
+            pump(app, lambda: app.large_file.line_count)
+        else:
+            pump(app, lambda: app.text_load_job is None)
+        return time.perf_counter() - started
+    finally:
+        app.root.destroy()
+        os.remove(path)
+
+
+def bench_code_mode(folder):
+    """Time a full highlight pass, then a burst of typing"""
+    path = os.path.join(folder, 'code.py')
+    with open(path, 'w', encoding='utf-8') as file:
+        file.write('\n'.join(make_lines(20000)))
+    app = make_app()
+    try:
+        app.open_path(path)
+        pump(app, lambda: app.text_load_job is None)
+        app.switch_to_code_mode()
+        pump(app, lambda: not app.highlighter.dirty)
+
+        started = time.perf_counter()
+        app.apply_syntax_highlighting()
+        pump(app, lambda: not app.highlighter.dirty)
+        highlight = time.perf_counter() - started
+
+        app.text_area.mark_set('insert', '10000.0')
+        app.text_area.see('insert')
+        app.root.update()
+        keys = "result = compute(value, 3)  # typed\n" * 5
+        started = time.perf_counter()
+        for key in keys:
+            # The path a keystroke takes: the insert, then the key release
+            app.text_area.insert('insert', key)
+            app.text_area.see('insert')
+            app.text_area.event_generate('<KeyRelease>')
+            flush_updates(app)
+            app.root.update()
+        per_key = (time.perf_counter() - started) / len(keys)
+        return {'highlight_full': highlight, 'typing_per_key': per_key}
+    finally:
+        app.root.destroy()
+
+
+def bench_spreadsheet(folder):
+    """Time creating the grid, pasting a block and saving it"""
+    app = make_app()
+    results = {}
+    try:
+        started = time.perf_counter()
+        app.switch_to_spreadsheet_mode()
+        app.root.update()
+        results['spreadsheet_create'] = time.perf_counter() - started
+
+        block = '\n'.join('\t'.join(f"r{row}c{col}" for col in range(20)) for row in range(1000))
+        app.root.clipboard_clear()
+        app.root.clipboard_append(block)
+        app.active_cell = (1, 1)
+        started = time.perf_counter()
+        app.paste_to_cells(SimpleNamespace(widget=app.root))
+        app.root.update()
+        results['spreadsheet_paste'] = time.perf_counter() - started
+
+        formats = ['csv']
+        try:
+            import openpyxl
+            formats.append('xlsx')
+        except ImportError:
+            print("openpyxl is not installed; skipping save_xlsx", file=sys.stderr)
+        for extension in formats:
+            path = os.path.join(folder, f"sheet.{extension}")
+            started = time.perf_counter()
+            app.save_spreadsheet_data(path, "Saved")
+            pump(app, lambda: app.save_job is None)
+            results[f"save_{extension}"] = time.perf_counter() - started
+        return results
+    finally:
+        app.root.destroy()
+
+
+def bench_image_paste():
+    """Time pasting a large picture until it is resized, encoded and cached"""
+    from PIL import Image
+    image = Image.effect_noise((1920, 1080), 64).convert('RGB')
+    app = make_app()
+    try:
+        started = time.perf_counter()
+        app.paste_image(image)
+        pump(app, lambda: app.embedded_images)
+        return time.perf_counter() - started
+    finally:
+        app.root.destroy()
+
+
+def run_workloads(sizes):
+    """Run every workload and return {name: seconds}"""
+    results = {}
+    with tempfile.TemporaryDirectory() as folder:
+        for size_mb in sizes:
+            results[f"open_{size_mb}mb"] = bench_open(folder, size_mb)
+        results.update(bench_code_mode(folder))
+        results.update(bench_spreadsheet(folder))
+        results['image_paste'] = bench_image_paste()
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Print each workload against its baseline; returns the names that regressed"""
+    regressions = []
+    print(f"{'workload':<20} {'baseline (ms)':>14} {'now (ms)':>10} {'change':>8}")
+    for name, seconds in results.items():
+        before = baseline.get(name)
+        if before is None:
+            print(f"{name:<20} {'-':>14} {seconds * 1000:>10.2f}")
+            continue
+        change = seconds / before - 1 if before else 0.0
+        regressed = change > tolerance and seconds - before > NOISE_FLOOR_SECONDS
+        if regressed:
+            regressions.append(name)
+        print(f"{name:<20} {before * 1000:>14.2f} {seconds * 1000:>10.2f} {change:>+7.0%}"
+              + ("  REGRESSION" if regressed else ""))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark editor hot paths")
+    parser.add_argument('--sizes', default='1,10,100', help="file sizes to open, in MB")
+    parser.add_argument('--output', help="write the results to this JSON file")
+    parser.add_argument('--baseline', help="compare against results stored in this JSON file")
+    parser.add_argument('--save-baseline', help="store the results as the new baseline")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help="allowed slowdown before a workload counts as a regression")
+    arguments = parser.parse_args()
+
+    if sys.platform.startswith('linux') and not os.environ.get('DISPLAY'):
+        shutil.rmtree(HOME, ignore_errors=True)
+        if shutil.which('xvfb-run') and not os.environ.get('NOTEPAD_BENCH_XVFB'):
+            os.environ['NOTEPAD_BENCH_XVFB'] = '1'
+            os.execvp('xvfb-run', ['xvfb-run', '-a', sys.executable] + sys.argv)
+        print("No display: run under Xvfb (xvfb-run) or on a desktop session", file=sys.stderr)
+        return 2
+
+    try:
+        results = run_workloads([int(size) for size in arguments.sizes.split(',') if size])
+    finally:
+        shutil.rmtree(HOME, ignore_errors=True)
+    print(json.dumps(results, indent=2))
+    for path in (arguments.output, arguments.save_baseline):
+        if path:
+            with open(path, 'w', encoding='utf-8') as file:
+                json.dump(results, file, indent=2)
+
+    if arguments.baseline:
+        with open(arguments.baseline, encoding='utf-8') as file:
+            regressions = compare(results, json.load(file), arguments.tolerance)
+        if regressions:
+            print(f"Slower than the baseline: {', '.join(regressions)}", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,62 @@
+"""Per-keystroke cost of code-mode highlighting as the file grows
+
+Runs headless: the highlighter is fed lines from a list instead of a Tk
+widget, so only the lexing and bookkeeping cost is measured.
+
+    python benchmarks/bench_highlight.py
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from notepad import SyntaxHighlighter
+
+SAMPLE = [
+    'def compute(value, factor=2):',
+    '    """Scale a value"""',
+    '    result = value * factor + 10  # adjust',
+    '    if result > 100 and not value:',
+    "        return 'big'",
+    '    return result',
+    '',
+]
+
+
+def make_lines(count):
+    """Build a synthetic Python file of the given length"""
+    return [SAMPLE[n % len(SAMPLE)] for n in range(count)]
+
+
+def bench(line_count, keystrokes=200):
+    """Return (full pass seconds, mean seconds per keystroke)"""
+    lines = make_lines(line_count)
+    highlighter = SyntaxHighlighter("Python", line_count)
+    get_line = lambda n: lines[n - 1]
+    apply_tokens = lambda n, tokens: None
+    
+    start = time.perf_counter()
+    highlighter.highlight(get_line, apply_tokens)
+    full_pass = time.perf_counter() - start
+    
+    # Type characters into a line in the middle of the file
+    line = line_count // 2
+    start = time.perf_counter()
+    for _ in range(keystrokes):
+        lines[line - 1] += 'x'
+        highlighter.lines_inserted(line, 0)
+        highlighter.highlight(get_line, apply_tokens)
+    per_key = (time.perf_counter() - start) / keystrokes
+    return full_pass, per_key
+
+
+def main():
+    print(f"{'lines':>8} {'full pass (ms)':>15} {'per keystroke (ms)':>19}")
+    for line_count in (1000, 10000, 100000):
+        full_pass, per_key = bench(line_count)
+        print(f"{line_count:>8} {full_pass * 1000:>15.1f} {per_key * 1000:>19.3f}")
+
+
+if __name__ == "__main__":
+    main()
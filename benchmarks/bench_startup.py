@@ -0,0 +1,95 @@
+"""Time from launch to the first drawn window, and what startup imports
+
+Each run is a fresh interpreter that imports notepad, builds the window
+and lets Tk lay it out and draw it once. It runs with an empty home
+folder, so no recovery prompt or running instance gets in the way.
+Modules that should only load on first use (Pillow, openpyxl, zipfile,
+the process pool) are reported if startup pulled them in.
+
+    python benchmarks/bench_startup.py [--runs 5] [--budget-ms 400]
+
+Exits with status 1 if the editor fails to start, the median time to the
+first window is over the budget or a deferred module was imported, so it
+can gate a build. It needs a display; without one it exits with status 2.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Imported only when a feature that needs them is first used
+DEFERRED_MODULES = ('PIL', 'openpyxl', 'zipfile', 'multiprocessing', 'concurrent.futures')
+
+CHILD = """
+import json, sys, time
+started = time.perf_counter()
+import notepad
+imported = time.perf_counter()
+app = notepad.ModernNotepad()
+built = time.perf_counter()
+app.root.update()
+shown = time.perf_counter()
+loaded = [prefix for prefix in sys.argv[1:]
+          if any(name == prefix or name.startswith(prefix + '.') for name in sys.modules)]
+app.root.destroy()
+print(json.dumps({'import': imported - started, 'construct': built - imported,
+                  'first_draw': shown - built, 'window': shown - started, 'deferred': loaded}))
+"""
+
+
+def run_once(home):
+    """Launch one interpreter; returns its timings and the wall time of the whole process"""
+    environment = dict(os.environ, HOME=home, USERPROFILE=home)
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable, '-c', CHILD, *DEFERRED_MODULES], cwd=ROOT,
+                            env=environment, capture_output=True, text=True)
+    wall = time.perf_counter() - started
+    if result.returncode:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr else "failed")
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+    timings['process'] = wall
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--budget-ms', type=float, default=None,
+                        help="fail if the median time to the first window is over this")
+    arguments = parser.parse_args()
+
+    if sys.platform.startswith('linux') and not (os.environ.get('DISPLAY') or os.environ.get('WAYLAND_DISPLAY')):
+        print("No display: run under Xvfb (xvfb-run) or on a desktop session", file=sys.stderr)
+        return 2
+
+    with tempfile.TemporaryDirectory() as home:
+        try:
+            runs = [run_once(home) for _ in range(arguments.runs)]
+        except RuntimeError as e:
+            print(f"Could not start the editor: {e}", file=sys.stderr)
+            return 1
+
+    print(f"Startup over {arguments.runs} runs (median)")
+    for phase in ('import', 'construct', 'first_draw', 'window', 'process'):
+        print(f"  {phase:<12}{statistics.median(run[phase] for run in runs) * 1000:8.1f} ms")
+
+    failed = False
+    deferred = sorted({name for run in runs for name in run['deferred']})
+    if deferred:
+        print(f"Imported at startup but meant to be deferred: {', '.join(deferred)}")
+        failed = True
+    window_ms = statistics.median(run['window'] for run in runs) * 1000
+    if arguments.budget_ms is not None and window_ms > arguments.budget_ms:
+        print(f"Over budget: {window_ms:.1f} ms > {arguments.budget_ms:.1f} ms")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,76 @@
+"""Compiled single-pass tokenizer vs the old per-keyword regex loops
+
+The legacy function below is the tag-collection part of the original
+apply_syntax_highlighting with the Tk calls removed, kept here as the
+reference point.
+
+    python benchmarks/bench_tokenizer.py
+"""
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from notepad import LANGUAGE_KEYWORDS, SyntaxHighlighter
+
+from bench_highlight import make_lines
+
+
+def legacy_tokenize(lines, keywords):
+    """Original O(lines x keywords) loop"""
+    tokens = []
+    for line_num, line in enumerate(lines, 1):
+        for keyword in keywords:
+            pattern = r'\b' + re.escape(keyword) + r'\b'
+            for match in re.finditer(pattern, line):
+                tokens.append(('keyword', line_num, match.start(), match.end()))
+        for pattern in [r'".*?"', r"'.*?'"]:
+            for match in re.finditer(pattern, line):
+                tokens.append(('string', line_num, match.start(), match.end()))
+        comment_match = re.search(r'#.*$', line)
+        if comment_match:
+            tokens.append(('comment', line_num, comment_match.start(), comment_match.end()))
+        for match in re.finditer(r'\b\d+\.?\d*\b', line):
+            tokens.append(('number', line_num, match.start(), match.end()))
+        func_match = re.search(r'def\s+(\w+)', line)
+        if func_match:
+            tokens.append(('function', line_num, func_match.start(1), func_match.end(1)))
+    return tokens
+
+
+def compiled_tokenize(lines, language):
+    """Single compiled alternation per language"""
+    highlighter = SyntaxHighlighter(language)
+    tokens = []
+    state = None
+    for line in lines:
+        line_tokens, state = highlighter.tokenize_line(line, state)
+        tokens.extend(line_tokens)
+    return tokens
+
+
+def timed(func, *args, repeat=3):
+    """Best of several runs, in seconds"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    keywords = LANGUAGE_KEYWORDS["Python"]
+    print(f"{'lines':>8} {'legacy (ms)':>12} {'compiled (ms)':>14} {'speedup':>8}")
+    for line_count in (1000, 10000, 50000):
+        lines = make_lines(line_count)
+        legacy = timed(legacy_tokenize, lines, keywords)
+        compiled = timed(compiled_tokenize, lines, "Python")
+        print(f"{line_count:>8} {legacy * 1000:>12.1f} {compiled * 1000:>14.1f} {legacy / compiled:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
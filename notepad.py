@@ -1,13 +1,1994 @@
+import time
+# Taken before the other imports so --profile-startup can report their cost
+STARTUP_STARTED = time.perf_counter()
 import tkinter as tk
-from tkinter import ttk, filedialog, messagebox, font
+from tkinter import ttk, filedialog, messagebox, font, simpledialog
 import os
-from PIL import Image, ImageTk, ImageGrab
+import sys
+import socket
+import argparse
+import csv
+import mmap
+import shutil
+import queue
+import threading
 import io
 import re
+import json
+import hashlib
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict, deque
+from itertools import accumulate
+from functools import lru_cache
 
-class ModernNotepad:
+# Keywords highlighted in code mode, keyed by language name
+LANGUAGE_KEYWORDS = {
+    "Python": ['def', 'class', 'if', 'else', 'elif', 'for', 'while', 'try', 'except', 
+              'finally', 'with', 'as', 'import', 'from', 'return', 'yield', 'break', 
+              'continue', 'pass', 'and', 'or', 'not', 'in', 'is', 'lambda', 'True', 
+              'False', 'None', 'self', 'super', 'print'],
+    
+    "JavaScript": ['function', 'var', 'let', 'const', 'if', 'else', 'for', 'while', 'do', 
+                 'switch', 'case', 'default', 'break', 'continue', 'return', 'try', 
+                 'catch', 'finally', 'throw', 'new', 'this', 'typeof', 'instanceof', 
+                 'null', 'undefined', 'true', 'false', 'class', 'extends', 'super', 
+                 'import', 'export', 'async', 'await'],
+    
+    "Java": ['abstract', 'assert', 'boolean', 'break', 'byte', 'case', 'catch', 'char', 
+            'class', 'const', 'continue', 'default', 'do', 'double', 'else', 'enum', 
+            'extends', 'final', 'finally', 'float', 'for', 'if', 'implements', 'import', 
+            'instanceof', 'int', 'interface', 'long', 'native', 'new', 'package', 'private', 
+            'protected', 'public', 'return', 'short', 'static', 'strictfp', 'super', 'switch', 
+            'synchronized', 'this', 'throw', 'throws', 'transient', 'try', 'void', 'volatile', 'while'],
+    
+    "C++": ['auto', 'break', 'case', 'char', 'class', 'const', 'continue', 'default', 
+           'delete', 'do', 'double', 'else', 'enum', 'extern', 'float', 'for', 'friend', 
+           'goto', 'if', 'inline', 'int', 'long', 'namespace', 'new', 'operator', 'private', 
+           'protected', 'public', 'register', 'return', 'short', 'signed', 'sizeof', 'static', 
+           'struct', 'switch', 'template', 'this', 'throw', 'try', 'typedef', 'union', 
+           'unsigned', 'virtual', 'void', 'volatile', 'while'],
+    
+    "SQL": ['SELECT', 'FROM', 'WHERE', 'INSERT', 'UPDATE', 'DELETE', 'CREATE', 'ALTER', 
+           'DROP', 'TABLE', 'DATABASE', 'VIEW', 'INDEX', 'JOIN', 'INNER', 'LEFT', 'RIGHT', 
+           'FULL', 'OUTER', 'ON', 'GROUP', 'BY', 'HAVING', 'ORDER', 'ASC', 'DESC', 'LIMIT', 
+           'OFFSET', 'UNION', 'ALL', 'AS', 'DISTINCT', 'INTO', 'VALUES', 'SET', 'CONSTRAINT', 
+           'PRIMARY', 'KEY', 'FOREIGN', 'REFERENCES', 'NOT', 'NULL', 'DEFAULT', 'AUTO_INCREMENT']
+}
+
+# File extension for each language, used by Save As and Find in Files
+LANGUAGE_EXTENSIONS = {
+    "Python": ".py",
+    "JavaScript": ".js",
+    "HTML": ".html",
+    "CSS": ".css",
+    "Java": ".java",
+    "C++": ".cpp",
+    "C#": ".cs",
+    "PHP": ".php",
+    "Ruby": ".rb",
+    "Go": ".go",
+    "Swift": ".swift",
+    "TypeScript": ".ts",
+    "SQL": ".sql",
+    "Rust": ".rs",
+    "Kotlin": ".kt",
+    "Bash": ".sh",
+    "PowerShell": ".ps1",
+    "XML": ".xml",
+    "JSON": ".json",
+    "YAML": ".yml"
+}
+
+# Comment and multi-line delimiters per language. "blocks" lists
+# (opener, closer, tag) triples that may span several lines; an open block
+# is the lexer state carried from one line to the next.
+C_STYLE_SYNTAX = {"line_comments": ['//'], "blocks": [('/*', '*/', 'comment')]}
+LANGUAGE_SYNTAX = {
+    "Python": {"line_comments": ['#'],
+               "blocks": [('"""', '"""', 'string'), ("'''", "'''", 'string')]},
+    "JavaScript": C_STYLE_SYNTAX,
+    "TypeScript": C_STYLE_SYNTAX,
+    "Java": C_STYLE_SYNTAX,
+    "C++": C_STYLE_SYNTAX,
+    "C#": C_STYLE_SYNTAX,
+    "Go": C_STYLE_SYNTAX,
+    "Swift": C_STYLE_SYNTAX,
+    "Rust": C_STYLE_SYNTAX,
+    "Kotlin": C_STYLE_SYNTAX,
+    "CSS": {"line_comments": [], "blocks": [('/*', '*/', 'comment')]},
+    "PHP": {"line_comments": ['//', '#'], "blocks": [('/*', '*/', 'comment')]},
+    "SQL": {"line_comments": ['--'], "blocks": [('/*', '*/', 'comment')]},
+    "HTML": {"line_comments": [], "blocks": [('<!--', '-->', 'comment')]},
+    "XML": {"line_comments": [], "blocks": [('<!--', '-->', 'comment')]},
+    "PowerShell": {"line_comments": ['#'], "blocks": [('<#', '#>', 'comment')]},
+    "Ruby": {"line_comments": ['#'], "blocks": []},
+    "Bash": {"line_comments": ['#'], "blocks": []},
+    "YAML": {"line_comments": ['#'], "blocks": []},
+    "JSON": {"line_comments": [], "blocks": []},
+}
+
+
+@lru_cache(maxsize=None)
+def compile_tokenizer(language):
+    """Build the single-pass token pattern for a language (cached per language)
+    
+    Every token class is an alternative with its own named group, so one
+    search per token replaces the old per-keyword finditer loops.
+    """
+    keywords = LANGUAGE_KEYWORDS.get(language, LANGUAGE_KEYWORDS["Python"])
+    syntax = LANGUAGE_SYNTAX.get(language, LANGUAGE_SYNTAX["Python"])
+    
+    def alternation(words):
+        # Longest first so '"""' wins over '"' and 'INTO' over 'IN'
+        return '|'.join(re.escape(word) for word in sorted(words, key=len, reverse=True))
+    
+    alternatives = []
+    openers = [opener for opener, closer, tag in syntax["blocks"]]
+    if openers:
+        alternatives.append(f"(?P<block>{alternation(openers)})")
+    if syntax["line_comments"]:
+        alternatives.append(f"(?P<comment>(?:{alternation(syntax['line_comments'])}).*)")
+    alternatives.append(r'''(?P<string>"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*')''')
+    alternatives.append(r"(?P<definition>\bdef\s+\w+)")
+    alternatives.append(rf"(?P<keyword>\b(?:{alternation(keywords)})\b)")
+    alternatives.append(r"(?P<number>\b\d+\.?\d*\b)")
+    
+    blocks = {opener: (closer, tag) for opener, closer, tag in syntax["blocks"]}
+    return re.compile('|'.join(alternatives)), blocks, frozenset(keywords)
+
+
+# Longest slice of work a background highlighting pass may take between events
+HIGHLIGHT_CHUNK_SECONDS = 0.005
+
+
+class SyntaxHighlighter:
+    """Line-based lexer that re-tokenizes only the lines touched since the last pass"""
+    
+    TAGS = ('keyword', 'string', 'comment', 'number', 'function')
+    
+    def __init__(self, language="Python", line_count=1):
+        self.set_language(language)
+        self.reset(line_count)
+    
+    def set_language(self, language):
+        """Load the compiled tokenizer for a language"""
+        self.language = language
+        self.pattern, self.blocks, self.keywords = compile_tokenizer(language)
+    
+    def reset(self, line_count):
+        """Forget all lexer state and mark every line dirty"""
+        self.line_count = line_count
+        # line_states[n] is the state at the start of line n (1-based);
+        # the extra trailing slot holds the state after the last line
+        self.line_states = [None] * (line_count + 2)
+        self.dirty = [[1, line_count]] if line_count > 0 else []
+    
+    def mark_dirty(self, first, last):
+        """Mark lines first..last (inclusive) for re-tokenizing"""
+        first = max(first, 1)
+        last = min(last, self.line_count)
+        if first > last:
+            return
+        merged = []
+        placed = False
+        for start, end in self.dirty:
+            if end < first - 1:
+                merged.append([start, end])
+            elif start > last + 1:
+                if not placed:
+                    merged.append([first, last])
+                    placed = True
+                merged.append([start, end])
+            else:
+                first = min(first, start)
+                last = max(last, end)
+        if not placed:
+            merged.append([first, last])
+        self.dirty = merged
+    
+    def remap_dirty(self, remap):
+        """Move dirty ranges through a monotonic line-number mapping"""
+        old_ranges = self.dirty
+        self.dirty = []
+        for start, end in old_ranges:
+            self.mark_dirty(remap(start), remap(end))
+    
+    def lines_inserted(self, line, count):
+        """Record text inserted on line, adding count new lines after it"""
+        if count:
+            self.line_states[line + 1:line + 1] = [None] * count
+            self.line_count += count
+            self.remap_dirty(lambda n: n + count if n > line else n)
+        self.mark_dirty(line, line + count)
+    
+    def lines_deleted(self, line, count):
+        """Record text deleted from line onwards, joining count following lines into it"""
+        if count:
+            del self.line_states[line + 1:line + 1 + count]
+            self.line_count -= count
+            
+            def remap(n):
+                if n <= line:
+                    return n
+                if n <= line + count:
+                    return line
+                return n - count
+            
+            self.remap_dirty(remap)
+        self.mark_dirty(line, line)
+    
+    def pop_dirty_line(self, first=1, last=None):
+        """Take the first dirty line between first and last off the queue
+        
+        Returns None when no line in that range is dirty.
+        """
+        for position, (start, end) in enumerate(self.dirty):
+            if end < first:
+                continue
+            line = max(start, first)
+            if last is not None and line > last:
+                return None
+            
+            if start == end:
+                self.dirty.pop(position)
+            elif line == start:
+                self.dirty[position][0] = line + 1
+            elif line == end:
+                self.dirty[position][1] = line - 1
+            else:
+                self.dirty[position:position + 1] = [[start, line - 1], [line + 1, end]]
+            return line
+        return None
+    
+    def highlight(self, get_line, apply_tokens, first=1, last=None, deadline=None):
+        """Re-tokenize dirty lines, following state changes into later lines
+        
+        get_line(n) returns the text of line n and apply_tokens(n, tokens)
+        replaces the tags on line n. Only dirty lines between first and last
+        are taken, and work stops once time.perf_counter() reaches deadline.
+        Returns the number of lines processed.
+        """
+        processed = 0
+        while True:
+            line = self.pop_dirty_line(first, last)
+            if line is None:
+                break
+            self.highlight_line(line, get_line, apply_tokens)
+            processed += 1
+            if deadline is not None and time.perf_counter() >= deadline:
+                break
+        return processed
+    
+    def highlight_line(self, line, get_line, apply_tokens):
+        """Tokenize a single line and propagate its end state"""
+        tokens, end_state = self.tokenize_line(get_line(line), self.line_states[line])
+        apply_tokens(line, tokens)
+        
+        # A changed end state (e.g. an opened block comment) invalidates the next line
+        if self.line_states[line + 1] != end_state:
+            self.line_states[line + 1] = end_state
+            self.mark_dirty(line + 1, line + 1)
+    
+    def tokenize_line(self, line, state):
+        """Return ([(tag, start, end), ...], end_state) for one line of text"""
+        tokens = []
+        pos = 0
+        length = len(line)
+        
+        # Finish a block left open by a previous line
+        if state is not None:
+            closer, tag = self.blocks[state]
+            close_at = line.find(closer)
+            if close_at < 0:
+                return [(tag, 0, length)], state
+            pos = close_at + len(closer)
+            tokens.append((tag, 0, pos))
+        
+        search = self.pattern.search
+        while pos < length:
+            match = search(line, pos)
+            if not match:
+                break
+            kind = match.lastgroup
+            start, end = match.span()
+            pos = end
+            
+            if kind == 'block':
+                closer, tag = self.blocks[match.group()]
+                close_at = line.find(closer, end)
+                if close_at < 0:
+                    tokens.append((tag, start, length))
+                    return tokens, match.group()
+                pos = close_at + len(closer)
+                tokens.append((tag, start, pos))
+            elif kind == 'definition':
+                # "def name": keyword for def, function for the name
+                name_start = end - len(match.group().split()[-1])
+                if 'def' in self.keywords:
+                    tokens.append(('keyword', start, start + 3))
+                tokens.append(('function', name_start, end))
+            else:
+                tokens.append((kind, start, end))
+        
+        return tokens, None
+
+
+# Spreadsheet grid geometry in pixels, and characters shown per cell
+SHEET_CELL_WIDTH = 80
+SHEET_ROW_HEIGHT = 25
+SHEET_ROW_HEADER_WIDTH = 40
+SHEET_CELL_CHARS = 11
+
+
+def column_letter(col):
+    """Return the spreadsheet column name for a 1-based index (1 -> A, 27 -> AA)"""
+    letters = ""
+    while col > 0:
+        col, remainder = divmod(col - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+
+# Rows parsed per chunk when streaming a spreadsheet file in, and rows
+# buffered per write when saving one out
+SHEET_LOAD_CHUNK_ROWS = 2000
+SHEET_SAVE_BATCH_ROWS = 5000
+
+# Stored in the keywords of XLSX files whose first row is the A, B, C...
+# header written by spreadsheet mode, so only that row is skipped on load
+XLSX_HEADER_MARKER = "modern-notepad:column-header-row"
+
+
+def iter_csv_chunks(file_path, chunk_rows=SHEET_LOAD_CHUNK_ROWS):
+    """Yield (rows, fraction read) chunks from a CSV file without loading it whole"""
+    total = os.path.getsize(file_path) or 1
+    with open(file_path, 'rb') as raw:
+        text = io.TextIOWrapper(raw, encoding='utf-8-sig', errors='replace', newline='')
+        rows = []
+        for row in csv.reader(text):
+            rows.append(row)
+            if len(rows) >= chunk_rows:
+                yield rows, raw.tell() / total
+                rows = []
+        yield rows, 1.0
+
+
+def iter_xlsx_chunks(file_path, chunk_rows=SHEET_LOAD_CHUNK_ROWS):
+    """Yield (rows, fraction read) chunks from the first sheet of an XLSX file"""
+    import openpyxl
+    
+    workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        sheet = workbook.active
+        total = sheet.max_row or 0
+        skip_header = workbook.properties.keywords == XLSX_HEADER_MARKER
+        rows = []
+        read = 0
+        for values in sheet.iter_rows(values_only=True):
+            read += 1
+            if read == 1 and skip_header:
+                continue
+            rows.append(["" if value is None else str(value) for value in values])
+            if len(rows) >= chunk_rows:
+                yield rows, (read / total if total else None)
+                rows = []
+        yield rows, 1.0
+    finally:
+        workbook.close()
+
+
+def cell_name(row, col):
+    """Return the A1-style name of a cell"""
+    return f"{column_letter(col)}{row}"
+
+
+class SheetModel:
+    """Sparse cell store for spreadsheet mode; only non-empty cells take memory"""
+    
+    def __init__(self, row_count=100, col_count=26):
+        self.default_size = (row_count, col_count)
+        self.row_count = row_count
+        self.col_count = col_count
+        self.rows = {}  # row -> {col: value}
+    
+    def get(self, row, col):
+        """Return the value of a cell, or an empty string"""
+        cells = self.rows.get(row)
+        if cells is None:
+            return ""
+        return cells.get(col, "")
+    
+    def set(self, row, col, value):
+        """Store a cell value, growing the sheet to include it"""
+        if value:
+            self.rows.setdefault(row, {})[col] = value
+            self.row_count = max(self.row_count, row)
+            self.col_count = max(self.col_count, col)
+        else:
+            cells = self.rows.get(row)
+            if cells and col in cells:
+                del cells[col]
+                if not cells:
+                    del self.rows[row]
+    
+    def set_row(self, row, values):
+        """Replace a whole row from a sequence of values starting at column 1"""
+        cells = {col: value for col, value in enumerate(values, 1) if value}
+        if cells:
+            self.rows[row] = cells
+            self.col_count = max(self.col_count, max(cells))
+        else:
+            self.rows.pop(row, None)
+        self.row_count = max(self.row_count, row)
+    
+    def iter_rows(self):
+        """Yield (row, {col: value}) for populated rows in row order"""
+        for row in sorted(self.rows):
+            yield row, self.rows[row]
+    
+    def snapshot(self):
+        """Return a copy that later edits to this sheet will not change"""
+        copy = SheetModel(*self.default_size)
+        copy.row_count = self.row_count
+        copy.col_count = self.col_count
+        copy.rows = {row: dict(cells) for row, cells in self.rows.items()}
+        return copy
+    
+    def export_csv(self, file_path):
+        """Write the sheet to CSV in buffered batches
+        
+        Rows keep their numbers: gaps up to the last populated row are written
+        as blank lines, and each row ends at its last non-empty cell.
+        """
+        with open(file_path, 'w', newline='', encoding='utf-8', buffering=1 << 20) as csvfile:
+            writer = csv.writer(csvfile)
+            batch = []
+            next_row = 1
+            for row, cells in self.iter_rows():
+                batch.extend([] for _ in range(next_row, row))
+                batch.append([cells.get(col, "") for col in range(1, max(cells) + 1)])
+                next_row = row + 1
+                if len(batch) >= SHEET_SAVE_BATCH_ROWS:
+                    writer.writerows(batch)
+                    batch = []
+            writer.writerows(batch)
+    
+    def export_xlsx(self, file_path):
+        """Write the sheet to XLSX with a streaming (write-only) workbook"""
+        from openpyxl import Workbook
+        
+        wb = Workbook(write_only=True)
+        wb.properties.keywords = XLSX_HEADER_MARKER
+        ws = wb.create_sheet("Sheet1")
+        
+        # Column headers, then data rows shifted down by one
+        ws.append([column_letter(col) for col in range(1, self.col_count + 1)])
+        next_row = 1
+        for row, cells in self.iter_rows():
+            # Write-only sheets are sequential, so pad gaps with empty rows
+            for _ in range(next_row, row):
+                ws.append([])
+            values = [None] * max(cells)
+            for col, value in cells.items():
+                if value.strip():  # Only write non-empty cells
+                    values[col - 1] = value
+            ws.append(values)
+            next_row = row + 1
+        
+        wb.save(file_path)
+    
+    def clear(self):
+        """Remove every value and shrink back to the default size"""
+        self.rows.clear()
+        self.row_count, self.col_count = self.default_size
+    
+    def cell_count(self):
+        """Return the number of non-empty cells"""
+        return sum(len(cells) for cells in self.rows.values())
+
+
+# Lines per block of the line index; edits touch one block and queries bisect blocks
+LINE_INDEX_BLOCK_LINES = 512
+
+
+class LineIndex:
+    """Line lengths of a document, kept in step with edit deltas
+    
+    Lengths are stored in blocks of lines, each with its character total
+    (newlines included) kept up to date by edits. Prefix sums over the block
+    totals make line/offset lookups a bisect plus a walk inside one block,
+    and an edit only re-sums the blocks it touched. Offsets count the
+    newline after each line.
+    """
+    
+    def __init__(self, text=""):
+        self.load(text)
+    
+    def load(self, text):
+        """Rebuild the index from the full document text"""
+        self.blocks = self.chunk([len(line) for line in text.split('\n')])
+        self.block_chars = [sum(block) + len(block) for block in self.blocks]
+        self.prefix_dirty = True
+    
+    def chunk(self, lengths):
+        """Split a list of line lengths into blocks"""
+        size = LINE_INDEX_BLOCK_LINES
+        return [lengths[i:i + size] for i in range(0, len(lengths), size)] or [[0]]
+    
+    def update_prefixes(self):
+        """Recompute the per-block line and character starts after an edit"""
+        if not self.prefix_dirty:
+            return
+        # One step per block, not per line
+        line_ends = list(accumulate(len(block) for block in self.blocks))
+        char_ends = list(accumulate(self.block_chars))
+        self.line_starts = [0] + line_ends[:-1]
+        self.char_starts = [0] + char_ends[:-1]
+        self.total_lines = line_ends[-1]
+        self.total_chars = char_ends[-1] - 1
+        self.prefix_dirty = False
+    
+    @property
+    def line_count(self):
+        """Number of lines in the document"""
+        self.update_prefixes()
+        return self.total_lines
+    
+    @property
+    def char_count(self):
+        """Number of characters in the document, newlines included"""
+        self.update_prefixes()
+        return self.total_chars
+    
+    def locate(self, line):
+        """Return (block number, position in block) of a 1-based line"""
+        self.update_prefixes()
+        line = max(1, min(line, self.total_lines))
+        block = bisect_right(self.line_starts, line - 1) - 1
+        return block, line - 1 - self.line_starts[block]
+    
+    def line_length(self, line):
+        """Characters on a line, not counting its newline"""
+        block, position = self.locate(line)
+        return self.blocks[block][position]
+    
+    def line_to_offset(self, line):
+        """Character offset at which a 1-based line starts"""
+        block, position = self.locate(line)
+        lengths = self.blocks[block]
+        return self.char_starts[block] + sum(lengths[:position]) + position
+    
+    def offset_to_line(self, offset):
+        """Return the (line, column) of a character offset"""
+        self.update_prefixes()
+        offset = max(0, min(offset, self.total_chars))
+        block = bisect_right(self.char_starts, offset) - 1
+        offset -= self.char_starts[block]
+        for position, length in enumerate(self.blocks[block]):
+            if offset <= length:
+                break
+            offset -= length + 1
+        return self.line_starts[block] + position + 1, offset
+    
+    def splice(self, first, last, lengths):
+        """Replace the lengths of lines first..last with new ones"""
+        first_block, first_position = self.locate(first)
+        last_block, last_position = self.locate(last)
+        merged = [length for block in self.blocks[first_block:last_block + 1] for length in block]
+        end = sum(len(block) for block in self.blocks[first_block:last_block]) + last_position
+        merged[first_position:end + 1] = lengths
+        if len(merged) < LINE_INDEX_BLOCK_LINES // 2 and last_block + 1 < len(self.blocks):
+            # Fold a shrunken block into its neighbour so blocks stay large
+            last_block += 1
+            merged += self.blocks[last_block]
+        blocks = self.chunk(merged)
+        self.blocks[first_block:last_block + 1] = blocks
+        self.block_chars[first_block:last_block + 1] = [sum(block) + len(block) for block in blocks]
+        self.prefix_dirty = True
+    
+    def insert(self, line, column, text):
+        """Record text inserted at line.column"""
+        parts = text.split('\n')
+        length = self.line_length(line)
+        if len(parts) == 1:
+            self.splice(line, line, [length + len(text)])
+        else:
+            lengths = [column + len(parts[0])] + [len(part) for part in parts[1:-1]]
+            self.splice(line, line, lengths + [len(parts[-1]) + length - column])
+    
+    def delete(self, line, column, end_line, end_column):
+        """Record the removal of the text between two positions"""
+        self.splice(line, end_line, [column + self.line_length(end_line) - end_column])
+
+
+# Short pieces next to an insert are merged into it, and a table with too
+# many pieces is flattened back into one
+PIECE_MERGE_CHARS = 4096
+PIECE_COMPACT_COUNT = 8192
+
+
+class PieceTable:
+    """Document text kept as pieces of immutable strings
+    
+    Each piece is (buffer, start, end). An edit splits at most two pieces
+    and never copies the document, and since buffers are never modified a
+    snapshot is just a copy of the piece list. Piece start offsets are a
+    prefix list refreshed lazily from the first piece an edit touched.
+    """
+    
+    def __init__(self, text=""):
+        self.load(text)
+    
+    def __len__(self):
+        return self.length
+    
+    def load(self, text):
+        """Replace the whole document"""
+        self.pieces = [(text, 0, len(text))] if text else []
+        self.length = len(text)
+        self.starts = []
+        self.valid = 0  # number of entries of starts that are up to date
+    
+    def update_starts(self):
+        """Recompute piece start offsets from the first stale one"""
+        if self.valid == len(self.pieces) and len(self.starts) == self.valid:
+            return
+        del self.starts[self.valid:]
+        position = 0
+        if self.valid:
+            buffer, start, end = self.pieces[self.valid - 1]
+            position = self.starts[-1] + end - start
+        for buffer, start, end in self.pieces[self.valid:]:
+            self.starts.append(position)
+            position += end - start
+        self.valid = len(self.pieces)
+    
+    def find(self, offset):
+        """Return (piece number, offset inside the piece) for a document offset"""
+        if offset >= self.length:
+            return len(self.pieces), 0
+        self.update_starts()
+        piece = bisect_right(self.starts, offset) - 1
+        return piece, offset - self.starts[piece]
+    
+    def split(self, offset):
+        """Make a piece boundary at offset and return the piece starting there"""
+        piece, inner = self.find(offset)
+        if inner == 0:
+            return piece
+        buffer, start, end = self.pieces[piece]
+        self.pieces[piece:piece + 1] = [(buffer, start, start + inner), (buffer, start + inner, end)]
+        self.valid = min(self.valid, piece + 1)
+        return piece + 1
+    
+    def insert(self, offset, text):
+        """Insert text at a character offset"""
+        if not text:
+            return
+        piece = self.split(offset)
+        self.length += len(text)
+        if piece and self.pieces[piece - 1][2] - self.pieces[piece - 1][1] < PIECE_MERGE_CHARS:
+            # Typing usually continues where the last insert ended
+            buffer, start, end = self.pieces[piece - 1]
+            merged = buffer[start:end] + text
+            self.pieces[piece - 1] = (merged, 0, len(merged))
+            self.valid = min(self.valid, piece)
+        else:
+            self.pieces.insert(piece, (text, 0, len(text)))
+            self.valid = min(self.valid, piece + 1)
+        self.compact_if_fragmented()
+    
+    def delete(self, offset, length):
+        """Remove length characters starting at offset"""
+        if length <= 0:
+            return
+        first = self.split(offset)
+        last = self.split(offset + length)
+        del self.pieces[first:last]
+        self.length -= length
+        self.valid = min(self.valid, first)
+        self.compact_if_fragmented()
+    
+    def compact_if_fragmented(self):
+        """Flatten the table once scattered edits have cut it into many pieces"""
+        if len(self.pieces) > PIECE_COMPACT_COUNT:
+            self.load(self.text())
+    
+    def slice(self, start, end):
+        """Return the text between two offsets"""
+        end = min(end, self.length)
+        if start >= end:
+            return ""
+        piece, inner = self.find(start)
+        parts = []
+        remaining = end - start
+        while remaining > 0:
+            buffer, piece_start, piece_end = self.pieces[piece]
+            chunk = buffer[piece_start + inner:min(piece_end, piece_start + inner + remaining)]
+            parts.append(chunk)
+            remaining -= len(chunk)
+            piece += 1
+            inner = 0
+        return ''.join(parts)
+    
+    def chunks(self):
+        """Yield the document text piece by piece"""
+        for buffer, start, end in self.pieces:
+            yield buffer[start:end]
+    
+    def text(self):
+        """Return the whole document"""
+        return ''.join(self.chunks())
+    
+    def snapshot(self):
+        """Return a copy that later edits will not change"""
+        copy = PieceTable()
+        copy.pieces = list(self.pieces)
+        copy.length = self.length
+        return copy
+    
+    def write(self, file_path):
+        """Write the document to a UTF-8 file without joining it in memory"""
+        with open(file_path, 'w', encoding='utf-8') as file:
+            for chunk in self.chunks():
+                file.write(chunk)
+
+
+# Character formatting in normal mode: a style is a tuple of these fields,
+# interned to a small id, and the document is a list of runs of style ids
+STYLE_FIELDS = ('bold', 'italic', 'underline', 'size', 'color', 'highlight')
+DEFAULT_STYLE = (False, False, False, 12, None, None)
+
+
+class StyleTable:
+    """Interns style tuples so each distinct style gets one id (0 is plain text)"""
+    
     def __init__(self):
+        self.styles = [DEFAULT_STYLE]
+        self.ids = {DEFAULT_STYLE: 0}
+    
+    def intern(self, style):
+        """Return the id of a style, registering it on first use"""
+        style_id = self.ids.get(style)
+        if style_id is None:
+            style_id = self.ids[style] = len(self.styles)
+            self.styles.append(style)
+        return style_id
+    
+    def style(self, style_id):
+        """Return the style tuple for an id"""
+        return self.styles[style_id]
+
+
+class StyleRuns:
+    """Run-length map from document offsets to style ids
+    
+    Runs are [style id, length] with adjacent equal styles merged, so typing
+    in one style grows a single run. Run start offsets are refreshed lazily,
+    as in PieceTable.
+    """
+    
+    def __init__(self, length=0):
+        self.load(length)
+    
+    def __len__(self):
+        return self.length
+    
+    def load(self, length, style_id=0):
+        """Reset to a single run covering the whole document"""
+        self.runs = [[style_id, length]] if length else []
+        self.length = length
+        self.starts = []
+        self.valid = 0
+    
+    def update_starts(self):
+        """Recompute run start offsets from the first stale one"""
+        if self.valid == len(self.runs) and len(self.starts) == self.valid:
+            return
+        del self.starts[self.valid:]
+        position = self.starts[-1] + self.runs[self.valid - 1][1] if self.valid else 0
+        for style_id, length in self.runs[self.valid:]:
+            self.starts.append(position)
+            position += length
+        self.valid = len(self.runs)
+    
+    def find(self, offset):
+        """Return (run number, offset inside the run) for a document offset"""
+        if offset >= self.length:
+            return len(self.runs), 0
+        self.update_starts()
+        run = bisect_right(self.starts, offset) - 1
+        return run, offset - self.starts[run]
+    
+    def split(self, offset):
+        """Make a run boundary at offset and return the run starting there"""
+        run, inner = self.find(offset)
+        if inner == 0:
+            return run
+        style_id, length = self.runs[run]
+        self.runs[run:run + 1] = [[style_id, inner], [style_id, length - inner]]
+        self.valid = min(self.valid, run + 1)
+        return run + 1
+    
+    def merge(self, first, last):
+        """Join equal neighbouring runs between two run numbers"""
+        run = max(first, 1)
+        last = min(last, len(self.runs) - 1)
+        while run <= last:
+            if self.runs[run - 1][0] == self.runs[run][0]:
+                self.runs[run - 1][1] += self.runs.pop(run)[1]
+                last -= 1
+            else:
+                run += 1
+        self.valid = min(self.valid, max(first - 1, 0))
+    
+    def style_at(self, offset):
+        """Return the style id of the character at offset"""
+        run, inner = self.find(offset)
+        return self.runs[run][0] if run < len(self.runs) else 0
+    
+    def insert(self, offset, length, style_id):
+        """Record length new characters in a style at offset"""
+        if length <= 0:
+            return
+        run = self.split(offset)
+        self.runs.insert(run, [style_id, length])
+        self.length += length
+        self.valid = min(self.valid, run)
+        self.merge(run, run + 1)
+    
+    def delete(self, offset, length):
+        """Drop the styles of removed characters"""
+        if length <= 0:
+            return
+        first = self.split(offset)
+        last = self.split(offset + length)
+        del self.runs[first:last]
+        self.length -= length
+        self.valid = min(self.valid, first)
+        self.merge(first, first)
+    
+    def restyle(self, start, end, change):
+        """Replace each style id s in a range with change(s)
+        
+        Returns the (start, end, old id, new id) pieces that changed so the
+        caller can retag them.
+        """
+        first = self.split(start)
+        last = self.split(end)
+        self.update_starts()
+        changed = []
+        for run in range(first, last):
+            style_id, length = self.runs[run]
+            new_id = change(style_id)
+            if new_id != style_id:
+                changed.append((self.starts[run], self.starts[run] + length, style_id, new_id))
+                self.runs[run][0] = new_id
+        self.merge(first, last)
+        return changed
+    
+    def snapshot(self):
+        """Return a copy that later edits will not change"""
+        copy = StyleRuns()
+        copy.runs = [list(run) for run in self.runs]
+        copy.length = self.length
+        return copy
+    
+    def iter_runs(self):
+        """Yield (start, end, style id) for every run"""
+        position = 0
+        for style_id, length in self.runs:
+            yield position, position + length, style_id
+            position += length
+
+
+# Files above this size open in read-only large-file mode (changeable from the View menu)
+LARGE_FILE_THRESHOLD = 64 * 1024 * 1024
+
+# Large-file mode indexing granularity and paging: the line count is recorded
+# for every block of bytes, and the text widget holds a few pages of lines
+LINE_INDEX_BLOCK_BYTES = 64 * 1024
+LARGE_FILE_PAGE_LINES = 2000
+LARGE_FILE_WINDOW_PAGES = 3
+
+
+class MappedTextFile:
+    """Memory-mapped UTF-8 file with a sparse line index built in the background
+    
+    block_lines[i] holds the number of newlines before byte i * block size,
+    so a line's offset is found by bisecting to its block and scanning only
+    inside that block.
+    """
+    
+    def __init__(self, file_path, block_size=LINE_INDEX_BLOCK_BYTES):
+        self.file_path = file_path
+        self.block_size = block_size
+        self.file = open(file_path, 'rb')
+        self.size = os.path.getsize(file_path)
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else b""
+        self.block_lines = array('Q', [0])
+        self.indexed = False
+    
+    def close(self):
+        """Release the mapping and the file handle"""
+        if self.data:
+            self.data.close()
+        self.file.close()
+    
+    def build_index(self, job=None):
+        """Count newlines block by block; meant to run on a worker thread"""
+        data = self.data
+        block_lines = self.block_lines
+        newlines = 0
+        for block, start in enumerate(range(0, self.size, self.block_size), 1):
+            if job and job.cancelled.is_set():
+                return
+            newlines += data[start:start + self.block_size].count(b'\n')
+            block_lines.append(newlines)
+            if job and block % 256 == 0:
+                job.emit(start / self.size)
+        self.indexed = True
+    
+    @property
+    def indexed_lines(self):
+        """Number of complete lines whose start offsets are known so far"""
+        if self.indexed:
+            return self.line_count
+        return self.block_lines[-1]
+    
+    @property
+    def line_count(self):
+        """Total lines (like the text widget, a trailing newline starts an empty line)"""
+        return self.block_lines[-1] + 1 if self.indexed else None
+    
+    def line_offset(self, line):
+        """Return the byte offset where a 1-based line starts"""
+        if line <= 1:
+            return 0
+        newline = line - 1  # the line starts after this many newlines
+        if newline > self.block_lines[-1]:
+            return self.size
+        block = bisect_left(self.block_lines, newline) - 1
+        pos = block * self.block_size
+        for _ in range(newline - self.block_lines[block]):
+            pos = self.data.find(b'\n', pos) + 1
+        return pos
+    
+    def offset_line(self, offset):
+        """Return the 1-based line containing a byte offset"""
+        block = min(offset // self.block_size, len(self.block_lines) - 1)
+        start = block * self.block_size
+        return self.block_lines[block] + self.data[start:offset].count(b'\n') + 1
+    
+    def read_lines(self, first, last):
+        """Decode lines first..last inclusive, keeping their newlines"""
+        start = self.line_offset(first)
+        end = self.line_offset(last + 1)
+        return self.data[start:end].decode('utf-8', errors='replace')
+
+
+# Text files are read on a worker and inserted this many characters at a time
+TEXT_LOAD_CHUNK_CHARS = 256 * 1024
+
+
+def iter_text_chunks(file_path, chunk_chars=TEXT_LOAD_CHUNK_CHARS):
+    """Yield (text, fraction read) chunks from a UTF-8 text file"""
+    total = os.path.getsize(file_path) or 1
+    with open(file_path, 'rb') as raw:
+        text = io.TextIOWrapper(raw, encoding='utf-8')
+        while True:
+            chunk = text.read(chunk_chars)
+            if not chunk:
+                break
+            yield chunk, raw.tell() / total
+
+
+def write_text_file(file_path, content):
+    """Write text to a file as UTF-8"""
+    with open(file_path, 'w', encoding='utf-8') as file:
+        file.write(content)
+
+
+def save_atomically(file_path, write):
+    """Call write(temp_path) then move the result over file_path
+    
+    The data is flushed to disk before the rename, so a crash leaves either
+    the old file or the new one, never a half-written file.
+    """
+    # Write beside the real file, so a symlink keeps pointing at it
+    file_path = os.path.realpath(file_path)
+    folder, name = os.path.split(file_path)
+    temp_path = os.path.join(folder, f".~{os.getpid()}.{name}")
+    try:
+        write(temp_path)
+        with open(temp_path, 'r+b') as file:
+            os.fsync(file.fileno())
+        if os.path.exists(file_path):
+            shutil.copymode(file_path, temp_path)
+        os.replace(temp_path, file_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    
+    if hasattr(os, 'O_DIRECTORY'):
+        # Make the rename itself durable
+        folder_fd = os.open(folder, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(folder_fd)
+        finally:
+            os.close(folder_fd)
+
+
+# Native format for formatted text: a zip holding the text (images as
+# U+FFFC placeholders), the style runs and one PNG per distinct image
+RICH_DOCUMENT_EXTENSION = '.mnote'
+RICH_DOCUMENT_VERSION = 1
+
+
+def write_rich_document(file_path, document, styles, runs, images, blobs):
+    """Write a .mnote zip
+    
+    runs are (start, end, style index) for styled text, images are
+    (offset, blob hash, width, height) and blobs maps hashes to PNG bytes.
+    PNGs are already compressed, so they are stored as they are.
+    """
+    manifest = {
+        'version': RICH_DOCUMENT_VERSION,
+        'styles': styles,
+        'runs': runs,
+        'images': images,
+    }
+    import zipfile
+    with zipfile.ZipFile(file_path, 'w', zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr('document.json', json.dumps(manifest))
+        with archive.open('text.txt', 'w') as text_file:
+            for chunk in document.chunks():
+                text_file.write(chunk.encode('utf-8'))
+        for blob in sorted({image[1] for image in images}):
+            archive.writestr(f"images/{blob}.png", blobs[blob], compress_type=zipfile.ZIP_STORED)
+
+
+def read_rich_document(file_path):
+    """Return (text, styles, runs, images, blobs) from a .mnote zip"""
+    import zipfile
+    with zipfile.ZipFile(file_path) as archive:
+        manifest = json.loads(archive.read('document.json'))
+        if manifest.get('version', 0) > RICH_DOCUMENT_VERSION:
+            raise ValueError("This document was saved by a newer version of Modern Notepad")
+        text = archive.read('text.txt').decode('utf-8')
+        blobs = {blob: archive.read(f"images/{blob}.png")
+                 for blob in {image[1] for image in manifest['images']}}
+    styles = [tuple(style) for style in manifest['styles']]
+    return text, styles, manifest['runs'], manifest['images'], blobs
+
+
+def encode_png(image):
+    """Return (content hash, PNG bytes) for a PIL image"""
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG')
+    data = buffer.getvalue()
+    return hashlib.sha1(data).hexdigest(), data
+
+
+# Pasted images are scaled down to fit this box; decoded images are cached
+# up to a total pixel count, most recently shown first
+IMAGE_MAX_SIZE = (400, 300)
+IMAGE_CACHE_PIXELS = 4 * 1024 * 1024
+
+
+def fit_image_size(size, box=IMAGE_MAX_SIZE):
+    """Return the size an image is shown at after scaling it down to the box"""
+    width, height = size
+    scale = min(1, box[0] / width, box[1] / height)
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+class ImageStore:
+    """Content-hashed PNG blobs plus an LRU cache of decoded PhotoImages
+    
+    Blobs are keyed by the SHA-1 of their PNG bytes, so an image pasted or
+    loaded twice is stored and decoded once. Decoding and resizing run on
+    worker threads; only the PhotoImage is made on the main thread. When
+    the cache goes over its pixel budget the least recently used photos
+    are dropped and returned so the caller can swap in a placeholder.
+    """
+    
+    def __init__(self, root, pixel_limit=IMAGE_CACHE_PIXELS):
+        self.root = root
+        self.pixel_limit = pixel_limit
+        self.blobs = {}  # hash -> PNG bytes
+        self.sizes = {}  # hash -> (width, height)
+        self.sources = {}  # hash of a pasted image's pixels -> blob hash
+        self.photos = OrderedDict()  # hash -> PhotoImage, least recently used first
+        self.pixels = 0
+        self.pending = set()
+    
+    def add(self, blob, data, size):
+        """Register PNG bytes under their hash"""
+        self.blobs.setdefault(blob, data)
+        self.sizes[blob] = tuple(size)
+    
+    def photo(self, blob):
+        """Return the cached PhotoImage for a blob, or None if not decoded"""
+        photo = self.photos.get(blob)
+        if photo is not None:
+            self.photos.move_to_end(blob)
+        return photo
+    
+    def cache(self, blob, image, keep=()):
+        """Make a PhotoImage for a decoded image; returns the blobs evicted for room"""
+        if blob not in self.photos:
+            from PIL import ImageTk
+            self.photos[blob] = ImageTk.PhotoImage(image)
+            self.pixels += image.width * image.height
+        self.photos.move_to_end(blob)
+        
+        evicted = []
+        for old_blob in list(self.photos):
+            if self.pixels <= self.pixel_limit:
+                break
+            if old_blob == blob or old_blob in keep:
+                continue
+            self.discard(old_blob)
+            evicted.append(old_blob)
+        return evicted
+    
+    def discard(self, blob):
+        """Drop the decoded photo of a blob; its PNG bytes are kept"""
+        photo = self.photos.pop(blob, None)
+        if photo is not None:
+            width, height = self.sizes[blob]
+            self.pixels -= width * height
+    
+    def clear(self):
+        """Forget every image"""
+        self.blobs.clear()
+        self.sizes.clear()
+        self.sources.clear()
+        self.photos.clear()
+        self.pixels = 0
+    
+    def decode(self, blobs, on_decoded):
+        """Decode blobs on a worker; on_decoded(blob, image) runs on the main thread"""
+        wanted = [(blob, self.blobs[blob]) for blob in set(blobs)
+                  if blob in self.blobs and blob not in self.photos and blob not in self.pending]
+        if not wanted:
+            return
+        self.pending.update(blob for blob, data in wanted)
+        
+        def work(job):
+            from PIL import Image
+            for blob, data in wanted:
+                image = Image.open(io.BytesIO(data))
+                image.load()
+                if not job.emit((blob, image)):
+                    break
+        
+        def deliver(item):
+            blob, image = item
+            self.pending.discard(blob)
+            if blob in self.blobs:
+                on_decoded(blob, image)
+        
+        def done(job):
+            self.pending.difference_update(blob for blob, data in wanted)
+        
+        BackgroundJob(self.root, work, on_item=deliver, on_done=done).start()
+    
+    def paste(self, image, on_ready):
+        """Resize and encode a pasted image on a worker
+        
+        on_ready(blob, evicted) runs on the main thread once the blob is
+        stored and its photo cached. Pasting the same picture again skips
+        the resize and encode.
+        """
+        def work(job):
+            from PIL import Image
+            source = hashlib.sha1(repr((image.mode, image.size)).encode() + image.tobytes()).hexdigest()
+            if source in self.sources:
+                job.emit((source, None, None, None))
+                return
+            resized = image.copy()
+            resized.thumbnail(IMAGE_MAX_SIZE, Image.Resampling.LANCZOS)
+            blob, data = encode_png(resized)
+            job.emit((source, blob, data, resized))
+        
+        def deliver(item):
+            source, blob, data, resized = item
+            if blob is None:
+                blob = self.sources[source]
+                if blob not in self.blobs:
+                    return
+                if blob in self.photos:
+                    on_ready(blob, [])
+                else:
+                    self.decode([blob], lambda blob, image: on_ready(blob, self.cache(blob, image)))
+                return
+            self.sources[source] = blob
+            self.add(blob, data, resized.size)
+            on_ready(blob, self.cache(blob, resized))
+        
+        BackgroundJob(self.root, work, on_item=deliver).start()
+
+
+# Autosave journal: edits are appended to a per-process journal next to a
+# snapshot of the text, and the snapshot is rewritten once the journal grows
+RECOVERY_DIR = os.path.join(os.path.expanduser('~'), '.modern_notepad', 'recovery')
+JOURNAL_FLUSH_SECONDS = 0.5
+JOURNAL_COMPACT_CHARS = 1024 * 1024
+AUTOSAVE_CHECK_MS = 5000
+RECOVERY_RETRY_MS = 250  # recovery waits for files opened at startup
+
+
+def process_alive(pid):
+    """Return True if a process with this id is running (POSIX only)"""
+    if os.name != 'posix':
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class EditJournal:
+    """Crash-recovery journal of a document's edits, written on a worker thread
+    
+    The snapshot file holds a JSON header line and the full text; the
+    journal file holds one JSON line per edit, [seq, "i", offset, text] or
+    [seq, "d", offset, length]. Edits numbered at or below the snapshot's
+    seq are already part of it and are skipped on replay.
+    """
+    
+    def __init__(self, key, file_path, text, folder=RECOVERY_DIR):
+        os.makedirs(folder, exist_ok=True)
+        self.snapshot_path = os.path.join(folder, f"{key}.snapshot")
+        self.journal_path = os.path.join(folder, f"{key}.journal")
+        self.file_path = file_path
+        self.seq = 0
+        self.journal_edits = 0  # edits since the last snapshot
+        self.journal_chars = 0
+        self.snapshot_chars = len(text)
+        self.commands = queue.Queue()
+        self.commands.put(('snapshot', 0, text))
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+    
+    def record_insert(self, offset, text):
+        """Queue an insertion at a character offset"""
+        self.seq += 1
+        self.journal_edits += 1
+        self.journal_chars += len(text)
+        self.commands.put(('edit', json.dumps([self.seq, 'i', offset, text])))
+    
+    def record_delete(self, offset, length):
+        """Queue the removal of length characters at an offset"""
+        self.seq += 1
+        self.journal_edits += 1
+        self.commands.put(('edit', json.dumps([self.seq, 'd', offset, length])))
+    
+    @property
+    def needs_compaction(self):
+        """True once replaying the journal would cost more than rewriting the snapshot"""
+        return self.journal_chars > max(JOURNAL_COMPACT_CHARS, self.snapshot_chars) or \
+            self.journal_edits > JOURNAL_COMPACT_CHARS // 64
+    
+    def compact(self, text):
+        """Queue a fresh snapshot that replaces the journal so far"""
+        self.journal_edits = 0
+        self.journal_chars = 0
+        self.snapshot_chars = len(text)
+        self.commands.put(('snapshot', self.seq, text))
+    
+    def close(self, discard=True):
+        """Write out queued edits and stop; discard removes the recovery files"""
+        self.commands.put(('close', discard))
+        self.thread.join()
+    
+    def run(self):
+        """Worker thread body: write queued commands in batches"""
+        journal = open(self.journal_path, 'a', encoding='utf-8')
+        try:
+            while True:
+                # Collect whatever arrives within one flush period
+                batch = [self.commands.get()]
+                deadline = time.monotonic() + JOURNAL_FLUSH_SECONDS
+                while batch[-1][0] != 'close':
+                    try:
+                        batch.append(self.commands.get(timeout=max(0, deadline - time.monotonic())))
+                    except queue.Empty:
+                        break
+                
+                for command in batch:
+                    if command[0] == 'edit':
+                        journal.write(command[1] + '\n')
+                    elif command[0] == 'snapshot':
+                        journal.flush()
+                        self.write_snapshot(command[1], command[2])
+                        journal.close()
+                        journal = open(self.journal_path, 'w', encoding='utf-8')
+                    else:
+                        journal.close()
+                        if command[1]:
+                            for path in (self.snapshot_path, self.journal_path):
+                                if os.path.exists(path):
+                                    os.remove(path)
+                        return
+                journal.flush()
+                os.fsync(journal.fileno())
+        finally:
+            journal.close()
+    
+    def write_snapshot(self, seq, text):
+        """Atomically replace the snapshot file"""
+        header = json.dumps({'file': self.file_path, 'pid': os.getpid(), 'seq': seq})
+        
+        def write(path):
+            # newline='' keeps offsets exact; the text may contain carriage returns
+            with open(path, 'w', encoding='utf-8', newline='') as file:
+                file.write(header + '\n' + text)
+        
+        save_atomically(self.snapshot_path, write)
+    
+    @staticmethod
+    def read(snapshot_path):
+        """Return (header, text, edits) for a snapshot and its journal"""
+        with open(snapshot_path, 'r', encoding='utf-8', newline='') as file:
+            header = json.loads(file.readline())
+            text = file.read()
+        
+        edits = []
+        journal_path = os.path.splitext(snapshot_path)[0] + '.journal'
+        if os.path.exists(journal_path):
+            with open(journal_path, 'r', encoding='utf-8') as file:
+                for line in file:
+                    try:
+                        edit = json.loads(line)
+                    except ValueError:
+                        break  # torn write at the moment of the crash
+                    if edit[0] > header['seq']:
+                        edits.append(edit[1:])
+        return header, text, edits
+    
+    @staticmethod
+    def find_orphans(folder=RECOVERY_DIR):
+        """Return snapshot paths left behind by instances that are no longer running"""
+        if not os.path.isdir(folder):
+            return []
+        orphans = []
+        for name in sorted(os.listdir(folder)):
+            if name.endswith('.snapshot'):
+                path = os.path.join(folder, name)
+                try:
+                    with open(path, 'r', encoding='utf-8') as file:
+                        pid = json.loads(file.readline()).get('pid')
+                except (OSError, ValueError):
+                    continue
+                if pid != os.getpid() and not process_alive(pid):
+                    orphans.append(path)
+        return orphans
+
+
+# Inactive tabs idle this long with at least this much text are written to
+# disk and dropped from memory; how often to look for them
+TAB_SPILL_DIR = os.path.join(os.path.expanduser('~'), '.modern_notepad', 'tabs')
+TAB_SPILL_SECONDS = 300
+TAB_SPILL_MIN_CHARS = 256 * 1024
+TAB_SPILL_CHECK_MS = 60 * 1000
+
+
+class DocumentTab:
+    """An open document that is not necessarily the one on screen
+    
+    Only the active tab lives in the text widget and the editor's models.
+    Switching away parks its piece table, style runs and image data here,
+    and a tab left alone long enough spills its text to a file until it is
+    shown again, so an inactive tab costs no widget and little memory.
+    """
+    
+    next_number = 1
+    
+    def __init__(self, file_path=None):
+        self.number = DocumentTab.next_number
+        DocumentTab.next_number += 1
+        self.file_path = file_path
+        self.text_modified = False
+        self.large_file = False  # large files are reopened rather than parked
+        self.document = None
+        self.style_runs = None
+        self.images = []  # [offset, blob, width, height]
+        self.blobs = {}   # blob hash -> PNG bytes
+        self.cursor = 0
+        self.top_line = 1
+        self.journal = None
+        self.spill_path = None
+        self.spill_job = None
+        self.last_used = time.monotonic()
+    
+    def title(self):
+        """Return the label shown on the tab"""
+        name = os.path.basename(self.file_path) if self.file_path else "Untitled"
+        return f"*{name}" if self.text_modified else name
+    
+    def spill(self, path):
+        """Write the parked text to a file; runs on a worker thread"""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8', newline='') as file:
+            for chunk in self.document.chunks():
+                file.write(chunk)
+    
+    def restore(self):
+        """Read spilled text back into memory"""
+        if self.spill_job:
+            self.spill_job.thread.join()
+        if self.spill_path:
+            with open(self.spill_path, 'r', encoding='utf-8', newline='') as file:
+                self.document = PieceTable(file.read())
+            os.remove(self.spill_path)
+            self.spill_path = None
+    
+    def discard(self):
+        """Drop the tab's recovery journal and spill file once it is closed"""
+        if self.journal:
+            self.journal.close()
+            self.journal = None
+        if self.spill_job:
+            self.spill_job.thread.join()
+        if self.spill_path and os.path.exists(self.spill_path):
+            os.remove(self.spill_path)
+        self.spill_path = None
+
+
+def estimate_memory(document, style_runs, blobs):
+    """Estimate the bytes held by a document's text, formatting and images"""
+    text = 0
+    if document is not None:
+        # Pieces share buffers, so each buffer is counted once
+        buffers = {id(buffer): buffer for buffer, start, end in document.pieces}
+        text = (sum(sys.getsizeof(buffer) for buffer in buffers.values())
+                + sys.getsizeof(document.pieces) + len(document.pieces) * sys.getsizeof((0, 0, 0)))
+    formatting = 0
+    if style_runs is not None:
+        formatting = sys.getsizeof(style_runs.runs) + sum(sys.getsizeof(run) for run in style_runs.runs)
+    images = sum(len(data) for data in blobs.values())
+    return text, formatting, images
+
+
+def process_memory():
+    """Return this process's resident memory in bytes, or None where it is not reported"""
+    try:
+        with open('/proc/self/statm') as file:
+            return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def format_bytes(size):
+    """Format a byte count for display"""
+    for unit in ('bytes', 'KB', 'MB'):
+        if size < 1024:
+            return f"{size:,.0f} {unit}" if unit == 'bytes' else f"{size:,.1f} {unit}"
+        size /= 1024
+    return f"{size:,.1f} GB"
+
+
+# Matches found by a search worker reach the UI in batches of this size
+SEARCH_BATCH_MATCHES = 2000
+# Text either side of a match that is re-matched to expand a regex replacement
+REPLACE_CONTEXT_CHARS = 4096
+
+
+@lru_cache(maxsize=32)
+def compile_search(pattern, regex=False, match_case=False, whole_word=False):
+    """Compile a find-bar query; raises re.error for an invalid regex"""
+    expression = pattern if regex else re.escape(pattern)
+    if whole_word:
+        # Patterns may be bytes when searching memory-mapped files
+        expression = (rb"\b(?:%s)\b" if isinstance(pattern, bytes) else r"\b(?:%s)\b") % expression
+    flags = re.MULTILINE if match_case else re.MULTILINE | re.IGNORECASE
+    return re.compile(expression, flags)
+
+
+def iter_match_batches(text, compiled, batch_size=SEARCH_BATCH_MATCHES):
+    """Yield lists of (start, end) offsets of the non-empty matches in text"""
+    batch = []
+    for match in compiled.finditer(text):
+        start, end = match.span()
+        if start == end:
+            continue
+        batch.append((start, end))
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def replace_matches(text, compiled, replacement, regex=False):
+    """Replace the non-empty matches in text
+    
+    Returns (first, last, middle, count): text[first:last] is the span from
+    the first match to the end of the last, and middle is what replaces it.
+    Empty matches are left alone, as the search never shows them.
+    """
+    span = []  # [first start, last end, count]
+    
+    def substitute(match):
+        if match.start() == match.end():
+            return ''
+        if span:
+            span[1:] = [match.end(), span[2] + 1]
+        else:
+            span[:] = [match.start(), match.end(), 1]
+        return match.expand(replacement) if regex else replacement
+    
+    result = compiled.sub(substitute, text)
+    if not span:
+        return 0, 0, '', 0
+    first, last, count = span
+    suffix = len(text) - last
+    return first, last, result[first:len(result) - suffix], count
+
+
+def list_replacements(text, compiled, replacement, regex=False):
+    """Return (start, end, new text) for each non-empty match in text"""
+    return [(match.start(), match.end(), match.expand(replacement) if regex else replacement)
+            for match in compiled.finditer(text) if match.start() != match.end()]
+
+
+# Find in Files: per-file match cap, total result cap, characters of each
+# matching line kept, files above this size are memory-mapped, and folders
+# never descended into
+FIND_IN_FILES_FILE_MATCHES = 1000
+FIND_IN_FILES_MAX_RESULTS = 10000
+FIND_IN_FILES_LINE_CHARS = 200
+FIND_IN_FILES_MMAP_BYTES = 16 * 1024 * 1024
+FIND_IN_FILES_SKIP_DIRS = {'.git', '.hg', '.svn', '__pycache__', 'node_modules'}
+
+
+def iter_search_files(folder, extensions=None):
+    """Yield the files under folder, optionally only those with one of the extensions"""
+    for directory, subdirectories, files in os.walk(folder):
+        subdirectories[:] = sorted(name for name in subdirectories
+                                   if name not in FIND_IN_FILES_SKIP_DIRS)
+        for name in sorted(files):
+            if extensions is None or os.path.splitext(name)[1].lower() in extensions:
+                yield os.path.join(directory, name)
+
+
+def scan_matches(data, compiled, newline, limit=FIND_IN_FILES_FILE_MATCHES):
+    """Return (line, column, line text) for the matches in a str or bytes-like buffer"""
+    results = []
+    line = 1
+    position = 0
+    for match in compiled.finditer(data):
+        start, end = match.span()
+        if start == end:
+            continue
+        line += data[position:start].count(newline)
+        position = start
+        line_start = data.rfind(newline, 0, start) + 1
+        line_end = data.find(newline, start)
+        if line_end < 0:
+            line_end = len(data)
+        text = data[line_start:min(line_end, line_start + FIND_IN_FILES_LINE_CHARS)]
+        if isinstance(text, bytes):
+            text = text.decode('utf-8', errors='replace')
+        results.append((line, start - line_start, text.rstrip('\r')))
+        if len(results) >= limit:
+            break
+    return results
+
+
+def search_file(path, pattern, regex=False, match_case=False, whole_word=False):
+    """Search one file for Find in Files; runs in a worker process
+    
+    Returns a list of (line, column, line text), or None for a binary or
+    unreadable file. Files above FIND_IN_FILES_MMAP_BYTES are memory-mapped
+    and searched as UTF-8 bytes instead of being read into memory.
+    """
+    try:
+        with open(path, 'rb') as file:
+            if b'\0' in file.read(8192):
+                return None
+            size = os.fstat(file.fileno()).st_size
+            if not size:
+                return []
+            if size < FIND_IN_FILES_MMAP_BYTES:
+                file.seek(0)
+                text = file.read().decode('utf-8', errors='replace')
+                return scan_matches(text, compile_search(pattern, regex, match_case, whole_word), '\n')
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                compiled = compile_search(pattern.encode('utf-8'), regex, match_case, whole_word)
+                return scan_matches(data, compiled, b'\n')
+    except (OSError, ValueError, re.error):
+        return None
+
+
+def search_files(job, folder, extensions, query):
+    """Search a folder across a process pool; a BackgroundJob work function
+    
+    Emits (files scanned, path, matches) for every file with matches, and
+    (files scanned, None, None) now and then to report progress. Only a
+    few files per worker are in flight, so cancelling stops promptly.
+    """
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+    workers = os.cpu_count() or 2
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+    pending = {}
+    scanned = 0
+    
+    def deliver(futures):
+        nonlocal scanned
+        for future in futures:
+            path = pending.pop(future)
+            matches = future.result()
+            scanned += 1
+            if matches:
+                item = (scanned, path, matches)
+            elif scanned % 100 == 0:
+                item = (scanned, None, None)
+            else:
+                continue
+            if not job.emit(item):
+                return False
+        return True
+    
+    try:
+        for path in iter_search_files(folder, extensions):
+            if job.cancelled.is_set():
+                return
+            pending[pool.submit(search_file, path, *query)] = path
+            if len(pending) >= workers * 4:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                if not deliver(done):
+                    return
+        while pending and not job.cancelled.is_set():
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            if not deliver(done):
+                return
+        job.emit((scanned, None, None))
+    finally:
+        # Files not yet started are dropped (by hand; cancel_futures needs 3.9)
+        for future in pending:
+            future.cancel()
+        pool.shutdown(wait=False)
+
+
+# How often the main loop collects results from background jobs, and the
+# longest it spends handling them before returning to Tk events
+JOB_POLL_MS = 20
+JOB_SLICE_SECONDS = 0.008
+
+
+class BackgroundJob:
+    """Run work on a worker thread and feed its results to the Tk main loop
+    
+    work(job) runs on the thread and calls job.emit(item) for each result.
+    Items wait in a bounded queue, so a fast producer is paced by the UI,
+    and are handed to on_item(item) on the main thread from a root.after
+    poll. on_done(job) runs on the main thread once the worker has finished
+    and its items have been delivered; job.error holds any exception.
+    """
+    
+    def __init__(self, root, work, on_item=None, on_done=None, max_pending=16):
+        self.root = root
+        self.work = work
+        self.on_item = on_item
+        self.on_done = on_done
+        self.items = queue.Queue(maxsize=max_pending)
+        self.cancelled = threading.Event()
+        self.finished = False
+        self.done = False  # on_done has been delivered
+        self.error = None
+        self.thread = threading.Thread(target=self.run, daemon=True)
+    
+    def start(self):
+        """Start the worker and begin polling for its results"""
+        self.thread.start()
+        self.root.after(JOB_POLL_MS, self.poll)
+        return self
+    
+    def run(self):
+        """Worker thread body"""
+        try:
+            self.work(self)
+        except Exception as e:
+            self.error = e
+        finally:
+            self.finished = True
+    
+    def emit(self, item):
+        """Queue a result from the worker; returns False once cancelled"""
+        while not self.cancelled.is_set():
+            try:
+                self.items.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+    
+    def cancel(self):
+        """Ask the worker to stop and drop undelivered results"""
+        self.cancelled.set()
+    
+    def poll(self):
+        """Deliver queued results for one time-boxed slice"""
+        # A poll run by hand (finish_saves) can leave a scheduled one pending
+        if self.done:
+            return
+        finished = self.finished
+        deadline = time.perf_counter() + JOB_SLICE_SECONDS
+        while not self.cancelled.is_set():
+            try:
+                item = self.items.get_nowait()
+            except queue.Empty:
+                break
+            if self.on_item:
+                self.on_item(item)
+            if time.perf_counter() >= deadline:
+                break
+        
+        if finished and (self.items.empty() or self.cancelled.is_set()):
+            self.done = True
+            if self.on_done:
+                self.on_done(self)
+        else:
+            self.root.after(JOB_POLL_MS, self.poll)
+
+
+# Delays for deferred UI work: cursor/status refreshes run once per frame,
+# heavy re-highlighting waits a little longer so bursts of typing coalesce
+FRAME_MS = 16
+HEAVY_UPDATE_MS = 50
+
+
+class UpdateScheduler:
+    """Coalesce repeated UI refresh requests into one deferred call per priority"""
+    
+    def __init__(self, root):
+        self.root = root
+        self.tasks = {}    # name -> (callback, delay in ms), in run order
+        self.pending = {}  # delay -> names requested since the last flush
+        self.jobs = {}     # delay -> pending after() id
+    
+    def register(self, name, callback, delay=FRAME_MS):
+        """Add a named refresh task that runs delay ms after it is first requested"""
+        self.tasks[name] = (callback, delay)
+    
+    def request(self, *names):
+        """Ask for tasks to run; repeated requests before they run cost nothing"""
+        for name in names:
+            callback, delay = self.tasks[name]
+            self.pending.setdefault(delay, set()).add(name)
+            if delay not in self.jobs:
+                self.jobs[delay] = self.root.after(delay, lambda d=delay: self.flush(d))
+    
+    def flush(self, delay):
+        """Run every task requested at this priority"""
+        self.jobs.pop(delay, None)
+        names = self.pending.pop(delay, set())
+        for name, (callback, task_delay) in self.tasks.items():
+            if name in names:
+                callback()
+    
+    def cancel(self):
+        """Drop all pending work"""
+        for job in self.jobs.values():
+            self.root.after_cancel(job)
+        self.jobs.clear()
+        self.pending.clear()
+
+
+# Later launches hand their files to the running instance over this socket
+INSTANCE_SOCKET = os.path.join(os.path.expanduser('~'), '.modern_notepad', 'instance.sock')
+INSTANCE_TIMEOUT_SECONDS = 2.0
+
+
+def forward_to_instance(files, socket_path=INSTANCE_SOCKET):
+    """Ask a running instance to open files; returns False if there is none"""
+    if not hasattr(socket, 'AF_UNIX'):
+        return False
+    message = json.dumps({'files': [os.path.abspath(path) for path in files]}) + '\n'
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.settimeout(INSTANCE_TIMEOUT_SECONDS)
+            client.connect(socket_path)
+            client.sendall(message.encode('utf-8'))
+            return client.makefile('r', encoding='utf-8').readline().strip() == 'ok'
+    except OSError:
+        return False
+
+
+class InstanceServer:
+    """Unix socket that lets later launches open their files in this process
+    
+    serve() is a BackgroundJob work function: it accepts connections and
+    emits the file list each one sends, until the job is cancelled.
+    """
+    
+    def __init__(self, socket_path=INSTANCE_SOCKET):
+        self.socket_path = socket_path
+        os.makedirs(os.path.dirname(socket_path), exist_ok=True)
+        if os.path.exists(socket_path):
+            # Nothing answered on it, so it was left by an instance that died
+            os.remove(socket_path)
+        self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.server.bind(socket_path)
+        os.chmod(socket_path, 0o600)
+        self.server.listen(8)
+        self.server.settimeout(0.5)
+    
+    def serve(self, job):
+        """Accept launches and emit their file lists"""
+        while not job.cancelled.is_set():
+            try:
+                connection, address = self.server.accept()
+            except socket.timeout:
+                continue
+            with connection:
+                connection.settimeout(INSTANCE_TIMEOUT_SECONDS)
+                try:
+                    request = json.loads(connection.makefile('r', encoding='utf-8').readline())
+                    if not job.emit(request.get('files', [])):
+                        return
+                    connection.sendall(b'ok\n')
+                except (OSError, ValueError):
+                    continue
+    
+    def close(self):
+        """Stop listening and remove the socket file"""
+        self.server.close()
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+
+def parse_arguments(argv=None):
+    """Parse the command line"""
+    parser = argparse.ArgumentParser(description="Modern Notepad")
+    parser.add_argument('files', nargs='*', help="files to open")
+    parser.add_argument('--new-instance', action='store_true',
+                        help="start a separate window instead of using a running one")
+    parser.add_argument('--profile-startup', action='store_true',
+                        help="print how long each part of startup took")
+    parser.add_argument('--profile-handlers', action='store_true',
+                        help="time event handlers and show the slowest in the window")
+    return parser.parse_args(argv)
+
+
+class StartupProfile:
+    """Time the phases of startup for --profile-startup"""
+    
+    def __init__(self, started=STARTUP_STARTED):
+        self.started = started
+        self.last = started
+        self.phases = []  # (name, seconds)
+    
+    def mark(self, name):
+        """Close the phase that ran since the previous mark"""
+        now = time.perf_counter()
+        self.phases.append((name, now - self.last))
+        self.last = now
+    
+    def report(self):
+        """Return the phase timings as printable lines"""
+        lines = [f"{name:<20}{seconds * 1000:8.1f} ms" for name, seconds in self.phases]
+        lines.append(f"{'total':<20}{(self.last - self.started) * 1000:8.1f} ms")
+        return "\n".join(lines)
+
+
+# Handlers timed by --profile-handlers: input, the deferred UI updates and
+# the mode switches
+PROFILED_HANDLERS = (
+    'on_key_press', 'on_key_release', 'on_click', 'on_text_edit', 'style_edit',
+    'update_line_numbers', 'update_status', 'update_current_formatting',
+    'highlight_dirty_lines', 'refresh_visible_images',
+    'switch_to_normal_mode', 'switch_to_code_mode', 'switch_to_spreadsheet_mode',
+)
+PROFILE_RING_SIZE = 4096  # latest durations kept per handler
+PROFILE_TRACE_EVENTS = 100000  # latest calls kept for the trace export
+PROFILE_HUD_MS = 500
+
+
+class HandlerProfiler:
+    """Latency of the event handlers, for --profile-handlers
+    
+    Each handler keeps its latest durations in a fixed-size ring, so the
+    percentiles describe recent behaviour and memory stays flat however long
+    the editor runs. The latest calls are also kept in order for export as
+    Chrome trace events (chrome://tracing or Perfetto).
+    """
+    
+    def __init__(self, ring_size=PROFILE_RING_SIZE, trace_size=PROFILE_TRACE_EVENTS):
+        self.ring_size = ring_size
+        self.rings = {}  # handler name -> array of seconds
+        self.positions = {}  # handler name -> next slot to overwrite once full
+        self.counts = {}  # handler name -> calls since profiling began
+        self.events = deque(maxlen=trace_size)  # (name, start, seconds)
+        self.started = time.perf_counter()
+        self.thread_id = threading.get_ident()
+    
+    def wrap(self, name, handler):
+        """Return handler timed under name"""
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return handler(*args, **kwargs)
+            finally:
+                self.record(name, start, time.perf_counter() - start)
+        timed.__wrapped__ = handler
+        return timed
+    
+    def record(self, name, start, seconds):
+        """Store one call that began at start (perf_counter) and took seconds"""
+        ring = self.rings.get(name)
+        if ring is None:
+            ring = self.rings[name] = array('d')
+            self.positions[name] = 0
+            self.counts[name] = 0
+        if len(ring) < self.ring_size:
+            ring.append(seconds)
+        else:
+            position = self.positions[name]
+            ring[position] = seconds
+            self.positions[name] = (position + 1) % self.ring_size
+        self.counts[name] += 1
+        self.events.append((name, start, seconds))
+    
+    def stats(self):
+        """Return (name, calls, p50, p95, p99, max) in seconds, slowest p95 first"""
+        rows = []
+        for name, ring in self.rings.items():
+            ordered = sorted(ring)
+            last = len(ordered) - 1
+            rows.append((name, self.counts[name],
+                         ordered[int(last * 0.50)], ordered[int(last * 0.95)],
+                         ordered[int(last * 0.99)], ordered[last]))
+        rows.sort(key=lambda row: row[3], reverse=True)
+        return rows
+    
+    def recent(self, since):
+        """Return (calls over FRAME_MS, total seconds) for calls begun after since"""
+        over = 0
+        busy = 0.0
+        for name, start, seconds in reversed(self.events):
+            if start < since:
+                break
+            busy += seconds
+            if seconds * 1000 > FRAME_MS:
+                over += 1
+        return over, busy
+    
+    def chrome_trace(self):
+        """Return the recorded calls in Chrome's trace event format"""
+        pid = os.getpid()
+        events = [{'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': self.thread_id,
+                   'args': {'name': 'Tk event loop'}}]
+        for name, start, seconds in self.events:
+            events.append({'name': name, 'cat': 'handler', 'ph': 'X', 'pid': pid,
+                           'tid': self.thread_id,
+                           'ts': round((start - self.started) * 1e6, 3),
+                           'dur': round(seconds * 1e6, 3)})
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+
+class ModernNotepad:
+    def __init__(self, startup=None, profile_handlers=False):
+        # Startup phases are timed for --profile-startup
+        self.startup = startup or StartupProfile(time.perf_counter())
+        
+        # Handlers are wrapped before any binding or menu captures them
+        self.profiler = HandlerProfiler() if profile_handlers else None
+        if self.profiler:
+            for name in PROFILED_HANDLERS:
+                setattr(self, name, self.profiler.wrap(name, getattr(self, name)))
         self.root = tk.Tk()
+        self.startup.mark('tk')
         self.root.title("Modern Notepad")
         self.root.geometry("800x600")
         self.root.minsize(600, 400)
@@ -37,6 +2018,7 @@ class ModernNotepad:
         
         # Configure style
         self.setup_styles()
+        self.startup.mark('styles')
         
         # Variables
         self.current_file = None
@@ -46,6 +2028,74 @@ class ModernNotepad:
         self.line_numbers_frame = None
         self.line_numbers_canvas = None
         self.current_language = "Python"
+        self.highlighter = SyntaxHighlighter(self.current_language)
+        self.highlight_job = None
+        
+        # Large-file mode state; the file is paged into the widget when set
+        self.large_file = None
+        self.large_file_job = None
+        self.large_file_window = (1, 0)  # first and last file line loaded
+        self.large_file_threshold = LARGE_FILE_THRESHOLD
+        
+        # The document text and its line lengths, updated from edit deltas;
+        # whole-buffer reads go to these rather than the widget
+        self.document = PieceTable()
+        self.line_index = LineIndex()
+        
+        # Normal-mode formatting as runs of interned styles, one tag per style
+        self.style_table = StyleTable()
+        self.style_runs = StyleRuns()
+        self.configured_styles = set()
+        self.typing_style = None  # style for the character being typed
+        
+        # Pasted and loaded images: the store holds their data and decoded
+        # photos; embedded images show a blank placeholder until decoded
+        self.image_store = ImageStore(self.root)
+        self.image_placeholder = tk.PhotoImage(width=1, height=1)
+        self.embedded_images = {}  # image name -> blob hash
+        self.shown_images = {}  # image name -> blob hash of the photo it shows
+        self.visible_blobs = set()
+        self.edit_generation = 0  # bumped on every edit
+        
+        # Saves run on a worker; a save requested meanwhile waits its turn
+        self.save_job = None
+        self.pending_save = None
+        
+        # Text files stream in from a worker; while loading_text is set, edits
+        # are the program's own and do not count as unsaved changes
+        self.text_load_job = None
+        self.text_load_shown = False
+        self.loading_text = False
+        
+        # Crash-recovery journal of unsaved edits
+        self.journal = None
+        
+        # Find/replace: match offsets from the last search, in document order
+        self.find_bar = None
+        self.find_bar_shown = False
+        self.search_job = None
+        self.search_query = None
+        self.search_starts = array('Q')
+        self.search_ends = array('Q')
+        self.search_anchor = 0
+        self.search_select_pending = False
+        
+        # Find in Files window, its running search and result rows
+        self.find_files_window = None
+        self.find_files_job = None
+        self.find_files_hits = {}  # tree item -> (path, line)
+        self.find_files_count = 0
+        self.pending_jump = None  # line to show once an opening file loads
+        
+        # Open documents; only the active one is in the text widget
+        self.tabs = [DocumentTab()]
+        self.active_tab = self.tabs[0]
+        self.tab_bar = None
+        
+        # Files waiting to be opened, and the socket later launches use
+        self.open_queue = []
+        self.instance_server = None
+        self.instance_job = None
         
         # Supported programming languages
         self.languages = [
@@ -56,8 +2106,11 @@ class ModernNotepad:
         
         # Create UI
         self.create_header()
+        self.startup.mark('header')
+        self.create_tab_bar()
         self.create_text_area()
         self.create_status_bar()
+        self.startup.mark('text area')
         
         # Initialize formatting state tracking
         self.current_formatting = {
@@ -69,8 +2122,25 @@ class ModernNotepad:
             'highlight': None
         }
         
+        # Deferred refresh work shared by key and mouse handlers
+        self.scheduler = UpdateScheduler(self.root)
+        self.scheduler.register('status', self.update_status)
+        self.scheduler.register('formatting', self.update_current_formatting)
+        self.scheduler.register('line_numbers', self.update_line_numbers)
+        self.scheduler.register('highlight', self.highlight_dirty_lines, HEAVY_UPDATE_MS)
+        self.scheduler.register('large_file_window', self.update_large_file_window)
+        self.scheduler.register('images', self.refresh_visible_images)
+        self.scheduler.register('search', self.start_search, HEAVY_UPDATE_MS)
+        self.scheduler.register('search_highlight', self.highlight_search_matches)
+        
         # Bind events
         self.bind_events()
+        self.startup.mark('bindings')
+        
+        # Autosave journal upkeep and recovery from a previous crash
+        self.root.after(AUTOSAVE_CHECK_MS, self.check_journal)
+        self.root.after_idle(self.offer_recovery)
+        self.root.after(TAB_SPILL_CHECK_MS, self.spill_idle_tabs)
         
         # Set initial focus
         self.text_area.focus_set()
@@ -192,26 +2262,9 @@ class ModernNotepad:
         # Right side - Always on top button
         right_frame = ttk.Frame(self.header_frame, style='Header.TFrame')
         right_frame.pack(side='right', padx=10, pady=8)
+        self.header_tools_frame = right_frame
         
-        # Language selector (initially hidden, shown in code mode)
-        self.language_frame = ttk.Frame(right_frame, style='Header.TFrame')
-        self.language_frame.pack(side='left', padx=(0, 10), pady=0)
-        
-        self.language_label = ttk.Label(self.language_frame, text="Language:", 
-                                      style='Header.TLabel', foreground='white')
-        self.language_label.pack(side='left', padx=(0, 5))
-        
-        self.language_var = tk.StringVar(value="Python")
-        self.language_dropdown = ttk.Combobox(self.language_frame, 
-                                           textvariable=self.language_var,
-                                           values=self.languages,
-                                           width=12,
-                                           state="readonly")
-        self.language_dropdown.pack(side='left')
-        self.language_dropdown.bind("<<ComboboxSelected>>", self.on_language_change)
-        
-        # Hide language selector initially (shown only in code mode)
-        self.language_frame.pack_forget()
+        # The language selector is only built on first entering code mode
         
         # Text formatting toolbar (shown only in normal mode)
         self.formatting_frame = ttk.Frame(right_frame, style='Header.TFrame')
@@ -262,6 +2315,23 @@ class ModernNotepad:
         self.header_separator = ttk.Separator(self.root, orient='horizontal')
         self.header_separator.pack(fill='x', pady=(0, 1))
     
+    def create_language_selector(self):
+        """Create the code-mode language selector in the header"""
+        self.language_frame = ttk.Frame(self.header_tools_frame, style='Header.TFrame')
+        
+        self.language_label = ttk.Label(self.language_frame, text="Language:", 
+                                      style='Header.TLabel', foreground='white')
+        self.language_label.pack(side='left', padx=(0, 5))
+        
+        self.language_var = tk.StringVar(value=self.current_language)
+        self.language_dropdown = ttk.Combobox(self.language_frame, 
+                                           textvariable=self.language_var,
+                                           values=self.languages,
+                                           width=12,
+                                           state="readonly")
+        self.language_dropdown.pack(side='left')
+        self.language_dropdown.bind("<<ComboboxSelected>>", self.on_language_change)
+    
     def create_menu_bar(self):
         """Create menu bar with File menu"""
         menubar = tk.Menu(self.root, bg='#1e1e1e', fg='white', 
@@ -282,6 +2352,9 @@ class ModernNotepad:
         
         file_menu.add_command(label="New                    Ctrl+N", command=self.new_file)
         file_menu.add_command(label="Open                   Ctrl+O", command=self.open_file)
+        file_menu.add_command(label="New Tab                Ctrl+T", command=self.new_tab)
+        file_menu.add_command(label="Close Tab              Ctrl+W", command=self.close_tab)
+        file_menu.add_command(label="Cancel Loading            Esc", command=self.cancel_loading)
         file_menu.add_separator()
         file_menu.add_command(label="Save                   Ctrl+S", command=self.save_file)
         file_menu.add_command(label="Save As          Ctrl+Shift+S", command=self.save_as_file)
@@ -299,6 +2372,13 @@ class ModernNotepad:
         edit_menu.add_command(label="Cut                    Ctrl+X", command=self.cut_text)
         edit_menu.add_separator()
         edit_menu.add_command(label="Select All             Ctrl+A", command=self.select_all)
+        edit_menu.add_command(label="Go to Line...          Ctrl+G", command=self.goto_line)
+        edit_menu.add_separator()
+        edit_menu.add_command(label="Find...                Ctrl+F", command=self.show_find_bar)
+        edit_menu.add_command(label="Replace...             Ctrl+H", command=lambda: self.show_find_bar(replace=True))
+        edit_menu.add_command(label="Find Next              F3", command=self.find_next)
+        edit_menu.add_command(label="Find Previous          Shift+F3", command=lambda: self.find_next(backwards=True))
+        edit_menu.add_command(label="Find in Files...       Ctrl+Shift+F", command=self.show_find_in_files)
         
         # View menu
         theme = self.themes[self.current_theme]
@@ -314,6 +2394,11 @@ class ModernNotepad:
         view_menu.add_command(label="Code Mode", command=self.switch_to_code_mode)
         view_menu.add_command(label="Spreadsheet Mode", command=self.switch_to_spreadsheet_mode)
         view_menu.add_separator()
+        view_menu.add_command(label="Large File Threshold...", command=self.change_large_file_threshold)
+        view_menu.add_command(label="Memory Report", command=self.show_memory_report)
+        view_menu.add_command(label="Performance HUD", command=self.toggle_performance_hud)
+        view_menu.add_command(label="Export Performance Trace...", command=self.export_performance_trace)
+        view_menu.add_separator()
         
         # Theme submenu
         theme_menu = tk.Menu(view_menu, tearoff=0, bg=menu_bg, fg=menu_fg,
@@ -353,6 +2438,9 @@ class ModernNotepad:
                                 padx=15,
                                 pady=15)
         
+        # Route edits through a proxy so derived state can follow them
+        self.install_edit_hook()
+        
         # Create context menu for right-click
         self.create_context_menu()
         
@@ -360,8 +2448,8 @@ class ModernNotepad:
         self.apply_theme_to_text_area()
         
         # Scrollbar
-        self.scrollbar = ttk.Scrollbar(self.text_container, orient='vertical', command=self.text_area.yview)
-        self.text_area.configure(yscrollcommand=self.scrollbar.set)
+        self.scrollbar = ttk.Scrollbar(self.text_container, orient='vertical', command=self.on_scrollbar)
+        self.text_area.configure(yscrollcommand=self.on_text_yview)
         
         # Pack text area and scrollbar
         self.text_area.pack(side='left', fill='both', expand=True)
@@ -370,6 +2458,148 @@ class ModernNotepad:
         # Configure syntax highlighting tags
         self.setup_syntax_highlighting()
     
+    def install_edit_hook(self):
+        """Intercept insert/delete/replace calls made on the text widget"""
+        widget = self.text_area._w
+        self.text_area_command = widget + "_orig"
+        self.root.tk.call("rename", widget, self.text_area_command)
+        self.root.tk.createcommand(widget, self.text_widget_proxy)
+    
+    def text_widget_proxy(self, operation, *args):
+        """Forward a Tcl widget command and report any edit it made"""
+        call = self.root.tk.call
+        command = self.text_area_command
+        if operation not in ('insert', 'delete', 'replace', 'image') or \
+                str(call(command, 'cget', '-state')) == 'disabled':
+            return call(command, operation, *args)
+        
+        def index(position):
+            return str(call(command, 'index', position))
+        
+        if operation == 'image':
+            if args[0] != 'create':
+                return call(command, operation, *args)
+            # An embedded image takes up one index position
+            start = index(args[1])
+            if start == index('end'):
+                start = index('end-1c')
+            result = call(command, operation, *args)
+            self.on_text_edit('insert', start, '\ufffc')
+            return result
+        
+        if operation == 'insert':
+            # Text inserted at "end" actually lands before the final newline
+            start = index(args[0])
+            if start == index('end'):
+                start = index('end-1c')
+            result = call(command, operation, *args)
+            self.on_text_edit('insert', start, ''.join(str(chars) for chars in args[1::2]))
+            return result
+        
+        if len(args) > 2 and operation == 'delete':
+            # Multi-range delete; too rare to track precisely
+            result = call(command, operation, *args)
+            self.on_text_edit('reset', '1.0', '')
+            return result
+        
+        start = index(args[0])
+        if operation == 'delete' and len(args) == 1:
+            end = index(f"{args[0]}+1c")
+        else:
+            end = index(args[1])
+        last = index('end-1c')
+        if self.root.tk.getboolean(call(command, 'compare', end, '>', last)):
+            end = last
+        
+        removes_text = self.root.tk.getboolean(call(command, 'compare', start, '<', end))
+        
+        result = call(command, operation, *args)
+        if removes_text:
+            self.on_text_edit('delete', start, end)
+        if operation == 'replace':
+            self.on_text_edit('insert', start, ''.join(str(chars) for chars in args[2::2]))
+        return result
+    
+    def on_text_edit(self, operation, start, data):
+        """Keep derived state in step with an edit to the text widget
+        
+        For 'insert' data is the inserted text, for 'delete' it is the end
+        index of the removed range (both indices taken before the edit).
+        """
+        if self.large_file:
+            # Page swaps in read-only large-file mode are not user edits
+            return
+        
+        line, column = map(int, start.split('.'))
+        offset = self.line_index.line_to_offset(line) + column
+        if operation == 'insert':
+            self.document.insert(offset, data)
+            self.line_index.insert(line, column, data)
+            value = data
+        elif operation == 'delete':
+            end_line, end_column = map(int, data.split('.'))
+            value = self.line_index.line_to_offset(end_line) + end_column - offset
+            self.document.delete(offset, value)
+            self.line_index.delete(line, column, end_line, end_column)
+        else:
+            self.document.load(self.read_text_widget())
+            self.line_index.load(self.document.text())
+            value = None
+        self.style_edit(operation, offset, value)
+        
+        if not self.loading_text:
+            self.edit_generation += 1
+            self.on_text_change()
+            self.journal_edit(operation, offset, value)
+            if self.find_bar_shown:
+                self.scheduler.request('search')
+        
+        if not self.is_code_mode:
+            return
+        
+        if operation == 'insert':
+            self.highlighter.lines_inserted(line, data.count('\n'))
+        elif operation == 'delete':
+            end_line = int(data.split('.')[0])
+            self.highlighter.lines_deleted(line, end_line - line)
+        else:
+            self.highlighter.reset(self.get_line_count())
+    
+    def get_line_count(self):
+        """Return the number of lines in the text widget"""
+        return int(self.text_area.index(tk.END + '-1c').split('.')[0])
+    
+    def on_text_yview(self, first, last):
+        """Track vertical scrolling of the text area"""
+        if self.large_file and self.large_file.indexed_lines:
+            # Show the position within the whole file, not the loaded window
+            window_first, window_last = self.large_file_window
+            window_lines = window_last - window_first + 1
+            total = self.large_file.indexed_lines
+            self.scrollbar.set((window_first - 1 + float(first) * window_lines) / total,
+                               (window_first - 1 + float(last) * window_lines) / total)
+            self.scheduler.request('large_file_window')
+        else:
+            self.scrollbar.set(first, last)
+        
+        if self.embedded_images:
+            self.scheduler.request('images')
+        if self.search_starts:
+            self.scheduler.request('search_highlight')
+        
+        # Keep the gutter in step with scrollbar drags and wheel scrolling
+        self.update_line_numbers()
+        
+        # Newly exposed lines jump the background highlighting queue
+        if self.is_code_mode and self.highlighter.dirty:
+            self.schedule_highlight_catchup()
+    
+    def get_visible_line_range(self):
+        """Return the first and last line numbers shown in the text area"""
+        first_line = int(self.text_area.index('@0,0').split('.')[0])
+        last_line = int(self.text_area.index(f'@0,{self.text_area.winfo_height()}').split('.')[0])
+        return first_line, last_line
+    
     def create_status_bar(self):
         """Create status bar"""
         self.status_bar = ttk.Label(self.root, text="Ready", style='Status.TLabel')
@@ -382,38 +2612,1034 @@ class ModernNotepad:
         self.root.bind('<Control-o>', lambda e: self.open_file())
         self.root.bind('<Control-s>', lambda e: self.save_file())
         self.root.bind('<Control-Shift-S>', lambda e: self.save_as_file())
+        self.root.bind('<Escape>', lambda e: self.cancel_loading())
         
         # Edit shortcuts
         self.root.bind('<Control-c>', lambda e: self.copy_text())
         self.root.bind('<Control-v>', lambda e: self.paste_content())
         self.root.bind('<Control-x>', lambda e: self.cut_text())
         self.root.bind('<Control-a>', lambda e: self.select_all())
-        
-        # Text modification tracking
-        self.text_area.bind('<KeyPress>', self.on_text_change)
-        self.text_area.bind('<Button-1>', self.update_status)
-        self.text_area.bind('<KeyRelease>', self.update_status)
-        
-        # Formatting inheritance for new text
-        self.text_area.bind('<KeyPress>', self.on_key_press_format, add='+')
-        self.text_area.bind('<Button-1>', self.update_current_formatting, add='+')
-        self.text_area.bind('<KeyRelease>', self.update_current_formatting, add='+')
-        
-        # Text replacement when typing over selection
-        self.text_area.bind('<Key>', self.handle_text_replacement, add='+')
-        self.text_area.bind('<BackSpace>', self.handle_backspace, add='+')
-        self.text_area.bind('<Delete>', self.handle_delete, add='+')
-        
-        # Code mode specific bindings
+        self.root.bind('<Control-g>', lambda e: self.goto_line())
+        self.root.bind('<Control-f>', lambda e: self.show_find_bar())
+        self.root.bind('<Control-h>', lambda e: self.show_find_bar(replace=True))
+        self.root.bind('<F3>', lambda e: self.find_next())
+        self.root.bind('<Shift-F3>', lambda e: self.find_next(backwards=True))
+        self.root.bind('<Control-Shift-F>', lambda e: self.show_find_in_files())
+        self.root.bind('<Control-t>', lambda e: self.new_tab())
+        self.root.bind('<Control-w>', lambda e: self.close_tab())
+        self.root.bind('<Control-Tab>', lambda e: self.cycle_tabs())
+        # Text widgets use Ctrl+T to transpose and Ctrl+Tab to move focus
+        self.text_area.bind('<Control-t>', lambda e: self.new_tab())
+        self.text_area.bind('<Control-Tab>', lambda e: self.cycle_tabs())
+        # The text widget's own Ctrl+F/Ctrl+H move the cursor and delete
+        self.text_area.bind('<Control-f>', lambda e: self.show_find_bar())
+        self.text_area.bind('<Control-h>', lambda e: self.show_find_bar(replace=True))
+        
+        # One handler per event; follow-up refreshes go through the scheduler
+        # (text modification is tracked by the edit hook)
+        self.text_area.bind('<KeyPress>', self.on_key_press)
         self.text_area.bind('<KeyRelease>', self.on_key_release)
         self.text_area.bind('<Button-1>', self.on_click)
         
+        # Text replacement when deleting a selection
+        self.text_area.bind('<BackSpace>', self.handle_backspace)
+        self.text_area.bind('<Delete>', self.handle_delete)
+        
         # Right-click context menu
         self.text_area.bind('<Button-3>', self.show_context_menu)
         
         # Window close event
         self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
     
+    def open_large_file(self, file_path):
+        """Open a file in read-only large-file mode, paging it in as needed"""
+        self.close_large_file()
+        self.large_file = MappedTextFile(file_path)
+        self.large_file_window = (1, 0)
+        
+        self.text_area.configure(state='normal')
+        self.text_area.delete(1.0, tk.END)
+        self.text_area.configure(state='disabled')
+        self.text_area.edit_reset()
+        self.document.load("")
+        self.line_index.load("")
+        self.style_runs.load(0)
+        self.clear_search()
+        
+        self.current_file = file_path
+        self.text_modified = False
+        self.update_title()
+        
+        self.large_file_job = BackgroundJob(self.root, self.large_file.build_index,
+                                            on_item=self.on_large_file_progress,
+                                            on_done=self.on_large_file_indexed).start()
+        self.status_bar.configure(text=f"Indexing {os.path.basename(file_path)}...")
+    
+    def close_large_file(self):
+        """Leave large-file mode"""
+        if not self.large_file:
+            return
+        self.large_file_job.cancel()
+        self.text_area.configure(state='normal')
+        self.text_area.delete(1.0, tk.END)
+        self.text_area.edit_reset()
+        self.large_file.close()
+        self.large_file = None
+        self.document.load("")
+        self.line_index.load("")
+        self.style_runs.load(0)
+    
+    def on_large_file_progress(self, fraction):
+        """Show indexing progress and page in lines as they become known"""
+        self.status_bar.configure(
+            text=f"Indexing {os.path.basename(self.current_file)}... {fraction:.0%}")
+        self.scheduler.request('large_file_window')
+    
+    def on_large_file_indexed(self, job):
+        """Indexing finished"""
+        if job is not self.large_file_job or job.cancelled.is_set():
+            return
+        if job.error:
+            messagebox.showerror("Error", f"Could not index file: {str(job.error)}")
+            return
+        self.update_large_file_window()
+        self.finish_pending_jump()
+        self.status_bar.configure(
+            text=f"Opened: {os.path.basename(self.current_file)} "
+                 f"({self.large_file.line_count:,} lines, read-only)")
+    
+    def update_large_file_window(self):
+        """Slide the loaded page window so it surrounds the visible lines"""
+        if not self.large_file:
+            return
+        window_first, window_last = self.large_file_window
+        top_line = window_first + self.get_visible_line_range()[0] - 1
+        # Scrolling inside the loaded window is left alone, so it stays smooth
+        self.load_large_file_window(top_line, scroll=False)
+    
+    def load_large_file_window(self, top_line, scroll=True):
+        """Load the pages around a file line and scroll so it is at the top
+        
+        With scroll False the view only moves when the window itself changes.
+        """
+        available = self.large_file.indexed_lines
+        top_line = max(1, min(top_line, available or 1))
+        
+        page_start = (top_line - 1) // LARGE_FILE_PAGE_LINES * LARGE_FILE_PAGE_LINES + 1
+        first = max(1, page_start - LARGE_FILE_PAGE_LINES)
+        last = min(available, first + LARGE_FILE_WINDOW_PAGES * LARGE_FILE_PAGE_LINES - 1)
+        window_first, window_last = self.large_file_window
+        if last < first:
+            return
+        if (first, last) == (window_first, window_last):
+            if scroll:
+                self.text_area.yview(f"{top_line - first + 1}.0")
+            return
+        
+        self.text_area.configure(state='normal')
+        if first > window_last or last < window_first or window_last < window_first:
+            # No overlap: replace the whole window
+            self.text_area.delete(1.0, tk.END)
+            self.text_area.insert('1.0', self.large_file.read_lines(first, last))
+        else:
+            # Trim and extend at the bottom, then at the top
+            if last < window_last:
+                self.text_area.delete(f"{last - window_first + 2}.0", tk.END)
+            elif last > window_last:
+                self.text_area.insert('end-1c', self.large_file.read_lines(window_last + 1, last))
+            if first > window_first:
+                self.text_area.delete('1.0', f"{first - window_first + 1}.0")
+            elif first < window_first:
+                self.text_area.insert('1.0', self.large_file.read_lines(first, window_first - 1))
+        self.text_area.configure(state='disabled')
+        
+        self.large_file_window = (first, last)
+        self.text_area.yview(f"{top_line - first + 1}.0")
+        if self.is_code_mode:
+            self.apply_syntax_highlighting()
+    
+    def on_scrollbar(self, *args):
+        """Scrollbar command; in large-file mode it spans the whole file"""
+        if self.large_file and args and args[0] == 'moveto' and self.large_file.indexed_lines:
+            self.load_large_file_window(int(float(args[1]) * self.large_file.indexed_lines) + 1)
+        else:
+            self.text_area.yview(*args)
+    
+    def change_large_file_threshold(self):
+        """Ask for the size above which files open in large-file mode"""
+        size_mb = simpledialog.askinteger(
+            "Large File Threshold",
+            "Open files larger than this many MB in read-only large-file mode:",
+            initialvalue=self.large_file_threshold // (1024 * 1024), minvalue=1, parent=self.root)
+        if size_mb:
+            self.large_file_threshold = size_mb * 1024 * 1024
+            self.status_bar.configure(text=f"Large-file threshold set to {size_mb} MB")
+    
+    def goto_line(self):
+        """Ask for a line number and jump to it"""
+        if self.large_file:
+            total = self.large_file.indexed_lines
+        else:
+            total = self.line_index.line_count
+        line = simpledialog.askinteger("Go to Line", f"Line number (1-{total:,}):",
+                                       minvalue=1, maxvalue=max(total, 1), parent=self.root)
+        if line:
+            self.jump_to_line(line)
+        return "break"
+    
+    def jump_to_line(self, line):
+        """Move the cursor to the start of a line and scroll it into view"""
+        if self.large_file:
+            # Page in the window around the line first; line is a file line
+            self.load_large_file_window(line)
+            line = line - self.large_file_window[0] + 1
+        self.text_area.mark_set(tk.INSERT, f"{line}.0")
+        self.text_area.see(tk.INSERT)
+        self.text_area.focus_set()
+        self.scheduler.request('status', 'line_numbers')
+    
+    def create_find_bar(self):
+        """Create the find/replace bar under the text area"""
+        self.find_bar = ttk.Frame(self.text_container.master, style='Header.TFrame', padding=(8, 6))
+        self.find_var = tk.StringVar()
+        self.replace_var = tk.StringVar()
+        self.find_regex = tk.BooleanVar(value=False)
+        self.find_match_case = tk.BooleanVar(value=False)
+        self.find_whole_word = tk.BooleanVar(value=False)
+        
+        find_row = ttk.Frame(self.find_bar, style='Header.TFrame')
+        find_row.pack(fill='x')
+        ttk.Label(find_row, text="Find:", width=8, style='Header.TLabel').pack(side='left')
+        self.find_entry = ttk.Entry(find_row, textvariable=self.find_var, width=40)
+        self.find_entry.pack(side='left', fill='x', expand=True, padx=(0, 5))
+        ttk.Button(find_row, text="▲", width=3, style='Header.TButton',
+                   command=lambda: self.find_next(backwards=True)).pack(side='left', padx=2)
+        ttk.Button(find_row, text="▼", width=3, style='Header.TButton',
+                   command=self.find_next).pack(side='left', padx=2)
+        ttk.Checkbutton(find_row, text="Regex", variable=self.find_regex).pack(side='left', padx=5)
+        ttk.Checkbutton(find_row, text="Match case", variable=self.find_match_case).pack(side='left', padx=5)
+        ttk.Checkbutton(find_row, text="Whole word", variable=self.find_whole_word).pack(side='left', padx=5)
+        ttk.Button(find_row, text="✕", width=3, style='Header.TButton',
+                   command=self.hide_find_bar).pack(side='right')
+        
+        self.replace_row = ttk.Frame(self.find_bar, style='Header.TFrame')
+        ttk.Label(self.replace_row, text="Replace:", width=8, style='Header.TLabel').pack(side='left')
+        self.replace_entry = ttk.Entry(self.replace_row, textvariable=self.replace_var, width=40)
+        self.replace_entry.pack(side='left', fill='x', expand=True, padx=(0, 5))
+        ttk.Button(self.replace_row, text="Replace", style='Header.TButton',
+                   command=self.replace_current).pack(side='left', padx=2)
+        ttk.Button(self.replace_row, text="Replace All", style='Header.TButton',
+                   command=self.replace_all).pack(side='left', padx=2)
+        
+        # Any change to the query searches again once typing pauses
+        for variable in (self.find_var, self.find_regex, self.find_match_case, self.find_whole_word):
+            variable.trace_add('write', lambda *args: self.on_find_changed())
+        
+        self.find_entry.bind('<Return>', lambda e: self.find_next())
+        self.find_entry.bind('<Shift-Return>', lambda e: self.find_next(backwards=True))
+        self.find_entry.bind('<Escape>', lambda e: self.hide_find_bar())
+        self.replace_entry.bind('<Return>', lambda e: self.replace_current())
+        self.replace_entry.bind('<Escape>', lambda e: self.hide_find_bar())
+        
+        # Matches sit above formatting but under the selection
+        self.text_area.tag_configure('search_match', background='#f9e79f', foreground='#000000')
+        self.text_area.tag_lower('search_match', tk.SEL)
+    
+    def show_find_bar(self, replace=False):
+        """Open the find bar, with the replace row when asked for"""
+        if self.find_bar is None:
+            self.create_find_bar()
+        if not self.find_bar_shown:
+            self.find_bar.pack(fill='x', side='bottom', before=self.text_container, pady=(5, 0))
+            self.find_bar_shown = True
+        if replace:
+            self.replace_row.pack(fill='x', pady=(5, 0))
+        else:
+            self.replace_row.pack_forget()
+        
+        # Start from a single-line selection, as most editors do
+        ranges = self.text_area.tag_ranges(tk.SEL)
+        if ranges:
+            selected = self.text_area.get(ranges[0], ranges[1])
+            if selected and '\n' not in selected:
+                self.find_var.set(selected)
+        self.find_entry.focus_set()
+        self.find_entry.select_range(0, tk.END)
+        self.on_find_changed()
+        return "break"
+    
+    def hide_find_bar(self):
+        """Close the find bar and clear its highlights"""
+        if self.find_bar_shown:
+            self.find_bar.pack_forget()
+            self.find_bar_shown = False
+            self.clear_search()
+            self.text_area.focus_set()
+        return "break"
+    
+    def on_find_changed(self):
+        """Search again from the selection once the query stops changing"""
+        ranges = self.text_area.tag_ranges(tk.SEL)
+        self.search_anchor = self.text_offset(ranges[0] if ranges else tk.INSERT)
+        self.search_select_pending = True
+        self.scheduler.request('search')
+    
+    def clear_search(self):
+        """Stop any running search and forget its matches"""
+        if self.search_job:
+            self.search_job.cancel()
+            self.search_job = None
+        self.search_starts = array('Q')
+        self.search_ends = array('Q')
+        self.search_query = None
+        self.text_area.tag_remove('search_match', '1.0', tk.END)
+    
+    def refresh_search(self):
+        """Drop matches from the previous document and search the new one"""
+        self.clear_search()
+        if self.find_bar_shown:
+            self.scheduler.request('search')
+    
+    def start_search(self):
+        """Search the document for the find-bar query on a worker thread
+        
+        Matches arrive in batches as offsets; only the ones on screen are
+        tagged, so a huge match count costs memory but not redraw time.
+        """
+        self.clear_search()
+        if not self.find_bar_shown:
+            return
+        pattern = self.find_var.get()
+        if not pattern:
+            self.search_select_pending = False
+            return
+        if self.large_file:
+            self.status_bar.configure(text="Find is not available in read-only large-file mode")
+            return
+        try:
+            compiled = compile_search(pattern, self.find_regex.get(),
+                                      self.find_match_case.get(), self.find_whole_word.get())
+        except re.error as e:
+            self.status_bar.configure(text=f"Invalid pattern: {e}")
+            return
+        
+        self.search_query = compiled
+        snapshot = self.document.snapshot()
+        
+        def work(job):
+            for batch in iter_match_batches(snapshot.text(), compiled):
+                if not job.emit(batch):
+                    return
+        
+        self.search_job = BackgroundJob(self.root, work, on_item=self.on_search_batch,
+                                        on_done=self.on_search_done).start()
+        self.status_bar.configure(text="Searching...")
+    
+    def on_search_batch(self, batch):
+        """Add a batch of matches from the search worker"""
+        for start, end in batch:
+            self.search_starts.append(start)
+            self.search_ends.append(end)
+        if self.search_select_pending:
+            # Select the first match at or after where the search started
+            match = bisect_left(self.search_starts, self.search_anchor)
+            if match < len(self.search_starts):
+                self.search_select_pending = False
+                self.select_match(match)
+                return
+        self.status_bar.configure(text=f"Searching... {len(self.search_starts):,} matches so far")
+        self.scheduler.request('search_highlight')
+    
+    def on_search_done(self, job):
+        """Report the outcome of a search"""
+        if job is not self.search_job:
+            return
+        self.search_job = None
+        if job.error:
+            self.status_bar.configure(text=f"Search failed: {str(job.error)}")
+            return
+        
+        total = len(self.search_starts)
+        if self.search_select_pending and total:
+            # Nothing after the anchor: wrap around to the first match
+            self.search_select_pending = False
+            self.select_match(0)
+        elif total:
+            self.status_bar.configure(text=f"{total:,} matches")
+        else:
+            self.status_bar.configure(text="No matches")
+        self.search_select_pending = False
+    
+    def highlight_search_matches(self):
+        """Tag the search matches that are on screen"""
+        self.text_area.tag_remove('search_match', '1.0', tk.END)
+        if not self.search_starts:
+            return
+        first_line, last_line = self.get_visible_line_range()
+        last_line = min(last_line, self.line_index.line_count)
+        top = self.line_index.line_to_offset(first_line)
+        bottom = self.line_index.line_to_offset(last_line) + self.line_index.line_length(last_line)
+        # Matches never overlap, so starts and ends are both sorted
+        first = bisect_right(self.search_ends, top)
+        last = bisect_left(self.search_starts, bottom)
+        for match in range(first, last):
+            self.text_area.tag_add('search_match', self.offset_index(self.search_starts[match]),
+                                   self.offset_index(self.search_ends[match]))
+    
+    def select_match(self, match):
+        """Select a search match and scroll it into view"""
+        start = self.offset_index(self.search_starts[match])
+        end = self.offset_index(self.search_ends[match])
+        self.text_area.tag_remove(tk.SEL, '1.0', tk.END)
+        self.text_area.tag_add(tk.SEL, start, end)
+        self.text_area.mark_set(tk.INSERT, end)
+        self.text_area.see(start)
+        self.status_bar.configure(text=f"Match {match + 1:,} of {len(self.search_starts):,}"
+                                       + (" so far" if self.search_job else ""))
+        self.scheduler.request('search_highlight', 'line_numbers')
+    
+    def find_next(self, backwards=False):
+        """Select the next (or previous) match, wrapping around the document"""
+        if not self.find_bar_shown or not self.find_var.get():
+            return self.show_find_bar()
+        total = len(self.search_starts)
+        if not total:
+            self.status_bar.configure(text="Searching..." if self.search_job else "No matches")
+            return "break"
+        
+        ranges = self.text_area.tag_ranges(tk.SEL)
+        if backwards:
+            anchor = self.text_offset(ranges[0] if ranges else tk.INSERT)
+            match = bisect_left(self.search_starts, anchor) - 1
+            if match < 0:
+                match = total - 1
+        else:
+            anchor = self.text_offset(ranges[1] if ranges else tk.INSERT)
+            match = bisect_left(self.search_starts, anchor)
+            if match >= total:
+                match = 0
+        self.select_match(match)
+        return "break"
+    
+    def replace_current(self):
+        """Replace the selected match and move on to the next one"""
+        if self.search_query is None or self.large_file:
+            return "break"
+        ranges = self.text_area.tag_ranges(tk.SEL)
+        if ranges:
+            start = self.text_offset(ranges[0])
+            end = self.text_offset(ranges[1])
+            match = bisect_left(self.search_starts, start)
+            if (match < len(self.search_starts) and self.search_starts[match] == start
+                    and self.search_ends[match] == end):
+                replacement = self.replace_var.get()
+                if self.find_regex.get():
+                    found = self.match_in_context(start, end)
+                    if not found:
+                        # The selection is no longer a match; search again
+                        self.refresh_search()
+                        return "break"
+                    replacement = found.expand(replacement)
+                self.text_area.replace(ranges[0], ranges[1], replacement)
+                # The edit searches again; pick up from after the replacement
+                self.search_anchor = start + len(replacement)
+                self.search_select_pending = True
+                return "break"
+        return self.find_next()
+    
+    def match_in_context(self, start, end):
+        """Re-match the search at a match's offsets, with the text around it in view
+        
+        Lookarounds, anchors and word boundaries see the same context they
+        did in the search. Returns None if the pattern no longer matches there.
+        """
+        window_start = max(0, start - REPLACE_CONTEXT_CHARS)
+        window_end = min(self.document.length, end + REPLACE_CONTEXT_CHARS)
+        found = self.search_query.match(self.document.slice(window_start, window_end), start - window_start)
+        if (not found or found.end() != end - window_start) and (window_start or window_end < self.document.length):
+            # The match depends on text beyond the window
+            window_start = 0
+            found = self.search_query.match(self.get_document_text(), start)
+        if found and found.end() == end - window_start:
+            return found
+        return None
+    
+    def replace_all(self):
+        """Replace every match as a single undoable edit
+        
+        The substitution runs on a worker over a snapshot and is applied
+        only if the document has not changed in the meantime. Plain text is
+        swapped in one replace call; formatted text or embedded images are
+        replaced match by match so the runs between matches survive.
+        """
+        if self.search_query is None or self.large_file:
+            self.status_bar.configure(text="No matches")
+            return
+        compiled = self.search_query
+        replacement = self.replace_var.get()
+        regex = self.find_regex.get()
+        per_match = bool(self.embedded_images) or any(
+            style_id for start, end, style_id in self.style_runs.iter_runs())
+        snapshot = self.document.snapshot()
+        generation = self.edit_generation
+        
+        def work(job):
+            text = snapshot.text()
+            if per_match:
+                job.emit(list_replacements(text, compiled, replacement, regex))
+            else:
+                job.emit(replace_matches(text, compiled, replacement, regex))
+        
+        def on_result(result):
+            if self.edit_generation != generation:
+                self.status_bar.configure(text="Document changed during Replace All; nothing was replaced")
+                return
+            if per_match:
+                count = len(result)
+            else:
+                first, last, middle, count = result
+            if not count:
+                self.status_bar.configure(text="No matches")
+                return
+            
+            # One undo step for the whole batch
+            self.text_area.configure(autoseparators=False)
+            self.text_area.edit_separator()
+            if per_match:
+                # Back to front, so earlier offsets stay valid
+                for start, end, new_text in reversed(result):
+                    self.text_area.replace(self.offset_index(start), self.offset_index(end), new_text)
+            else:
+                self.text_area.replace(self.offset_index(first), self.offset_index(last), middle)
+            self.text_area.edit_separator()
+            self.text_area.configure(autoseparators=True)
+            self.status_bar.configure(text=f"Replaced {count:,} matches")
+        
+        def on_done(job):
+            if job.error:
+                messagebox.showerror("Error", f"Could not replace: {str(job.error)}")
+        
+        BackgroundJob(self.root, work, on_item=on_result, on_done=on_done).start()
+        self.status_bar.configure(text="Replacing...")
+    
+    def show_find_in_files(self):
+        """Open the Find in Files window"""
+        if self.find_files_window is None:
+            self.create_find_in_files()
+        self.find_files_window.deiconify()
+        self.find_files_window.lift()
+        self.find_files_entry.focus_set()
+        self.find_files_entry.select_range(0, tk.END)
+        return "break"
+    
+    def create_find_in_files(self):
+        """Create the Find in Files window: a query, a folder and a result list"""
+        theme = self.themes[self.current_theme]
+        window = tk.Toplevel(self.root, bg=theme["bg"])
+        window.title("Find in Files")
+        window.geometry("800x500")
+        window.protocol("WM_DELETE_WINDOW", self.hide_find_in_files)
+        self.find_files_window = window
+        
+        start_folder = os.path.dirname(self.current_file) if self.current_file else os.getcwd()
+        self.find_files_folder = tk.StringVar(value=start_folder)
+        self.find_files_query = tk.StringVar()
+        self.find_files_type = tk.StringVar(value="All files")
+        self.find_files_regex = tk.BooleanVar(value=False)
+        self.find_files_case = tk.BooleanVar(value=False)
+        self.find_files_word = tk.BooleanVar(value=False)
+        
+        controls = ttk.Frame(window, style='Header.TFrame', padding=(10, 8))
+        controls.pack(fill='x')
+        controls.columnconfigure(1, weight=1)
+        
+        ttk.Label(controls, text="Find:", style='Header.TLabel').grid(row=0, column=0, sticky='w')
+        self.find_files_entry = ttk.Entry(controls, textvariable=self.find_files_query)
+        self.find_files_entry.grid(row=0, column=1, sticky='ew', padx=5, pady=2)
+        file_types = ["All files"] + [f"{language} (*{extension})"
+                                      for language, extension in LANGUAGE_EXTENSIONS.items()]
+        ttk.Combobox(controls, textvariable=self.find_files_type, values=file_types,
+                     state='readonly', width=22).grid(row=0, column=2, padx=5)
+        
+        ttk.Label(controls, text="Folder:", style='Header.TLabel').grid(row=1, column=0, sticky='w')
+        ttk.Entry(controls, textvariable=self.find_files_folder).grid(row=1, column=1, sticky='ew', padx=5, pady=2)
+        ttk.Button(controls, text="Browse...", style='Header.TButton',
+                   command=self.browse_find_folder).grid(row=1, column=2, sticky='ew', padx=5)
+        
+        options = ttk.Frame(controls, style='Header.TFrame')
+        options.grid(row=2, column=1, sticky='w', pady=(4, 0))
+        ttk.Checkbutton(options, text="Regex", variable=self.find_files_regex).pack(side='left', padx=(0, 10))
+        ttk.Checkbutton(options, text="Match case", variable=self.find_files_case).pack(side='left', padx=(0, 10))
+        ttk.Checkbutton(options, text="Whole word", variable=self.find_files_word).pack(side='left')
+        buttons = ttk.Frame(controls, style='Header.TFrame')
+        buttons.grid(row=2, column=2, sticky='e', pady=(4, 0))
+        ttk.Button(buttons, text="Search", style='Header.TButton',
+                   command=self.start_find_in_files).pack(side='left', padx=5)
+        ttk.Button(buttons, text="Stop", style='Header.TButton',
+                   command=self.stop_find_in_files).pack(side='left')
+        
+        # Files with matches, each with its matching lines underneath
+        results = tk.Frame(window, bg=theme["bg"])
+        results.pack(fill='both', expand=True, padx=10, pady=(5, 0))
+        self.find_files_tree = ttk.Treeview(results, columns=('line', 'text'), show='tree headings')
+        self.find_files_tree.heading('#0', text="File")
+        self.find_files_tree.heading('line', text="Line")
+        self.find_files_tree.heading('text', text="Text")
+        self.find_files_tree.column('#0', width=250)
+        self.find_files_tree.column('line', width=60, anchor='e', stretch=False)
+        self.find_files_tree.column('text', width=450)
+        scrollbar = ttk.Scrollbar(results, orient='vertical', command=self.find_files_tree.yview)
+        self.find_files_tree.configure(yscrollcommand=scrollbar.set)
+        scrollbar.pack(side='right', fill='y')
+        self.find_files_tree.pack(side='left', fill='both', expand=True)
+        self.find_files_tree.bind('<Double-1>', lambda e: self.open_find_files_hit())
+        self.find_files_tree.bind('<Return>', lambda e: self.open_find_files_hit())
+        
+        self.find_files_status = ttk.Label(window, text="Ready", style='Status.TLabel')
+        self.find_files_status.pack(fill='x', side='bottom')
+        
+        self.find_files_entry.bind('<Return>', lambda e: self.start_find_in_files())
+        window.bind('<Escape>', lambda e: self.stop_find_in_files())
+    
+    def hide_find_in_files(self):
+        """Close the Find in Files window, stopping its search"""
+        self.stop_find_in_files()
+        self.find_files_window.withdraw()
+    
+    def browse_find_folder(self):
+        """Pick the folder Find in Files searches"""
+        folder = filedialog.askdirectory(title="Find in Folder", initialdir=self.find_files_folder.get(),
+                                         parent=self.find_files_window)
+        if folder:
+            self.find_files_folder.set(folder)
+    
+    def start_find_in_files(self):
+        """Search every file under the chosen folder in a process pool"""
+        self.stop_find_in_files()
+        pattern = self.find_files_query.get()
+        folder = self.find_files_folder.get()
+        if not pattern:
+            return
+        if not os.path.isdir(folder):
+            self.find_files_status.configure(text=f"Not a folder: {folder}")
+            return
+        query = (pattern, self.find_files_regex.get(), self.find_files_case.get(), self.find_files_word.get())
+        try:
+            compile_search(*query)
+            # Files large enough to be memory-mapped are searched as bytes
+            compile_search(pattern.encode('utf-8'), *query[1:])
+        except re.error as e:
+            self.find_files_status.configure(text=f"Invalid pattern: {e}")
+            return
+        
+        file_type = self.find_files_type.get()
+        extensions = None
+        if file_type != "All files":
+            extensions = {LANGUAGE_EXTENSIONS[file_type.split(' (')[0]]}
+        
+        self.find_files_tree.delete(*self.find_files_tree.get_children())
+        self.find_files_hits = {}
+        self.find_files_count = 0
+        self.find_files_root = folder
+        self.find_files_job = BackgroundJob(
+            self.root, lambda job: search_files(job, folder, extensions, query),
+            on_item=self.on_find_files_result, on_done=self.on_find_files_done).start()
+        self.find_files_status.configure(text="Searching...")
+    
+    def stop_find_in_files(self):
+        """Cancel a running Find in Files search"""
+        if self.find_files_job:
+            self.find_files_job.cancel()
+    
+    def on_find_files_result(self, item):
+        """Add the matches of one file to the result list"""
+        scanned, path, matches = item
+        if matches:
+            matches = matches[:FIND_IN_FILES_MAX_RESULTS - self.find_files_count]
+            parent = self.find_files_tree.insert(
+                '', 'end', text=os.path.relpath(path, self.find_files_root),
+                values=('', f"{len(matches):,} matches"), open=True)
+            self.find_files_hits[parent] = (path, matches[0][0])
+            for line, column, text in matches:
+                row = self.find_files_tree.insert(parent, 'end', values=(line, text.strip()))
+                self.find_files_hits[row] = (path, line)
+            self.find_files_count += len(matches)
+            if self.find_files_count >= FIND_IN_FILES_MAX_RESULTS:
+                self.find_files_job.cancel()
+        self.find_files_status.configure(
+            text=f"Searching... {scanned:,} files, {self.find_files_count:,} matches")
+    
+    def on_find_files_done(self, job):
+        """Report how a Find in Files search ended"""
+        if job is not self.find_files_job:
+            return
+        self.find_files_job = None
+        files = len(self.find_files_tree.get_children())
+        summary = f"{self.find_files_count:,} matches in {files:,} files"
+        if job.error:
+            self.find_files_status.configure(text=f"Search failed: {str(job.error)}")
+        elif self.find_files_count >= FIND_IN_FILES_MAX_RESULTS:
+            self.find_files_status.configure(text=f"Stopped after {summary}")
+        elif job.cancelled.is_set():
+            self.find_files_status.configure(text=f"Search stopped; {summary}")
+        else:
+            self.find_files_status.configure(text=summary)
+    
+    def open_find_files_hit(self):
+        """Open the file of the selected result at its line"""
+        selection = self.find_files_tree.selection()
+        if not selection or selection[0] not in self.find_files_hits:
+            return "break"
+        path, line = self.find_files_hits[selection[0]]
+        self.open_path_in_tab(path, line)
+        self.root.lift()
+        return "break"
+    
+    def create_tab_bar(self):
+        """Create the row of document tabs under the header"""
+        self.tab_bar = ttk.Frame(self.root, style='Header.TFrame')
+        self.tab_bar.pack(fill='x', padx=10, pady=(5, 5))
+        self.render_tabs()
+    
+    def render_tabs(self):
+        """Redraw the tab buttons; the active tab shows its live title"""
+        for child in self.tab_bar.winfo_children():
+            child.destroy()
+        self.active_tab.file_path = self.current_file
+        self.active_tab.text_modified = self.text_modified
+        for tab in self.tabs:
+            style = 'Active.TButton' if tab is self.active_tab else 'Header.TButton'
+            button = ttk.Button(self.tab_bar, text=tab.title(), style=style,
+                                command=lambda t=tab: self.activate_tab(t))
+            button.pack(side='left', padx=(0, 2))
+            button.bind('<Button-2>', lambda e, t=tab: self.close_tab(t))
+        ttk.Button(self.tab_bar, text="+", width=3, style='Header.TButton',
+                   command=self.new_tab).pack(side='left')
+    
+    def has_document(self):
+        """Return True unless the editor holds an untouched empty document"""
+        return bool(self.current_file or self.text_modified or self.large_file or self.document.length)
+    
+    def release_editor(self):
+        """Leave the grid and stop any load so other tabs can be shown; False if cancelled"""
+        if self.in_spreadsheet_mode():
+            # Offers to save the sheet; the grid stays if the user cancels
+            self.switch_to_normal_mode()
+            if self.in_spreadsheet_mode():
+                return False
+        self.cancel_text_load()
+        return True
+    
+    def can_switch_tabs(self):
+        """Return True if the document on screen can be parked in its tab"""
+        if self.in_spreadsheet_mode():
+            self.status_bar.configure(text="Tabs are not available in spreadsheet mode")
+            return False
+        if self.text_load_job:
+            self.status_bar.configure(text="Wait for the file to finish loading (Esc to cancel)")
+            return False
+        # A save finishing later would mark the wrong document clean
+        self.finish_saves()
+        return True
+    
+    def activate_tab(self, tab):
+        """Show another tab's document"""
+        if tab is self.active_tab or not self.can_switch_tabs():
+            return
+        self.store_active_tab()
+        self.show_tab(tab)
+    
+    def cycle_tabs(self):
+        """Switch to the next tab, wrapping around"""
+        index = self.tabs.index(self.active_tab)
+        self.activate_tab(self.tabs[(index + 1) % len(self.tabs)])
+        return "break"
+    
+    def new_tab(self):
+        """Open an empty document in a new tab"""
+        if self.can_switch_tabs():
+            self.store_active_tab()
+            tab = DocumentTab()
+            self.tabs.insert(self.tabs.index(self.active_tab) + 1, tab)
+            self.show_tab(tab)
+        return "break"
+    
+    def close_tab(self, tab=None):
+        """Close a tab, offering to save it first"""
+        tab = tab or self.active_tab
+        if tab is not self.active_tab:
+            if not tab.text_modified:
+                self.tabs.remove(tab)
+                tab.discard()
+                self.render_tabs()
+                return
+            # Saving works on the document on screen
+            if not self.release_editor():
+                return
+            self.activate_tab(tab)
+            if self.active_tab is not tab:
+                return
+        if not self.can_switch_tabs() or not self.check_unsaved_changes():
+            return
+        self.finish_saves()
+        self.discard_journal()
+        self.close_large_file()
+        
+        index = self.tabs.index(tab)
+        self.tabs.remove(tab)
+        tab.discard()
+        if not self.tabs:
+            self.tabs.append(DocumentTab())
+        self.clear_text_area()
+        self.show_tab(self.tabs[min(index, len(self.tabs) - 1)])
+    
+    def clear_text_area(self):
+        """Empty the text widget and its models without counting it as an edit"""
+        self.loading_text = True
+        self.text_area.delete(1.0, tk.END)
+        self.loading_text = False
+        self.forget_images()
+    
+    def store_active_tab(self):
+        """Park the document on screen in its tab and empty the editor"""
+        tab = self.active_tab
+        tab.file_path = self.current_file
+        tab.text_modified = self.text_modified
+        tab.journal, self.journal = self.journal, None
+        tab.last_used = time.monotonic()
+        tab.large_file = bool(self.large_file)
+        if self.large_file:
+            # Only the path and position are kept; the file is reopened later
+            tab.top_line = self.large_file_window[0] + self.get_visible_line_range()[0] - 1
+            self.close_large_file()
+        else:
+            tab.cursor = self.text_offset(tk.INSERT)
+            tab.top_line = self.get_visible_line_range()[0]
+            tab.images = self.collect_images()
+            tab.blobs = {image[1]: self.image_store.blobs[image[1]] for image in tab.images}
+            tab.document = self.document.snapshot()
+            tab.style_runs = self.style_runs.snapshot()
+            self.clear_text_area()
+    
+    def show_tab(self, tab):
+        """Load a parked tab into the editor"""
+        self.active_tab = tab
+        if tab.large_file:
+            self.current_file = None
+            self.text_modified = False
+            self.open_path(tab.file_path, tab.top_line)
+            self.render_tabs()
+            return
+        
+        tab.restore()
+        self.loading_text = True
+        if tab.document:
+            self.text_area.insert('1.0', tab.document.text())
+        if tab.style_runs:
+            self.style_runs = tab.style_runs
+            for start, end, style_id in self.style_runs.iter_runs():
+                if style_id:
+                    self.retag_styles(start, end, 0, style_id)
+        self.insert_images(tab.images, tab.blobs)
+        self.loading_text = False
+        # Tk cannot save an undo history, so each visit starts a fresh one
+        self.text_area.edit_reset()
+        
+        self.text_area.mark_set(tk.INSERT, self.offset_index(tab.cursor))
+        self.text_area.yview(f"{tab.top_line}.0")
+        self.current_file = tab.file_path
+        self.text_modified = tab.text_modified
+        self.journal, tab.journal = tab.journal, None
+        tab.document = None
+        tab.style_runs = None
+        tab.images = []
+        tab.blobs = {}
+        
+        if self.is_code_mode:
+            self.apply_syntax_highlighting()
+        self.refresh_search()
+        self.update_title()
+        self.scheduler.request('images', 'status', 'formatting', 'line_numbers')
+    
+    def open_path_in_tab(self, file_path, line=None):
+        """Open a file in its own tab, or show the tab that already has it"""
+        for tab in self.tabs:
+            tab_file = self.current_file if tab is self.active_tab else tab.file_path
+            if tab_file and os.path.abspath(tab_file) == os.path.abspath(file_path):
+                self.activate_tab(tab)
+                if self.active_tab is tab and line and not self.text_load_job:
+                    self.jump_to_line(line)
+                return
+        
+        if os.path.splitext(file_path)[1].lower() in ('.csv', '.xlsx') and self.in_spreadsheet_mode():
+            # The sheet on screen has a tab to itself, so a new sheet replaces it there
+            if self.check_unsaved_changes():
+                self.finish_saves()
+                self.open_path(file_path)
+            return
+        # An untouched empty tab is reused
+        if self.has_document():
+            previous = self.active_tab
+            self.new_tab()
+            if self.active_tab is previous:
+                return
+        self.open_path(file_path, line)
+        self.render_tabs()
+    
+    def spill_idle_tabs(self):
+        """Write inactive tabs that have not been used for a while to disk"""
+        now = time.monotonic()
+        for tab in self.tabs:
+            if (tab is not self.active_tab and tab.document is not None and not tab.spill_job
+                    and len(tab.document) >= TAB_SPILL_MIN_CHARS
+                    and now - tab.last_used > TAB_SPILL_SECONDS):
+                self.spill_tab(tab)
+        self.root.after(TAB_SPILL_CHECK_MS, self.spill_idle_tabs)
+    
+    def spill_tab(self, tab):
+        """Write a tab's text to a file on a worker and drop it from memory"""
+        path = os.path.join(TAB_SPILL_DIR, f"{os.getpid()}-{tab.number}.txt")
+        document = tab.document
+        
+        def on_done(job):
+            tab.spill_job = None
+            # The tab may have been shown (and its document replaced) meanwhile
+            if job.error is None and tab.document is document and tab in self.tabs:
+                tab.document = None
+                tab.spill_path = path
+            elif os.path.exists(path):
+                os.remove(path)
+        
+        tab.spill_job = BackgroundJob(self.root, lambda job: tab.spill(path), on_done=on_done).start()
+    
+    def show_memory_report(self):
+        """Show roughly how much memory each tab holds"""
+        self.render_tabs()
+        lines = []
+        total = 0
+        for tab in self.tabs:
+            if tab is self.active_tab:
+                blobs = {blob: self.image_store.blobs[blob] for blob in set(self.embedded_images.values())
+                         if blob in self.image_store.blobs}
+                text, formatting, images = estimate_memory(self.document, self.style_runs, blobs)
+                note = "on screen; the text widget holds another copy"
+                if self.large_file:
+                    note = "large file, memory-mapped"
+            else:
+                text, formatting, images = estimate_memory(tab.document, tab.style_runs, tab.blobs)
+                note = "parked"
+                if tab.large_file:
+                    note = "large file, reopened when shown"
+                elif tab.spill_path:
+                    note = f"spilled to disk ({format_bytes(os.path.getsize(tab.spill_path))})"
+            lines.append(f"{tab.title()}: text {format_bytes(text)}, formatting {format_bytes(formatting)}, "
+                         f"images {format_bytes(images)} - {note}")
+            total += text + formatting + images
+        
+        lines.append("")
+        lines.append(f"All tabs: {format_bytes(total)}")
+        if self.image_store.pixels:
+            lines.append(f"Decoded image cache: {format_bytes(self.image_store.pixels * 4)}")
+        resident = process_memory()
+        if resident:
+            lines.append(f"Process total: {format_bytes(resident)}")
+        messagebox.showinfo("Memory Report", "\n".join(lines))
+    
+    def serve_instance(self):
+        """Listen for later launches so their files open in this window"""
+        if not hasattr(socket, 'AF_UNIX'):
+            return
+        try:
+            self.instance_server = InstanceServer()
+        except OSError:
+            # Another instance won the race; this one simply runs on its own
+            return
+        self.instance_job = BackgroundJob(self.root, self.instance_server.serve,
+                                          on_item=self.on_instance_files).start()
+    
+    def on_instance_files(self, files):
+        """Open files sent by a later launch and bring the window forward"""
+        self.root.deiconify()
+        self.root.lift()
+        self.root.focus_force()
+        self.open_files(files)
+    
+    def open_files(self, files):
+        """Open files one after another, each in its own tab"""
+        self.open_queue.extend(files)
+        self.open_next_queued()
+    
+    def open_next_queued(self):
+        """Open queued files until one has to stream in first"""
+        while self.open_queue and not self.text_load_job:
+            file_path = self.open_queue.pop(0)
+            if os.path.isfile(file_path):
+                self.open_path_in_tab(file_path)
+            else:
+                self.status_bar.configure(text=f"File not found: {file_path}")
+    
+    def toggle_performance_hud(self):
+        """Show or hide the handler latency line above the status bar"""
+        if self.profiler is None:
+            messagebox.showinfo("Performance HUD",
+                                "Handler timing is off. Start the editor with "
+                                "--profile-handlers to record it.")
+            return
+        if not hasattr(self, 'hud_label'):
+            self.hud_label = ttk.Label(self.root, text="Waiting for handler calls...",
+                                       style='Status.TLabel')
+            self.hud_job = None
+        if self.hud_job:
+            self.root.after_cancel(self.hud_job)
+            self.hud_job = None
+            self.hud_label.pack_forget()
+            return
+        self.hud_label.pack(fill='x', side='bottom', after=self.status_bar)
+        self.hud_since = time.perf_counter()
+        self.update_performance_hud()
+    
+    def update_performance_hud(self):
+        """Show the slowest handler and how the last interval used the frame budget"""
+        now = time.perf_counter()
+        rows = self.profiler.stats()
+        if rows:
+            name, calls, p50, p95, p99, _ = rows[0]
+            over, busy = self.profiler.recent(self.hud_since)
+            self.hud_label.configure(
+                text=f"Slowest: {name}  p50 {p50 * 1000:.1f} / p95 {p95 * 1000:.1f} / "
+                     f"p99 {p99 * 1000:.1f} ms ({calls:,} calls)  |  "
+                     f"Frame budget {FRAME_MS} ms: {over} over, "
+                     f"{busy / (now - self.hud_since):.0%} busy")
+        self.hud_since = now
+        self.hud_job = self.root.after(PROFILE_HUD_MS, self.update_performance_hud)
+    
+    def export_performance_trace(self):
+        """Save the recorded handler calls as Chrome trace event JSON"""
+        if self.profiler is None:
+            messagebox.showinfo("Export Performance Trace",
+                                "Handler timing is off. Start the editor with "
+                                "--profile-handlers to record it.")
+            return
+        file_path = filedialog.asksaveasfilename(
+            defaultextension=".json",
+            initialfile="notepad-trace.json",
+            filetypes=[("Trace files", "*.json"), ("All files", "*.*")]
+        )
+        if not file_path:
+            return
+        trace = self.profiler.chrome_trace()
+        
+        def write(temp_path):
+            with open(temp_path, 'w', encoding='utf-8') as file:
+                json.dump(trace, file)
+        
+        try:
+            save_atomically(file_path, write)
+            self.status_bar.configure(
+                text=f"Saved {len(trace['traceEvents']) - 1:,} handler calls to {os.path.basename(file_path)}")
+        except Exception as e:
+            messagebox.showerror("Error", f"Could not export trace: {str(e)}")
+    
     def toggle_always_on_top(self):
         """Toggle the always on top functionality"""
         self.is_always_on_top = not self.is_always_on_top
@@ -429,7 +3655,15 @@ class ModernNotepad:
     def new_file(self):
         """Create a new file"""
         if self.check_unsaved_changes():
+            self.finish_saves()
+            self.cancel_text_load()
+            self.close_large_file()
+            self.discard_journal()
+            self.loading_text = True
             self.text_area.delete(1.0, tk.END)
+            self.loading_text = False
+            self.forget_images()
+            self.refresh_search()
             self.current_file = None
             self.text_modified = False
             self.update_title()
@@ -440,42 +3674,58 @@ class ModernNotepad:
         if self.check_unsaved_changes():
             file_path = filedialog.askopenfilename(
                 title="Open File",
-                filetypes=[("Text files", "*.txt"), ("All files", "*.*")]
+                filetypes=[("Text files", "*.txt"), ("Spreadsheets", "*.csv *.xlsx"),
+                           ("Formatted documents", f"*{RICH_DOCUMENT_EXTENSION}"),
+                           ("All files", "*.*")]
             )
             if file_path:
-                try:
-                    with open(file_path, 'r', encoding='utf-8') as file:
-                        content = file.read()
-                        self.text_area.delete(1.0, tk.END)
-                        self.text_area.insert(1.0, content)
-                        self.current_file = file_path
-                        self.text_modified = False
-                        self.update_title()
-                        self.status_bar.configure(text=f"Opened: {os.path.basename(file_path)}")
-                except Exception as e:
-                    messagebox.showerror("Error", f"Could not open file: {str(e)}")
+                self.open_path_in_tab(file_path)
     
-    def save_file(self):
-        """Save the current file"""
-        if self.current_file:
+    def open_path(self, file_path, line=None):
+        """Open a file with the loader for its type, optionally at a line"""
+        # A save still running would give its path to the new document
+        self.finish_saves()
+        self.cancel_loading()
+        self.discard_journal()
+        # Loads finish asynchronously; the jump happens once the text is in
+        self.pending_jump = line
+        if os.path.splitext(file_path)[1].lower() in ('.csv', '.xlsx'):
+            self.pending_jump = None
+            self.open_spreadsheet_file(file_path)
+        elif os.path.splitext(file_path)[1].lower() == RICH_DOCUMENT_EXTENSION:
+            self.open_rich_document(file_path)
+        elif os.path.getsize(file_path) > self.large_file_threshold:
             try:
-                content = self.text_area.get(1.0, tk.END + '-1c')
-                with open(self.current_file, 'w', encoding='utf-8') as file:
-                    file.write(content)
-                self.text_modified = False
-                self.update_title()
-                self.status_bar.configure(text=f"Saved: {os.path.basename(self.current_file)}")
+                self.open_large_file(file_path)
             except Exception as e:
-                messagebox.showerror("Error", f"Could not save file: {str(e)}")
+                messagebox.showerror("Error", f"Could not open file: {str(e)}")
+        else:
+            self.open_text_file(file_path)
+    
+    def finish_pending_jump(self):
+        """Go to the line an open request asked for once its file has loaded"""
+        line, self.pending_jump = self.pending_jump, None
+        if line:
+            self.jump_to_line(line)
+    
+    def save_file(self):
+        """Save the current file"""
+        if self.large_file:
+            self.status_bar.configure(text="Large files are opened read-only")
+        elif self.current_file and self.in_spreadsheet_mode():
+            self.save_spreadsheet_data(self.current_file, "Saved")
+        elif self.current_file:
+            self.save_text_data(self.current_file, "Saved")
         else:
             self.save_as_file()
     
     def save_as_file(self):
         """Save the file with a new name"""
-        # Check if we're in spreadsheet mode
-        is_spreadsheet_mode = hasattr(self, 'spreadsheet_frame') and self.spreadsheet_frame.winfo_ismapped()
-        
-        if is_spreadsheet_mode:
+        if self.large_file:
+            # Only a window of the file is loaded, so the widget cannot be saved
+            self.status_bar.configure(text="Large files are opened read-only")
+            return
+        if self.in_spreadsheet_mode():
             # Spreadsheet mode - save as Excel file
             default_ext = ".xlsx"
             filetypes = [("Excel files", "*.xlsx"), ("CSV files", "*.csv"), ("All files", "*.*")]
@@ -487,14 +3737,7 @@ class ModernNotepad:
             )
             
             if file_path:
-                try:
-                    self.save_spreadsheet_data(file_path)
-                    self.current_file = file_path
-                    self.text_modified = False
-                    self.update_title()
-                    self.status_bar.configure(text=f"Saved as: {os.path.basename(file_path)}")
-                except Exception as e:
-                    messagebox.showerror("Error", f"Could not save spreadsheet: {str(e)}")
+                self.save_spreadsheet_data(file_path, "Saved as")
         else:
             # Text/Code mode - save as text file
             # Determine default extension based on selected language
@@ -502,34 +3745,19 @@ class ModernNotepad:
             filetypes = [("Text files", "*.txt")]
             
             if self.is_code_mode:
-                # Map languages to their file extensions
-                lang_extensions = {
-                    "Python": ".py",
-                    "JavaScript": ".js",
-                    "HTML": ".html",
-                    "CSS": ".css",
-                    "Java": ".java",
-                    "C++": ".cpp",
-                    "C#": ".cs",
-                    "PHP": ".php",
-                    "Ruby": ".rb",
-                    "Go": ".go",
-                    "Swift": ".swift",
-                    "TypeScript": ".ts",
-                    "SQL": ".sql",
-                    "Rust": ".rs",
-                    "Kotlin": ".kt",
-                    "Bash": ".sh",
-                    "PowerShell": ".ps1",
-                    "XML": ".xml",
-                    "JSON": ".json",
-                    "YAML": ".yml"
-                }
-                
                 # Set default extension based on current language
-                if self.current_language in lang_extensions:
-                    default_ext = lang_extensions[self.current_language]
+                if self.current_language in LANGUAGE_EXTENSIONS:
+                    default_ext = LANGUAGE_EXTENSIONS[self.current_language]
                     filetypes.insert(0, (f"{self.current_language} files", f"*{default_ext}"))
+            else:
+                # Only the native format keeps formatting and images
+                rich_type = ("Formatted documents", f"*{RICH_DOCUMENT_EXTENSION}")
+                formatted = any(style_id for _, _, style_id in self.style_runs.iter_runs())
+                if formatted or self.text_area.image_names():
+                    default_ext = RICH_DOCUMENT_EXTENSION
+                    filetypes.insert(0, rich_type)
+                else:
+                    filetypes.append(rich_type)
             
             # Add all files option
             filetypes.append(("All files", "*.*"))
@@ -541,83 +3769,231 @@ class ModernNotepad:
             )
             
             if file_path:
+                self.save_text_data(file_path, "Saved as")
+    
+    def start_save(self, file_path, write, message):
+        """Write a file on a worker thread; write(path) gets a snapshot of the data"""
+        if self.save_job:
+            # One save at a time; the latest request runs when this one ends
+            self.pending_save = (file_path, write, message, self.edit_generation)
+            return
+        self.run_save(file_path, write, message, self.edit_generation)
+    
+    def run_save(self, file_path, write, message, generation):
+        """Start the worker for a save"""
+        self.status_bar.configure(text=f"Saving {os.path.basename(file_path)}...")
+        self.save_job = BackgroundJob(
+            self.root, lambda job: save_atomically(file_path, write),
+            on_done=lambda job: self.on_save_done(job, file_path, message, generation)).start()
+    
+    def on_save_done(self, job, file_path, message, generation):
+        """Report a finished save and start any save queued behind it"""
+        self.save_job = None
+        if job.error:
+            messagebox.showerror("Error", f"Could not save file: {str(job.error)}")
+        else:
+            # The document only takes the new path once it has been written there;
+            # tab switches wait for saves, so it is still the one on screen
+            self.current_file = file_path
+            # Edits made while the file was being written still need saving
+            if generation == self.edit_generation:
+                self.text_modified = False
+                self.discard_journal()
+            self.update_title()
+            self.status_bar.configure(text=f"{message}: {os.path.basename(file_path)}")
+        
+        if self.pending_save:
+            pending, self.pending_save = self.pending_save, None
+            self.run_save(*pending)
+    
+    def finish_saves(self):
+        """Block until running and queued saves have been written"""
+        while self.save_job:
+            job = self.save_job
+            job.thread.join()
+            job.poll()
+    
+    def save_rich_data(self, file_path, message):
+        """Save text, formatting and images as a .mnote document in the background"""
+        document = self.document.snapshot()
+        styles = [list(style) for style in self.style_table.styles]
+        runs = [[start, end, style_id] for start, end, style_id in self.style_runs.iter_runs() if style_id]
+        images = self.collect_images()
+        # PNG bytes were encoded once at paste or load time and are reused as-is
+        blobs = {image[1]: self.image_store.blobs[image[1]] for image in images}
+        
+        self.start_save(file_path,
+                        lambda path: write_rich_document(path, document, styles, runs, images, blobs),
+                        message)
+    
+    def open_rich_document(self, file_path):
+        """Open a .mnote document; images are decoded when scrolled into view"""
+        try:
+            text, styles, runs, images, blobs = read_rich_document(file_path)
+        except Exception as e:
+            messagebox.showerror("Error", f"Could not open file: {str(e)}")
+            return
+        
+        self.close_large_file()
+        self.forget_images()
+        
+        self.loading_text = True
+        self.text_area.delete(1.0, tk.END)
+        self.text_area.insert('1.0', text)
+        
+        style_ids = [self.style_table.intern(style) for style in styles]
+        for start, end, style_number in runs:
+            style_id = style_ids[style_number]
+            self.style_runs.restyle(start, end, lambda old: style_id)
+            self.retag_styles(start, end, 0, style_id)
+        
+        self.insert_images(images, blobs)
+        self.loading_text = False
+        
+        self.text_area.edit_reset()
+        self.text_area.mark_set(tk.INSERT, '1.0')
+        self.current_file = file_path
+        self.text_modified = False
+        self.update_title()
+        self.scheduler.request('images', 'status', 'formatting')
+        self.refresh_search()
+        self.finish_pending_jump()
+        self.status_bar.configure(text=f"Opened: {os.path.basename(file_path)}")
+    
+    def collect_images(self):
+        """Return [offset, blob, width, height] for each embedded image"""
+        images = []
+        for name in self.text_area.image_names():
+            if name in self.embedded_images:
+                blob = self.embedded_images[name]
+                width, height = self.image_store.sizes[blob]
+                images.append([self.text_offset(name), blob, width, height])
+        return images
+    
+    def insert_images(self, images, blobs):
+        """Put images back at the placeholder characters marking their offsets"""
+        # Blank images of the right size hold each image's place until it is shown
+        for offset, blob, width, height in images:
+            index = self.offset_index(offset)
+            self.text_area.delete(index)
+            self.image_store.add(blob, blobs[blob], (width, height))
+            name = self.text_area.image_create(index, image=self.image_placeholder, align='baseline')
+            self.show_image_placeholder(name, (width, height))
+            self.embedded_images[name] = blob
+    
+    def show_image_placeholder(self, name, size):
+        """Show an undecoded image as blank space of its size"""
+        width, height = size
+        self.text_area.image_configure(name, image=self.image_placeholder,
+                                       padx=(width - 1) // 2, pady=(height - 1) // 2)
+    
+    def forget_images(self):
+        """Drop every embedded image's data, e.g. when the document is replaced"""
+        self.embedded_images = {}
+        self.shown_images = {}
+        self.visible_blobs = set()
+        self.image_store.clear()
+    
+    def refresh_visible_images(self):
+        """Give images near the viewport their photos and drop deleted ones"""
+        if not self.embedded_images:
+            return
+        
+        # Images deleted from the text no longer need their photos
+        live = set(self.text_area.image_names())
+        if len(live) != len(self.embedded_images):
+            self.embedded_images = {name: blob for name, blob in self.embedded_images.items() if name in live}
+            self.shown_images = {name: blob for name, blob in self.shown_images.items() if name in live}
+            referenced = set(self.embedded_images.values())
+            for blob in list(self.image_store.photos):
+                if blob not in referenced:
+                    self.image_store.discard(blob)
+        
+        # One screen above and below the viewport counts as near
+        first_line, last_line = self.get_visible_line_range()
+        span = last_line - first_line + 1
+        visible = {}
+        for kind, name, index in self.text_area.dump(f"{max(1, first_line - span)}.0",
+                                                     f"{last_line + span}.end", image=True):
+            if name in self.embedded_images:
+                visible[name] = self.embedded_images[name]
+        self.visible_blobs = set(visible.values())
+        
+        missing = []
+        for name, blob in visible.items():
+            photo = self.image_store.photo(blob)
+            if photo is None:
+                missing.append(blob)
+            elif self.shown_images.get(name) != blob:
+                self.text_area.image_configure(name, image=photo, padx=0, pady=0)
+                self.shown_images[name] = blob
+        self.image_store.decode(missing, self.on_image_decoded)
+    
+    def on_image_decoded(self, blob, image):
+        """Cache a photo decoded by the worker and show it"""
+        self.release_images(self.image_store.cache(blob, image, keep=self.visible_blobs))
+        self.scheduler.request('images')
+    
+    def release_images(self, evicted):
+        """Put placeholders back for images whose photos were evicted"""
+        if not evicted:
+            return
+        for name, blob in list(self.shown_images.items()):
+            if blob in evicted:
+                del self.shown_images[name]
                 try:
-                    content = self.text_area.get(1.0, tk.END + '-1c')
-                    with open(file_path, 'w', encoding='utf-8') as file:
-                        file.write(content)
-                    self.current_file = file_path
-                    self.text_modified = False
-                    self.update_title()
-                    self.status_bar.configure(text=f"Saved as: {os.path.basename(file_path)}")
-                except Exception as e:
-                    messagebox.showerror("Error", f"Could not save file: {str(e)}")
-    
-    def save_spreadsheet_data(self, file_path):
-        """Save spreadsheet data to Excel or CSV format"""
-        import csv
+                    self.show_image_placeholder(name, self.image_store.sizes[blob])
+                except tk.TclError:
+                    pass
+    
+    def on_image_pasted(self, name, blob, evicted):
+        """A pasted image has been resized and encoded"""
+        self.release_images(evicted)
+        self.embedded_images[name] = blob
+        self.scheduler.request('images')
+    
+    def in_spreadsheet_mode(self):
+        """Return True while the spreadsheet grid is shown"""
+        return hasattr(self, 'spreadsheet_frame') and self.spreadsheet_frame.winfo_ismapped()
+    
+    def save_text_data(self, file_path, message):
+        """Save a snapshot of the document in the background"""
+        if os.path.splitext(file_path)[1].lower() == RICH_DOCUMENT_EXTENSION:
+            self.save_rich_data(file_path, message)
+        elif self.text_area.image_names():
+            # Pasted images are not part of a text file
+            content = self.get_document_text().replace('\ufffc', '')
+            self.start_save(file_path, lambda path: write_text_file(path, content), message)
+        else:
+            self.start_save(file_path, self.document.snapshot().write, message)
+    
+    def save_spreadsheet_data(self, file_path, message):
+        """Save spreadsheet data to Excel or CSV format in the background"""
+        # Make sure the cell being edited is included
+        self.commit_cell_edit()
         
         # Determine file format based on extension
         file_ext = os.path.splitext(file_path)[1].lower()
         
-        if file_ext == '.csv':
-            # Save as CSV
-            with open(file_path, 'w', newline='', encoding='utf-8') as csvfile:
-                writer = csv.writer(csvfile)
-                
-                # Write data row by row
-                for row in range(1, self.max_rows):
-                    row_data = []
-                    for col in range(1, self.max_cols):
-                        cell_id = f"{chr(64 + col)}{row}"
-                        if cell_id in self.cells:
-                            cell_value = self.cells[cell_id].get()
-                            row_data.append(cell_value)
-                        else:
-                            row_data.append("")
-                    
-                    # Only write rows that have some data
-                    if any(cell.strip() for cell in row_data):
-                        writer.writerow(row_data)
-        
-        elif file_ext == '.xlsx':
+        if file_ext == '.xlsx':
             # Save as Excel - try to use openpyxl if available
             try:
                 import openpyxl
-                from openpyxl import Workbook
-                
-                wb = Workbook()
-                ws = wb.active
-                ws.title = "Sheet1"
-                
-                # Write column headers
-                for col in range(1, self.max_cols):
-                    col_letter = chr(64 + col)
-                    ws.cell(row=1, column=col, value=col_letter)
-                
-                # Write data
-                for row in range(1, self.max_rows):
-                    for col in range(1, self.max_cols):
-                        cell_id = f"{chr(64 + col)}{row}"
-                        if cell_id in self.cells:
-                            cell_value = self.cells[cell_id].get()
-                            if cell_value.strip():  # Only write non-empty cells
-                                ws.cell(row=row+1, column=col, value=cell_value)
-                
-                wb.save(file_path)
-                
             except ImportError:
                 # Fallback to CSV if openpyxl is not available
                 messagebox.showwarning("Excel Support", 
                     "Excel format requires 'openpyxl' library. Saving as CSV instead.\n"
                     "To install: pip install openpyxl")
-                csv_path = os.path.splitext(file_path)[0] + '.csv'
-                self.save_spreadsheet_data(csv_path)
-                return
+                file_ext = '.csv'
         
-        else:
-            # Unsupported format, save as CSV
-            csv_path = os.path.splitext(file_path)[0] + '.csv'
-            self.save_spreadsheet_data(csv_path)
+        if file_ext != '.xlsx':
+            # CSV, also used for unsupported formats
+            file_path = os.path.splitext(file_path)[0] + '.csv'
+        
+        # The worker exports a copy so editing can continue during the write
+        sheet = self.sheet.snapshot()
+        export = sheet.export_xlsx if file_ext == '.xlsx' else sheet.export_csv
+        self.start_save(file_path, export, message)
     
     def on_text_change(self, event=None):
         """Handle text changes"""
@@ -625,11 +4001,21 @@ class ModernNotepad:
             self.text_modified = True
             self.update_title()
     
+    def on_sheet_change(self):
+        """Count a cell edit as an unsaved change to the sheet"""
+        # A save already running wrote the sheet as it was before this edit
+        self.edit_generation += 1
+        self.on_text_change()
+    
     def update_status(self, event=None):
         """Update status bar with cursor position"""
         cursor_pos = self.text_area.index(tk.INSERT)
         line, col = cursor_pos.split('.')
-        total_lines = self.text_area.index(tk.END + '-1c').split('.')[0]
+        total_lines = self.line_index.line_count
+        if self.large_file:
+            # Report positions in the whole file rather than the loaded window
+            line = self.large_file_window[0] + int(line) - 1
+            total_lines = self.large_file.line_count or f"{self.large_file.indexed_lines:,}+"
         self.status_bar.configure(text=f"Line {line}, Column {int(col)+1} | Total Lines: {total_lines}")
     
     def update_title(self):
@@ -641,6 +4027,101 @@ class ModernNotepad:
         if self.text_modified:
             title = f"*{title}"
         self.root.title(title)
+        if self.tab_bar:
+            self.render_tabs()
+    
+    def get_document_text(self):
+        """Return the whole document from the model"""
+        return self.document.text()
+    
+    def read_text_widget(self):
+        """Read the text area contents with embedded images as placeholders
+        
+        Images occupy one index position, so offsets into this string match
+        the widget's character offsets.
+        """
+        if not self.text_area.image_names():
+            return self.text_area.get(1.0, tk.END + '-1c')
+        parts = []
+        for kind, value, index in self.text_area.dump(1.0, tk.END + '-1c', text=True, image=True):
+            parts.append(value if kind == 'text' else '\ufffc')
+        return ''.join(parts)
+    
+    def journal_edit(self, operation, offset, value):
+        """Append an edit (inserted text or deleted length) to the autosave journal"""
+        if self.journal is None:
+            # The first edit of a clean document; its result is the snapshot
+            self.journal = EditJournal(f"{os.getpid()}-{self.active_tab.number}", self.current_file, self.get_document_text())
+            return
+        if operation == 'insert':
+            self.journal.record_insert(offset, value)
+        elif operation == 'delete':
+            self.journal.record_delete(offset, value)
+        else:
+            self.journal.compact(self.get_document_text())
+    
+    def check_journal(self):
+        """Periodically fold a long journal into a new snapshot"""
+        if self.journal and self.journal.needs_compaction:
+            self.journal.compact(self.get_document_text())
+        self.root.after(AUTOSAVE_CHECK_MS, self.check_journal)
+    
+    def discard_journal(self):
+        """Drop the autosave journal once the document is saved or abandoned"""
+        if self.journal:
+            self.journal.close()
+            self.journal = None
+    
+    def offer_recovery(self):
+        """Offer to restore documents left unsaved by a crashed session"""
+        # Each document is recovered into a tab of its own, which needs the
+        # files opened at startup to have finished loading first
+        if self.text_load_job or self.open_queue or self.in_spreadsheet_mode():
+            self.root.after(RECOVERY_RETRY_MS, self.offer_recovery)
+            return
+        for snapshot_path in EditJournal.find_orphans():
+            try:
+                header, text, edits = EditJournal.read(snapshot_path)
+            except (OSError, ValueError, KeyError) as e:
+                messagebox.showerror("Error", f"Could not read recovery data: {str(e)}")
+                continue
+            
+            name = os.path.basename(header['file']) if header['file'] else "Untitled"
+            if messagebox.askyesno("Recover Unsaved Changes",
+                                   f"Modern Notepad closed without saving changes to {name}.\n"
+                                   f"Do you want to recover them?"):
+                if self.has_document():
+                    previous = self.active_tab
+                    self.new_tab()
+                    if self.active_tab is previous:
+                        # Left in place, so it is offered again next time
+                        continue
+                self.recover_document(header['file'], text, edits)
+            for path in (snapshot_path, os.path.splitext(snapshot_path)[0] + '.journal'):
+                if os.path.exists(path):
+                    os.remove(path)
+    
+    def recover_document(self, file_path, text, edits):
+        """Load a snapshot into the editor and replay the journaled edits"""
+        self.loading_text = True
+        self.text_area.delete(1.0, tk.END)
+        self.text_area.insert(1.0, text)
+        for operation, offset, value in edits:
+            line, column = self.line_index.offset_to_line(offset)
+            if operation == 'i':
+                self.text_area.insert(f"{line}.{column}", value)
+            else:
+                end_line, end_column = self.line_index.offset_to_line(offset + value)
+                self.text_area.delete(f"{line}.{column}", f"{end_line}.{end_column}")
+        self.loading_text = False
+        self.text_area.edit_reset()
+        
+        # The recovered text is unsaved work; journal it again straight away
+        self.current_file = file_path
+        self.text_modified = True
+        self.update_title()
+        self.journal = EditJournal(f"{os.getpid()}-{self.active_tab.number}", file_path, self.get_document_text())
+        self.status_bar.configure(text="Recovered unsaved changes")
     
     def check_unsaved_changes(self):
         """Check for unsaved changes and prompt user"""
@@ -707,6 +4188,8 @@ class ModernNotepad:
         try:
             # Try to get image from clipboard first
             try:
+                # Pillow is only loaded the first time something is pasted
+                from PIL import ImageGrab
                 image = ImageGrab.grabclipboard()
                 if image:
                     self.paste_image(image)
@@ -728,14 +4211,6 @@ class ModernNotepad:
     def paste_image(self, image):
         """Paste image into text area"""
         try:
-            # Resize image if too large
-            max_width, max_height = 400, 300
-            if image.width > max_width or image.height > max_height:
-                image.thumbnail((max_width, max_height), Image.Resampling.LANCZOS)
-            
-            # Convert to PhotoImage
-            photo = ImageTk.PhotoImage(image)
-            
             # Get cursor position and ensure proper text positioning
             cursor_pos = self.text_area.index(tk.INSERT)
             
@@ -745,8 +4220,12 @@ class ModernNotepad:
                 self.text_area.insert(cursor_pos, '\n')
                 cursor_pos = self.text_area.index(tk.INSERT)
             
-            # Insert image at cursor position with baseline alignment to fix text positioning
-            image_name = self.text_area.image_create(cursor_pos, image=photo, align='baseline')
+            # Insert image at cursor position with baseline alignment to fix text positioning;
+            # it shows as blank space until the worker has resized it
+            image_name = self.text_area.image_create(cursor_pos, image=self.image_placeholder,
+                                                     align='baseline')
+            self.show_image_placeholder(image_name, fit_image_size(image.size))
+            self.image_store.paste(image, lambda blob, evicted: self.on_image_pasted(image_name, blob, evicted))
             
             # Move cursor to end of current line and add newline to ensure text goes below image
             current_line = cursor_pos.split('.')[0]
@@ -757,7 +4236,7 @@ class ModernNotepad:
             # Make image selectable by creating a tag around it
             image_start = cursor_pos
             image_end = self.text_area.index(f"{cursor_pos}+1c")
-            image_tag = f"image_{len(getattr(self, 'images', []))}"
+            image_tag = f"image_{image_name}"
             self.text_area.tag_add(image_tag, image_start, image_end)
             
             # Configure image tag to be selectable
@@ -765,11 +4244,6 @@ class ModernNotepad:
                                        selectbackground=self.themes[self.current_theme]["select_bg"],
                                        selectforeground='white')
             
-            # Keep a reference to prevent garbage collection
-            if not hasattr(self, 'images'):
-                self.images = []
-            self.images.append(photo)
-            
             # Add highlighting around the image in normal mode
             if not self.is_code_mode:
                 self.highlight_pasted_image(image_start, image_name)
@@ -823,7 +4297,7 @@ class ModernNotepad:
         try:
             # Create a tag around the image position
             end_pos = f"{cursor_pos}+1c"
-            tag_name = f"img_highlight_{len(self.images)}"
+            tag_name = f"img_highlight_{image_name}"
             
             # Use theme-appropriate highlight color
             highlight_color = "#0078d4"  # Blue for all themes
@@ -860,13 +4334,17 @@ class ModernNotepad:
     
     def switch_to_code_mode(self):
         """Switch to code editor mode"""
-        # Handle switching from spreadsheet mode
-        if hasattr(self, 'spreadsheet_frame') and self.spreadsheet_frame.winfo_ismapped():
+        # Handle switching from spreadsheet mode; the sheet is emptied, so offer to save it
+        if self.in_spreadsheet_mode():
+            if not self.check_unsaved_changes():
+                return
+            self.finish_saves()
             self.spreadsheet_frame.pack_forget()
-            # Clear spreadsheet data
-            if hasattr(self, 'cells'):
-                for cell_id, entry in self.cells.items():
-                    entry.delete(0, tk.END)
+            # Clear spreadsheet data; the tab held nothing but the sheet
+            self.clear_spreadsheet()
+            self.current_file = None
+            self.text_modified = False
+            self.update_title()
             # Show text area and scrollbar
             self.text_area.pack(side='left', fill='both', expand=True)
             self.scrollbar.pack(side='right', fill='y')
@@ -884,6 +4362,8 @@ class ModernNotepad:
             self.create_line_numbers()
             
             # Show language selector and hide formatting toolbar
+            if not hasattr(self, 'language_frame'):
+                self.create_language_selector()
             self.language_frame.pack(side='left', padx=(0, 10), pady=0)
             self.formatting_frame.pack_forget()
             
@@ -901,13 +4381,17 @@ class ModernNotepad:
             self.text_area.configure(wrap='word', padx=15)
             self.clear_syntax_highlighting()
         
-        # Handle switching from spreadsheet mode
-        if hasattr(self, 'spreadsheet_frame') and self.spreadsheet_frame.winfo_ismapped():
+        # Handle switching from spreadsheet mode; the sheet is emptied, so offer to save it
+        if self.in_spreadsheet_mode():
+            if not self.check_unsaved_changes():
+                return
+            self.finish_saves()
             self.spreadsheet_frame.pack_forget()
-            # Clear spreadsheet data
-            if hasattr(self, 'cells'):
-                for cell_id, entry in self.cells.items():
-                    entry.delete(0, tk.END)
+            # Clear spreadsheet data; the tab held nothing but the sheet
+            self.clear_spreadsheet()
+            self.current_file = None
+            self.text_modified = False
+            self.update_title()
             # Show text area and scrollbar if they're hidden
             self.text_area.pack(side='left', fill='both', expand=True)
             self.scrollbar.pack(side='right', fill='y')
@@ -921,17 +4405,34 @@ class ModernNotepad:
         self.formatting_frame.pack(side='left', padx=(0, 10), pady=0)
         
         # Hide language selector
-        self.language_frame.pack_forget()
+        if hasattr(self, 'language_frame'):
+            self.language_frame.pack_forget()
         
         self.status_bar.configure(text="Switched to Normal Mode")
         self.update_title()
     
     def switch_to_spreadsheet_mode(self):
         """Switch to spreadsheet mode with Excel-like grid"""
+        if self.in_spreadsheet_mode():
+            # Switching again starts an empty sheet, so offer to save the current one
+            if not self.check_unsaved_changes():
+                return
+            self.finish_saves()
+        elif self.has_document():
+            # The grid gets a tab of its own, so saving the sheet never
+            # writes over the text document it would otherwise hide
+            previous = self.active_tab
+            self.new_tab()
+            if self.active_tab is previous:
+                return
+        self.current_file = None
+        self.text_modified = False
+        self.show_spreadsheet()
+    
+    def show_spreadsheet(self):
+        """Replace the editor with an empty spreadsheet grid"""
         # Clear existing spreadsheet data if it exists
-        if hasattr(self, 'cells'):
-            for cell_id, entry in self.cells.items():
-                entry.delete(0, tk.END)
+        self.clear_spreadsheet()
         
         # Hide text area and related components
         self.text_area.pack_forget()
@@ -944,7 +4445,8 @@ class ModernNotepad:
             self.clear_syntax_highlighting()
         
         # Hide language selector and formatting toolbar
-        self.language_frame.pack_forget()
+        if hasattr(self, 'language_frame'):
+            self.language_frame.pack_forget()
         self.formatting_frame.pack_forget()
         
         # Create spreadsheet frame if it doesn't exist
@@ -958,21 +4460,202 @@ class ModernNotepad:
         self.status_bar.configure(text="Switched to Spreadsheet Mode")
         self.root.title("Spreadsheet - Modern Notepad")
     
+    def open_spreadsheet_file(self, file_path):
+        """Stream a CSV or XLSX file into spreadsheet mode"""
+        file_ext = os.path.splitext(file_path)[1].lower()
+        if file_ext == '.xlsx':
+            try:
+                import openpyxl
+            except ImportError:
+                messagebox.showerror("Excel Support",
+                    "Opening Excel files requires 'openpyxl' library.\n"
+                    "To install: pip install openpyxl")
+                return
+            reader = iter_xlsx_chunks
+        else:
+            reader = iter_csv_chunks
+        
+        # The caller has already offered to save what was on screen. The sheet
+        # takes over current_file, so no text is left behind to be saved over it
+        self.close_large_file()
+        self.clear_text_area()
+        self.show_spreadsheet()
+        self.current_file = file_path
+        self.text_modified = False
+        self.sheet_load_next_row = 1
+        
+        def work(job):
+            for chunk in reader(file_path):
+                if not job.emit(chunk):
+                    break
+        
+        self.sheet_load_job = BackgroundJob(self.root, work,
+                                            on_item=self.on_spreadsheet_chunk,
+                                            on_done=self.on_spreadsheet_loaded).start()
+        self.status_bar.configure(text=f"Loading {os.path.basename(file_path)}...")
+    
+    def on_spreadsheet_chunk(self, chunk):
+        """Commit a chunk of parsed rows to the model and refresh the screen"""
+        rows, fraction = chunk
+        first_row = self.sheet_load_next_row
+        for row, values in enumerate(rows, first_row):
+            self.sheet.set_row(row, values)
+        self.sheet_load_next_row = first_row + len(rows)
+        
+        # Only the visible window is redrawn, so this stays cheap however far the load has got
+        self.index_visible_cells()
+        self.refresh_spreadsheet_view()
+        if first_row <= self.active_cell[0] < self.sheet_load_next_row and \
+                self.cell_editor.get() == self.cell_editor_value:
+            self.load_cell_editor()
+        
+        name = os.path.basename(self.current_file)
+        loaded = self.sheet_load_next_row - 1
+        if fraction is None:
+            self.status_bar.configure(text=f"Loading {name}... {loaded:,} rows")
+        else:
+            self.status_bar.configure(text=f"Loading {name}... {fraction:.0%} ({loaded:,} rows)")
+    
+    def on_spreadsheet_loaded(self, job):
+        """Report the end of a spreadsheet load"""
+        if job is not self.sheet_load_job:
+            return
+        self.sheet_load_job = None
+        
+        if job.cancelled.is_set() or job.error:
+            # A partial sheet must not be saved over the original
+            file_name = os.path.basename(self.current_file)
+            self.current_file = None
+            self.update_title()
+            if job.error:
+                messagebox.showerror("Error", f"Could not open file: {str(job.error)}")
+            else:
+                self.status_bar.configure(text=f"Loading cancelled; showing part of {file_name}")
+            return
+        
+        self.status_bar.configure(
+            text=f"Opened: {os.path.basename(self.current_file)} "
+                 f"({self.sheet_load_next_row - 1:,} rows)")
+        self.root.title(f"{os.path.basename(self.current_file)} - Spreadsheet - Modern Notepad")
+    
+    def open_text_file(self, file_path):
+        """Read a text file on a worker and insert it chunk by chunk"""
+        self.cancel_text_load()
+        self.close_large_file()
+        
+        # Read-only while loading; undo history starts once the file is in
+        self.text_area.configure(undo=False)
+        self.loading_text = True
+        self.text_area.delete(1.0, tk.END)
+        self.loading_text = False
+        self.forget_images()
+        self.clear_search()
+        self.text_area.configure(state='disabled')
+        self.current_file = file_path
+        self.text_load_shown = False
+        
+        def work(job):
+            for chunk in iter_text_chunks(file_path):
+                if not job.emit(chunk):
+                    break
+        
+        self.text_load_job = BackgroundJob(self.root, work,
+                                           on_item=self.on_text_chunk,
+                                           on_done=self.on_text_loaded).start()
+        self.text_modified = False
+        self.update_title()
+        self.status_bar.configure(text=f"Loading {os.path.basename(file_path)}... (Esc to cancel)")
+    
+    def on_text_chunk(self, chunk):
+        """Append a chunk of the file being loaded"""
+        text, fraction = chunk
+        self.loading_text = True
+        self.text_area.configure(state='normal')
+        self.text_area.insert('end-1c', text)
+        self.text_area.configure(state='disabled')
+        self.loading_text = False
+        
+        if not self.text_load_shown:
+            # Highlight as soon as there is a screenful; later chunks queue
+            # their lines for the background highlighter
+            self.text_load_shown = True
+            self.text_area.mark_set(tk.INSERT, '1.0')
+            if self.is_code_mode:
+                self.apply_syntax_highlighting()
+        self.scheduler.request('line_numbers')
+        self.status_bar.configure(
+            text=f"Loading {os.path.basename(self.current_file)}... {fraction:.0%} (Esc to cancel)")
+    
+    def on_text_loaded(self, job):
+        """Finish a text load; the editor becomes editable again"""
+        if job is not self.text_load_job:
+            return
+        self.text_load_job = None
+        self.text_area.configure(state='normal', undo=True)
+        self.text_area.edit_reset()
+        self.refresh_search()
+        self.root.after_idle(self.open_next_queued)
+        
+        if job.cancelled.is_set() or job.error:
+            # A partial file must not be saved over the original
+            file_name = os.path.basename(self.current_file)
+            self.current_file = None
+            if job.error:
+                self.loading_text = True
+                self.text_area.delete(1.0, tk.END)
+                self.loading_text = False
+                self.text_modified = False
+            self.update_title()
+            if job.error:
+                messagebox.showerror("Error", f"Could not open file: {str(job.error)}")
+            else:
+                self.status_bar.configure(text=f"Loading cancelled; showing part of {file_name}")
+            return
+        
+        self.finish_pending_jump()
+        self.status_bar.configure(
+            text=f"Opened: {os.path.basename(self.current_file)} ({self.line_index.line_count:,} lines)")
+    
+    def cancel_text_load(self):
+        """Stop a text load that is still streaming in"""
+        if self.text_load_job:
+            self.text_load_job.cancel()
+            self.on_text_loaded(self.text_load_job)
+    
+    def cancel_loading(self):
+        """Cancel whichever file load is in progress"""
+        self.cancel_text_load()
+        self.cancel_spreadsheet_load()
+    
+    def cancel_spreadsheet_load(self):
+        """Stop a spreadsheet load that is still streaming in"""
+        if getattr(self, 'sheet_load_job', None):
+            self.sheet_load_job.cancel()
+            # Detach now; a later document must not be affected when the job winds down
+            self.on_spreadsheet_loaded(self.sheet_load_job)
+    
     def create_spreadsheet_view(self):
         """Create Excel-like spreadsheet view"""
         theme = self.themes[self.current_theme]
         
-        # Initialize spreadsheet properties
-        self.max_rows = 101  # 1-100 rows initially (0 is header)
-        self.max_cols = 27   # 1-26 columns initially (0 is header, 1-26 for A-Z)
+        # Cell values live in a sparse model; the grid only draws what is visible
+        self.sheet = SheetModel(row_count=100, col_count=26)
+        self.top_row = 1
+        self.left_col = 1
+        self.active_cell = (1, 1)
+        self.cell_editor_value = ""
+        self.visible_rows = 0
+        self.visible_cols = 0
+        
+        # Coordinate index for the visible slots: (row, col) -> (rect, text)
+        # and canvas item -> (row, col); rebuilt whenever the window moves
+        self.slot_items = []
+        self.cell_at = {}
+        self.cell_of_item = {}
         
         # Create main spreadsheet frame
         self.spreadsheet_frame = tk.Frame(self.text_container, bg=theme["bg"])
         
-        # Define consistent column width
-        cell_width = 10
-        row_header_width = 4
-        
         # Create toolbar for spreadsheet actions
         self.spreadsheet_toolbar = tk.Frame(self.spreadsheet_frame, bg=theme["header_bg"])
         self.spreadsheet_toolbar.pack(fill='x', side='top')
@@ -991,160 +4674,286 @@ class ModernNotepad:
                               activebackground=theme["select_bg"])
         add_col_btn.pack(side='left', padx=5, pady=2)
         
-        # Create header container frame
-        self.header_container = tk.Frame(self.spreadsheet_frame, bg=theme["header_bg"])
-        self.header_container.pack(fill='x', side='top')
-        
-        # Create corner cell (fixed)
-        self.corner_frame = tk.Frame(self.header_container, bg=theme["header_bg"])
-        self.corner_frame.pack(side='left', fill='y')
-        corner_label = tk.Label(self.corner_frame, width=row_header_width, bg=theme["header_bg"], 
-                              fg=theme["text_fg"], relief='raised', borderwidth=1)
-        corner_label.pack(fill='both', expand=True)
-        
-        # Create header canvas for scrollable column headers
-        self.header_canvas = tk.Canvas(self.header_container, bg=theme["header_bg"], 
-                                    height=25, highlightthickness=0)  # Fixed height for header
-        self.header_canvas.pack(side='left', fill='x', expand=True)
-        
-        # Create header frame inside canvas
-        self.header_frame = tk.Frame(self.header_canvas, bg=theme["header_bg"])
-        self.header_window = self.header_canvas.create_window((0, 0), window=self.header_frame, anchor='nw')
-        
-        # Column headers (A, B, C, ...)
-        for col in range(1, self.max_cols):
-            col_label = tk.Label(self.header_frame, text=chr(64 + col), width=cell_width, 
-                               bg=theme["header_bg"], fg=theme["text_fg"],
-                               relief='raised', borderwidth=1)
-            col_label.grid(row=0, column=col-1, sticky='nsew')  # Column index starts at 0 in header frame
-            self.header_frame.columnconfigure(col-1, minsize=cell_width*8)  # Consistent width
-        
-        # Create canvas for scrollable grid
+        # Scrollbars drive the visible window directly, not a canvas scroll region
+        self.x_scrollbar = ttk.Scrollbar(self.spreadsheet_frame, orient='horizontal',
+                                         command=self.spreadsheet_xview)
+        self.x_scrollbar.pack(side='bottom', fill='x')
+        
         self.canvas_frame = tk.Frame(self.spreadsheet_frame)
         self.canvas_frame.pack(fill='both', expand=True, side='top')
         
-        self.canvas = tk.Canvas(self.canvas_frame, bg=theme["text_bg"])
-        self.canvas.pack(side='left', fill='both', expand=True)
-        
-        # Add scrollbars
-        # Sync function for horizontal scrolling
-        def on_xview(*args):
-            # Update both canvases with exact same scroll position
-            self.canvas.xview(*args)
-            
-            # Get the current scroll position from the main canvas
-            # and apply exactly the same position to the header canvas
-            if args and len(args) > 0 and args[0] == 'moveto':
-                # For 'moveto' commands, use the exact same position
-                self.header_canvas.xview_moveto(float(args[1]))
-            else:
-                # For other commands (like scroll units/pages), sync after the main canvas updates
-                self.header_canvas.xview_moveto(self.canvas.xview()[0])
-        
-        self.x_scrollbar = ttk.Scrollbar(self.spreadsheet_frame, orient='horizontal', command=on_xview)
-        self.x_scrollbar.pack(side='bottom', fill='x')
-        
-        self.y_scrollbar = ttk.Scrollbar(self.canvas_frame, orient='vertical', command=self.canvas.yview)
+        self.y_scrollbar = ttk.Scrollbar(self.canvas_frame, orient='vertical',
+                                         command=self.spreadsheet_yview)
         self.y_scrollbar.pack(side='right', fill='y')
         
-        # Configure scrolling for both canvases
-        self.canvas.configure(xscrollcommand=self.x_scrollbar.set, yscrollcommand=self.y_scrollbar.set)
-        self.header_canvas.configure(xscrollcommand=self.x_scrollbar.set)
-        
-        # Create frame for cells
-        self.grid_frame = tk.Frame(self.canvas, bg=theme["text_bg"])
-        self.canvas.create_window((0, 0), window=self.grid_frame, anchor='nw')
-        
-        # Configure column widths for grid frame
-        self.grid_frame.columnconfigure(0, minsize=row_header_width*8)  # Row header column
-        for col in range(1, self.max_cols):
-            self.grid_frame.columnconfigure(col, minsize=cell_width*8)  # Consistent width
-        
-        # Row headers (1, 2, 3, ...)
-        for row in range(1, self.max_rows):
-            row_label = tk.Label(self.grid_frame, text=str(row), width=row_header_width, height=1,
-                               bg=theme["header_bg"], fg=theme["text_fg"],
-                               relief='raised', borderwidth=1)
-            row_label.grid(row=row, column=0, sticky='nsew')
-        
-        # Create cells
-        self.cells = {}
-        for row in range(1, self.max_rows):
-            # Configure row height
-            self.grid_frame.rowconfigure(row, minsize=25)  # Consistent row height
-            
-            for col in range(1, self.max_cols):
-                cell = tk.Entry(self.grid_frame, width=cell_width, bg=theme["text_bg"], 
-                              fg=theme["text_fg"], borderwidth=1, relief='solid')
-                cell.grid(row=row, column=col, sticky='nsew')
-                cell.insert(0, "")  # Empty by default
-                
-                # Store cell reference
-                cell_id = f"{chr(64 + col)}{row}"  # e.g., A1, B2, etc.
-                self.cells[cell_id] = cell
-                
-                # Bind events for cell navigation and clipboard
-                cell.bind("<Return>", lambda e, r=row, c=col: self.move_to_cell(r+1, c))
-                cell.bind("<Tab>", lambda e, r=row, c=col: self.move_to_cell(r, c+1))
-                cell.bind("<Shift-Tab>", lambda e, r=row, c=col: self.move_to_cell(r, c-1))
-                cell.bind("<Up>", lambda e, r=row, c=col: self.move_to_cell(r-1, c))
-                cell.bind("<Down>", lambda e, r=row, c=col: self.move_to_cell(r+1, c))
-                cell.bind("<Left>", lambda e, r=row, c=col: self.move_to_cell(r, c-1))
-                cell.bind("<Right>", lambda e, r=row, c=col: self.move_to_cell(r, c+1))
-                
-                # Clipboard bindings
-                cell.bind("<Control-v>", self.paste_to_cells)
-                cell.bind("<Control-c>", self.copy_from_cells)
-        
-        # Update canvas scroll region
-        self.grid_frame.update_idletasks()
-        self.header_frame.update_idletasks()
-        
-        # Configure scroll regions for both canvases
-        self.canvas.config(scrollregion=self.canvas.bbox("all"))
-        self.header_canvas.config(scrollregion=(0, 0, self.grid_frame.winfo_width(), self.header_frame.winfo_height()))
-        
-        # Make sure header canvas width matches grid width
-        self.header_canvas.itemconfig(self.header_window, width=self.grid_frame.winfo_width())
-        
-        # Bind grid frame changes to update header canvas
-        def on_frame_configure(event):
-            # Update the scroll region of both canvases
-            self.canvas.config(scrollregion=self.canvas.bbox("all"))
-            self.header_canvas.config(scrollregion=(0, 0, self.grid_frame.winfo_width(), self.header_frame.winfo_height()))
-            # Update header canvas width
-            self.header_canvas.itemconfig(self.header_window, width=self.grid_frame.winfo_width())
+        self.canvas = tk.Canvas(self.canvas_frame, bg=theme["text_bg"], highlightthickness=0)
+        self.canvas.pack(side='left', fill='both', expand=True)
         
-        self.grid_frame.bind("<Configure>", on_frame_configure)
+        # Single floating editor that moves to the active cell
+        self.cell_editor = tk.Entry(self.canvas, bg=theme["text_bg"], fg=theme["text_fg"],
+                                    insertbackground=theme["text_fg"],
+                                    borderwidth=1, relief='solid')
+        self.editor_window = self.canvas.create_window(0, 0, window=self.cell_editor, anchor='nw',
+                                                       width=SHEET_CELL_WIDTH,
+                                                       height=SHEET_ROW_HEIGHT,
+                                                       state='hidden')
+        
+        # Bind events for cell navigation and clipboard
+        self.cell_editor.bind("<Return>", lambda e: self.move_active_cell(1, 0))
+        self.cell_editor.bind("<Tab>", lambda e: self.move_active_cell(0, 1))
+        self.cell_editor.bind("<Shift-Tab>", lambda e: self.move_active_cell(0, -1))
+        self.cell_editor.bind("<Up>", lambda e: self.move_active_cell(-1, 0))
+        self.cell_editor.bind("<Down>", lambda e: self.move_active_cell(1, 0))
+        self.cell_editor.bind("<Left>", lambda e: self.move_active_cell(0, -1))
+        self.cell_editor.bind("<Right>", lambda e: self.move_active_cell(0, 1))
+        self.cell_editor.bind("<Control-v>", self.paste_to_cells)
+        self.cell_editor.bind("<Control-c>", self.copy_from_cells)
+        self.cell_editor.bind("<FocusOut>", lambda e: self.commit_cell_edit())
+        
+        self.canvas.bind("<Configure>", self.build_spreadsheet_grid)
+        self.canvas.tag_bind('cell', "<Button-1>", self.on_spreadsheet_click)
+        for widget in (self.canvas, self.cell_editor):
+            widget.bind("<MouseWheel>", self.on_spreadsheet_wheel)
+            widget.bind("<Button-4>", self.on_spreadsheet_wheel)
+            widget.bind("<Button-5>", self.on_spreadsheet_wheel)
         
         # Hide spreadsheet frame initially
         self.spreadsheet_frame.pack_forget()
     
+    def build_spreadsheet_grid(self, event=None):
+        """Create one canvas item per visible slot, sized to the canvas"""
+        theme = self.themes[self.current_theme]
+        width = self.canvas.winfo_width()
+        height = self.canvas.winfo_height()
+        self.visible_rows = max(1, (height - SHEET_ROW_HEIGHT) // SHEET_ROW_HEIGHT + 1)
+        self.visible_cols = max(1, (width - SHEET_ROW_HEADER_WIDTH) // SHEET_CELL_WIDTH + 1)
+        
+        self.canvas.delete('grid')
+        
+        # Header strips and corner
+        self.canvas.create_rectangle(0, 0, width, SHEET_ROW_HEIGHT, fill=theme["header_bg"],
+                                     outline='#555555', tags='grid')
+        self.canvas.create_rectangle(0, 0, SHEET_ROW_HEADER_WIDTH, height, fill=theme["header_bg"],
+                                     outline='#555555', tags='grid')
+        
+        # Reusable items for headers and cells
+        self.col_header_items = [
+            self.canvas.create_text(SHEET_ROW_HEADER_WIDTH + SHEET_CELL_WIDTH * (slot + 0.5),
+                                    SHEET_ROW_HEIGHT / 2, fill=theme["text_fg"], tags='grid')
+            for slot in range(self.visible_cols)]
+        self.row_header_items = [
+            self.canvas.create_text(SHEET_ROW_HEADER_WIDTH / 2,
+                                    SHEET_ROW_HEIGHT * (slot + 1.5), fill=theme["text_fg"],
+                                    tags='grid')
+            for slot in range(self.visible_rows)]
+        
+        # Each slot is a background rectangle (the click target) plus a text item
+        self.slot_items = []
+        for row_slot in range(self.visible_rows):
+            row_items = []
+            y = SHEET_ROW_HEIGHT * (row_slot + 1)
+            for col_slot in range(self.visible_cols):
+                x = SHEET_ROW_HEADER_WIDTH + SHEET_CELL_WIDTH * col_slot
+                rect = self.canvas.create_rectangle(x, y, x + SHEET_CELL_WIDTH, y + SHEET_ROW_HEIGHT,
+                                                    fill=theme["text_bg"], outline='#555555',
+                                                    tags=('grid', 'cell'))
+                text = self.canvas.create_text(x + 4, y + SHEET_ROW_HEIGHT / 2, anchor='w',
+                                               fill=theme["text_fg"], tags=('grid', 'cell'))
+                row_items.append((rect, text))
+            self.slot_items.append(row_items)
+        
+        self.canvas.tag_raise(self.editor_window)
+        self.index_visible_cells()
+        self.refresh_spreadsheet_view()
+    
+    def index_visible_cells(self):
+        """Map visible (row, col) coordinates to their canvas items and back"""
+        self.cell_at = {}
+        self.cell_of_item = {}
+        for row_slot, row_items in enumerate(self.slot_items):
+            row = self.top_row + row_slot
+            if row > self.sheet.row_count:
+                break
+            for col_slot, items in enumerate(row_items):
+                col = self.left_col + col_slot
+                if col > self.sheet.col_count:
+                    break
+                self.cell_at[(row, col)] = items
+                for item in items:
+                    self.cell_of_item[item] = (row, col)
+    
+    def refresh_spreadsheet_view(self):
+        """Update the visible slots from the model; cost depends only on window size"""
+        if not self.visible_rows:
+            return
+        
+        for slot, item in enumerate(self.col_header_items):
+            col = self.left_col + slot
+            self.canvas.itemconfigure(item, text=column_letter(col) if col <= self.sheet.col_count else "")
+        
+        for row_slot, row_items in enumerate(self.slot_items):
+            row = self.top_row + row_slot
+            in_sheet = row <= self.sheet.row_count
+            self.canvas.itemconfigure(self.row_header_items[row_slot], text=str(row) if in_sheet else "")
+            cells = self.sheet.rows.get(row, {})
+            for col_slot, (rect, text) in enumerate(row_items):
+                self.canvas.itemconfigure(text, text=self.format_cell_text(
+                    cells.get(self.left_col + col_slot, "")))
+        
+        self.place_cell_editor()
+        self.update_spreadsheet_scrollbars()
+    
+    def format_cell_text(self, value):
+        """Truncate a value to what fits in a cell"""
+        if len(value) > SHEET_CELL_CHARS:
+            return value[:SHEET_CELL_CHARS - 1] + "…"
+        return value
+    
+    def update_cell_item(self, row, col):
+        """Redraw one cell if it is on screen"""
+        items = self.cell_at.get((row, col))
+        if items:
+            self.canvas.itemconfigure(items[1], text=self.format_cell_text(self.sheet.get(row, col)))
+    
+    def update_spreadsheet_scrollbars(self):
+        """Point the scrollbars at the visible window"""
+        rows = max(self.sheet.row_count, 1)
+        cols = max(self.sheet.col_count, 1)
+        self.y_scrollbar.set((self.top_row - 1) / rows,
+                             min(1.0, (self.top_row - 1 + self.visible_rows) / rows))
+        self.x_scrollbar.set((self.left_col - 1) / cols,
+                             min(1.0, (self.left_col - 1 + self.visible_cols) / cols))
+    
+    def scroll_spreadsheet_to(self, top_row, left_col):
+        """Move the visible window so it starts at top_row/left_col"""
+        max_top = max(1, self.sheet.row_count - self.visible_rows + 2)
+        max_left = max(1, self.sheet.col_count - self.visible_cols + 2)
+        top_row = max(1, min(top_row, max_top))
+        left_col = max(1, min(left_col, max_left))
+        if (top_row, left_col) != (self.top_row, self.left_col):
+            self.top_row = top_row
+            self.left_col = left_col
+            self.index_visible_cells()
+            self.refresh_spreadsheet_view()
+    
+    def spreadsheet_yview(self, *args):
+        """Vertical scrollbar command"""
+        self.scroll_spreadsheet_to(self.scroll_target(args, self.top_row, self.sheet.row_count,
+                                                      self.visible_rows), self.left_col)
+    
+    def spreadsheet_xview(self, *args):
+        """Horizontal scrollbar command"""
+        self.scroll_spreadsheet_to(self.top_row, self.scroll_target(args, self.left_col,
+                                                                    self.sheet.col_count,
+                                                                    self.visible_cols))
+    
+    def scroll_target(self, args, current, total, page):
+        """Translate scrollbar 'moveto'/'scroll' arguments into a first row or column"""
+        if args[0] == 'moveto':
+            return int(float(args[1]) * total) + 1
+        amount = int(args[1])
+        if args[2] == 'pages':
+            amount *= max(1, page - 1)
+        return current + amount
+    
+    def on_spreadsheet_wheel(self, event):
+        """Scroll the grid with the mouse wheel"""
+        if event.num == 4 or event.delta > 0:
+            self.scroll_spreadsheet_to(self.top_row - 3, self.left_col)
+        else:
+            self.scroll_spreadsheet_to(self.top_row + 3, self.left_col)
+        return "break"
+    
+    def on_spreadsheet_click(self, event):
+        """Select the cell under the mouse"""
+        item = self.canvas.find_withtag('current')
+        coordinates = self.cell_of_item.get(item[0]) if item else None
+        if coordinates:
+            self.move_to_cell(*coordinates)
+    
+    def place_cell_editor(self):
+        """Position the floating editor over the active cell, or hide it"""
+        items = self.cell_at.get(self.active_cell)
+        if items:
+            x, y = self.canvas.coords(items[0])[:2]
+            self.canvas.coords(self.editor_window, x, y)
+            self.canvas.itemconfigure(self.editor_window, state='normal')
+        else:
+            self.canvas.itemconfigure(self.editor_window, state='hidden')
+    
+    def load_cell_editor(self):
+        """Show the active cell's value in the floating editor"""
+        self.cell_editor_value = self.sheet.get(*self.active_cell)
+        self.cell_editor.delete(0, tk.END)
+        self.cell_editor.insert(0, self.cell_editor_value)
+    
+    def commit_cell_edit(self):
+        """Write the editor's text back to the model if the user changed it"""
+        if not hasattr(self, 'cell_editor'):
+            return
+        row, col = self.active_cell
+        value = self.cell_editor.get()
+        if value != self.cell_editor_value:
+            self.cell_editor_value = value
+            self.sheet.set(row, col, value)
+            self.update_cell_item(row, col)
+            self.on_sheet_change()
+    
+    def clear_spreadsheet(self):
+        """Empty every cell"""
+        self.cancel_spreadsheet_load()
+        if hasattr(self, 'sheet'):
+            self.sheet.clear()
+            self.top_row = 1
+            self.left_col = 1
+            self.load_cell_editor()
+            self.index_visible_cells()
+            self.refresh_spreadsheet_view()
+    
+    def move_active_cell(self, row_delta, col_delta):
+        """Move the active cell by an offset"""
+        row, col = self.active_cell
+        return self.move_to_cell(row + row_delta, col + col_delta)
+    
     def move_to_cell(self, row, col):
         """Move focus to specified cell"""
-        # Ensure row and column are within bounds
-        row = max(1, min(row, self.max_rows - 1))
-        col = max(1, min(col, self.max_cols - 1))
+        self.commit_cell_edit()
         
-        # Get cell ID and focus on it
-        cell_id = f"{chr(64 + col)}{row}"
-        if cell_id in self.cells:
-            self.cells[cell_id].focus_set()
-            
-            # Ensure cell is visible by scrolling if needed
-            self.canvas.yview_moveto((row - 1) / (self.max_rows - 1))
-            self.canvas.xview_moveto((col - 1) / (self.max_cols - 1))
+        # Ensure row and column are within bounds
+        row = max(1, min(row, self.sheet.row_count))
+        col = max(1, min(col, self.sheet.col_count))
+        self.active_cell = (row, col)
+        
+        # Scroll just enough to bring the cell into view
+        if self.visible_rows:
+            top_row = self.top_row
+            left_col = self.left_col
+            if row < top_row:
+                top_row = row
+            elif row >= top_row + self.visible_rows - 1:
+                top_row = row - self.visible_rows + 2
+            if col < left_col:
+                left_col = col
+            elif col >= left_col + self.visible_cols - 1:
+                left_col = col - self.visible_cols + 2
+            self.scroll_spreadsheet_to(top_row, left_col)
+        
+        self.load_cell_editor()
+        self.place_cell_editor()
+        self.cell_editor.focus_set()
+        self.status_bar.configure(text=f"Cell {cell_name(row, col)}")
         
         return "break"  # Prevent default behavior
         
     def copy_from_cells(self, event=None):
         """Copy selected cell content to clipboard"""
         if event and event.widget:
-            # Get content from the current cell
-            content = event.widget.get()
+            # Get content from the current cell (the editor may hold unsaved text)
+            self.commit_cell_edit()
+            content = self.sheet.get(*self.active_cell)
             # Copy to clipboard
-            self.clipboard_clear()
-            self.clipboard_append(content)
+            self.root.clipboard_clear()
+            self.root.clipboard_append(content)
             return "break"  # Prevent default behavior
     
     def paste_to_cells(self, event=None):
@@ -1152,53 +4961,36 @@ class ModernNotepad:
         if event and event.widget:
             try:
                 # Get clipboard content
-                clipboard_content = self.clipboard_get()
-                
-                # Find current cell position
-                current_cell = event.widget
-                current_cell_id = None
-                current_row = None
-                current_col = None
+                clipboard_content = self.root.clipboard_get()
+                current_row, current_col = self.active_cell
                 
-                # Find the cell ID and position
-                for cell_id, cell in self.cells.items():
-                    if cell == current_cell:
-                        current_cell_id = cell_id
-                        # Extract row and column from cell_id (e.g., 'A1' -> col=1, row=1)
-                        current_col = ord(cell_id[0]) - 64  # A=1, B=2, etc.
-                        current_row = int(cell_id[1:])  # Extract row number
-                        break
-                
-                if current_row is not None and current_col is not None:
-                    # Check if content has tab or newline characters (table data)
-                    if '\t' in clipboard_content or '\n' in clipboard_content:
-                        # Split by rows and columns
-                        rows = clipboard_content.strip().split('\n')
+                # Check if content has tab or newline characters (table data)
+                if '\t' in clipboard_content or '\n' in clipboard_content:
+                    # Split by rows and columns
+                    rows = clipboard_content.strip().split('\n')
+                    
+                    old_size = (self.sheet.row_count, self.sheet.col_count)
+                    for r_idx, row_data in enumerate(rows):
+                        # Split row by tabs or multiple spaces
+                        cells_data = re.split(r'\t|\s{2,}', row_data)
                         
-                        for r_idx, row_data in enumerate(rows):
-                            # Split row by tabs or multiple spaces
-                            import re
-                            cells_data = re.split(r'\t|\s{2,}', row_data)
-                            
-                            for c_idx, cell_data in enumerate(cells_data):
-                                # Calculate target cell position
-                                target_row = current_row + r_idx
-                                target_col = current_col + c_idx
-                                
-                                # Ensure we don't exceed grid boundaries
-                                if target_row < self.max_rows and target_col < self.max_cols:
-                                    target_cell_id = f"{chr(64 + target_col)}{target_row}"
-                                    
-                                    # Update cell if it exists
-                                    if target_cell_id in self.cells:
-                                        # Clear existing content
-                                        self.cells[target_cell_id].delete(0, tk.END)
-                                        # Insert new content
-                                        self.cells[target_cell_id].insert(0, cell_data.strip())
-                    else:
-                        # Single cell paste
-                        current_cell.delete(0, tk.END)
-                        current_cell.insert(0, clipboard_content)
+                        for c_idx, cell_data in enumerate(cells_data):
+                            target_row = current_row + r_idx
+                            target_col = current_col + c_idx
+                            self.sheet.set(target_row, target_col, cell_data.strip())
+                            self.update_cell_item(target_row, target_col)
+                    
+                    # Pasting past the edge grows the sheet
+                    if (self.sheet.row_count, self.sheet.col_count) != old_size:
+                        self.index_visible_cells()
+                        self.refresh_spreadsheet_view()
+                else:
+                    # Single cell paste
+                    self.sheet.set(current_row, current_col, clipboard_content)
+                    self.update_cell_item(current_row, current_col)
+                
+                self.on_sheet_change()
+                self.load_cell_editor()
                 
                 return "break"  # Prevent default behavior
             except Exception as e:
@@ -1206,107 +4998,17 @@ class ModernNotepad:
         
         return None
     
-    def update_spreadsheet_scroll_regions(self):
-        """Update scroll regions for spreadsheet canvases"""
-        # Update canvas scroll region
-        self.grid_frame.update_idletasks()
-        self.header_frame.update_idletasks()
-        
-        # Configure scroll regions for both canvases
-        self.canvas.config(scrollregion=self.canvas.bbox("all"))
-        self.header_canvas.config(scrollregion=(0, 0, self.grid_frame.winfo_width(), self.header_frame.winfo_height()))
-        
-        # Make sure header canvas width matches grid width
-        self.header_canvas.itemconfig(self.header_window, width=self.grid_frame.winfo_width())
-    
     def add_spreadsheet_row(self):
         """Add a new row to the spreadsheet"""
-        theme = self.themes[self.current_theme]
-        cell_width = 10
-        row_header_width = 4
-        
-        # Increment max rows
-        new_row = self.max_rows
-        self.max_rows += 1
-        
-        # Configure row height
-        self.grid_frame.rowconfigure(new_row, minsize=25)  # Consistent row height
-        
-        # Add row header
-        row_label = tk.Label(self.grid_frame, text=str(new_row), width=row_header_width, height=1,
-                           bg=theme["header_bg"], fg=theme["text_fg"],
-                           relief='raised', borderwidth=1)
-        row_label.grid(row=new_row, column=0, sticky='nsew')
-        
-        # Add cells for the new row
-        for col in range(1, self.max_cols):
-            cell = tk.Entry(self.grid_frame, width=cell_width, bg=theme["text_bg"], 
-                          fg=theme["text_fg"], borderwidth=1, relief='solid')
-            cell.grid(row=new_row, column=col, sticky='nsew')
-            cell.insert(0, "")  # Empty by default
-            
-            # Store cell reference
-            cell_id = f"{chr(64 + col)}{new_row}"  # e.g., A101, B101, etc.
-            self.cells[cell_id] = cell
-            
-            # Bind events for cell navigation and clipboard
-            cell.bind("<Return>", lambda e, r=new_row, c=col: self.move_to_cell(r+1, c))
-            cell.bind("<Tab>", lambda e, r=new_row, c=col: self.move_to_cell(r, c+1))
-            cell.bind("<Shift-Tab>", lambda e, r=new_row, c=col: self.move_to_cell(r, c-1))
-            cell.bind("<Up>", lambda e, r=new_row, c=col: self.move_to_cell(r-1, c))
-            cell.bind("<Down>", lambda e, r=new_row, c=col: self.move_to_cell(r+1, c))
-            cell.bind("<Left>", lambda e, r=new_row, c=col: self.move_to_cell(r, c-1))
-            cell.bind("<Right>", lambda e, r=new_row, c=col: self.move_to_cell(r, c+1))
-            cell.bind("<Control-v>", self.paste_to_cells)
-            cell.bind("<Control-c>", self.copy_from_cells)
-        
-        # Update scroll regions
-        self.update_spreadsheet_scroll_regions()
+        self.sheet.row_count += 1
+        self.index_visible_cells()
+        self.refresh_spreadsheet_view()
     
     def add_spreadsheet_column(self):
         """Add a new column to the spreadsheet"""
-        theme = self.themes[self.current_theme]
-        cell_width = 10
-        
-        # Increment max columns
-        new_col = self.max_cols
-        self.max_cols += 1
-        
-        # Configure column width for grid frame
-        self.grid_frame.columnconfigure(new_col, minsize=cell_width*8)  # Consistent width
-        
-        # Add column header
-        col_letter = chr(64 + new_col) if new_col <= 26 else chr(64 + (new_col // 26)) + chr(64 + (new_col % 26))
-        col_label = tk.Label(self.header_frame, text=col_letter, width=cell_width, 
-                           bg=theme["header_bg"], fg=theme["text_fg"],
-                           relief='raised', borderwidth=1)
-        col_label.grid(row=0, column=new_col-1, sticky='nsew')  # Column index starts at 0 in header frame
-        self.header_frame.columnconfigure(new_col-1, minsize=cell_width*8)  # Consistent width
-        
-        # Add cells for the new column
-        for row in range(1, self.max_rows):
-            cell = tk.Entry(self.grid_frame, width=cell_width, bg=theme["text_bg"], 
-                          fg=theme["text_fg"], borderwidth=1, relief='solid')
-            cell.grid(row=row, column=new_col, sticky='nsew')
-            cell.insert(0, "")  # Empty by default
-            
-            # Store cell reference
-            cell_id = f"{col_letter}{row}"  # e.g., AA1, AA2, etc.
-            self.cells[cell_id] = cell
-            
-            # Bind events for cell navigation and clipboard
-            cell.bind("<Return>", lambda e, r=row, c=new_col: self.move_to_cell(r+1, c))
-            cell.bind("<Tab>", lambda e, r=row, c=new_col: self.move_to_cell(r, c+1))
-            cell.bind("<Shift-Tab>", lambda e, r=row, c=new_col: self.move_to_cell(r, c-1))
-            cell.bind("<Up>", lambda e, r=row, c=new_col: self.move_to_cell(r-1, c))
-            cell.bind("<Down>", lambda e, r=row, c=new_col: self.move_to_cell(r+1, c))
-            cell.bind("<Left>", lambda e, r=row, c=new_col: self.move_to_cell(r, c-1))
-            cell.bind("<Right>", lambda e, r=row, c=new_col: self.move_to_cell(r, c+1))
-            cell.bind("<Control-v>", self.paste_to_cells)
-            cell.bind("<Control-c>", self.copy_from_cells)
-        
-        # Update scroll regions
-        self.update_spreadsheet_scroll_regions()
+        self.sheet.col_count += 1
+        self.index_visible_cells()
+        self.refresh_spreadsheet_view()
     
     def create_line_numbers(self):
         """Create line numbers for code mode"""
@@ -1321,10 +5023,15 @@ class ModernNotepad:
                                            width=50)
         self.line_numbers_canvas.pack(fill='both', expand=True)
         
-        # Synchronize line numbers with text scrolling
-        self.text_area.bind("<<Modified>>", self.update_line_numbers)
-        self.text_area.bind("<Configure>", self.update_line_numbers)
-        self.text_area.bind("<MouseWheel>", self.update_line_numbers)
+        # Number items are reused between redraws; the font is measured once
+        self.gutter_items = []
+        self.gutter_labels = []
+        self.gutter_shown = 0
+        self.gutter_key = None
+        self.gutter_line_height = font.Font(font=self.text_area['font']).metrics('linespace')
+        
+        # Scrolling reaches the gutter through yscrollcommand; resizes come here
+        self.text_area.bind("<Configure>", lambda e: self.scheduler.request('line_numbers'))
         
         # Update line numbers
         self.update_line_numbers()
@@ -1337,34 +5044,55 @@ class ModernNotepad:
             self.line_numbers_canvas = None
     
     def update_line_numbers(self, event=None):
-        """Update line numbers display"""
+        """Update line numbers display, redrawing only when the view has changed"""
         if not self.is_code_mode or not self.line_numbers_canvas:
             return
         
-        self.line_numbers_canvas.delete('all')
-        
         # Get visible lines
-        first_line = int(self.text_area.index('@0,0').split('.')[0])
-        last_line = int(self.text_area.index(f'@0,{self.text_area.winfo_height()}').split('.')[0])
+        first_line, last_line = self.get_visible_line_range()
+        line_offset = self.large_file_window[0] - 1 if self.large_file else 0
         
-        # Get text widget font and calculate line height
-        font_obj = font.Font(font=self.text_area['font'])
-        line_height = font_obj.metrics('linespace')
+        # Unchanged first/last lines at unchanged positions mean an unchanged gutter
+        key = (first_line, last_line, line_offset, self.text_area.winfo_height(),
+               self.text_area.dlineinfo(f"{first_line}.0"), self.text_area.dlineinfo(f"{last_line}.0"))
+        if key == self.gutter_key:
+            return
+        self.gutter_key = key
         
-        # Draw line numbers aligned with text
+        # Move and relabel pooled items rather than recreating them
+        canvas = self.line_numbers_canvas
+        half_line = self.gutter_line_height / 2
+        shown = 0
         for line_num in range(first_line, last_line + 1):
             # Get y-coordinate of the line in the text widget
             dline = self.text_area.dlineinfo(f"{line_num}.0")
-            if dline:  # Line is visible
-                y = dline[1]  # y-coordinate of the line
-                self.line_numbers_canvas.create_text(
+            if not dline:
+                continue
+            label = str(line_num + line_offset)
+            y = dline[1] + half_line
+            if shown < len(self.gutter_items):
+                item = self.gutter_items[shown]
+                canvas.coords(item, 45, y)
+                if self.gutter_labels[shown] != label:
+                    canvas.itemconfigure(item, text=label)
+                    self.gutter_labels[shown] = label
+                if shown >= self.gutter_shown:
+                    canvas.itemconfigure(item, state='normal')
+            else:
+                self.gutter_items.append(canvas.create_text(
                     45,  # x position (right-aligned)
-                    y + line_height/2,  # y position (centered vertically with line)
-                    text=str(line_num),
+                    y,  # y position (centered vertically with line)
+                    text=label,
                     fill='#858585',
                     font=('Consolas', 9),
                     anchor='e'
-                )
+                ))
+                self.gutter_labels.append(label)
+            shown += 1
+        
+        for item in self.gutter_items[shown:self.gutter_shown]:
+            canvas.itemconfigure(item, state='hidden')
+        self.gutter_shown = shown
     
     def on_language_change(self, event=None):
         """Handle language change from dropdown"""
@@ -1374,112 +5102,98 @@ class ModernNotepad:
         self.root.title(f"Code ({self.current_language}) - Modern Notepad")
     
     def apply_syntax_highlighting(self):
-        """Apply syntax highlighting to the text"""
+        """Apply syntax highlighting to the whole text"""
         if not self.is_code_mode:
             return
         
-        content = self.text_area.get('1.0', tk.END)
+        # Start over with every line dirty
+        self.highlighter.set_language(self.current_language)
+        self.highlighter.reset(self.get_line_count())
+        self.highlight_dirty_lines()
+    
+    def highlight_dirty_lines(self):
+        """Re-highlight edited lines, visible ones first and the rest in the background"""
+        if not self.is_code_mode:
+            return
         
-        # Clear existing tags
-        for tag in ['keyword', 'string', 'comment', 'number', 'function']:
-            self.text_area.tag_remove(tag, '1.0', tk.END)
+        # Fall back to a full pass if the tracked line count ever drifts
+        if self.highlighter.line_count != self.get_line_count():
+            self.highlighter.reset(self.get_line_count())
         
-        # Get keywords based on selected language
-        keywords = self.get_language_keywords()
-        
-        lines = content.split('\n')
-        for line_num, line in enumerate(lines, 1):
-            # Highlight keywords
-            for keyword in keywords:
-                pattern = r'\b' + re.escape(keyword) + r'\b'
-                for match in re.finditer(pattern, line):
-                    start = f"{line_num}.{match.start()}"
-                    end = f"{line_num}.{match.end()}"
-                    self.text_area.tag_add('keyword', start, end)
-            
-            # Highlight strings
-            string_patterns = [r'".*?"', r"'.*?'"]
-            for pattern in string_patterns:
-                for match in re.finditer(pattern, line):
-                    start = f"{line_num}.{match.start()}"
-                    end = f"{line_num}.{match.end()}"
-                    self.text_area.tag_add('string', start, end)
-            
-            # Highlight comments
-            comment_match = re.search(r'#.*$', line)
-            if comment_match:
-                start = f"{line_num}.{comment_match.start()}"
-                end = f"{line_num}.{comment_match.end()}"
-                self.text_area.tag_add('comment', start, end)
-            
-            # Highlight numbers
-            for match in re.finditer(r'\b\d+\.?\d*\b', line):
-                start = f"{line_num}.{match.start()}"
-                end = f"{line_num}.{match.end()}"
-                self.text_area.tag_add('number', start, end)
-            
-            # Highlight function definitions
-            func_match = re.search(r'def\s+(\w+)', line)
-            if func_match:
-                start = f"{line_num}.{func_match.start(1)}"
-                end = f"{line_num}.{func_match.end(1)}"
-                self.text_area.tag_add('function', start, end)
+        first_line, last_line = self.get_visible_line_range()
+        self.highlighter.highlight(self.get_text_line, self.apply_line_tokens,
+                                   first_line, last_line)
+        self.schedule_highlight_catchup()
+    
+    def schedule_highlight_catchup(self):
+        """Queue a background highlighting chunk if any lines are still dirty"""
+        if self.highlight_job is None and self.highlighter.dirty:
+            self.highlight_job = self.root.after_idle(self.run_highlight_chunk)
+    
+    def run_highlight_chunk(self):
+        """Highlight dirty lines for one time-boxed slice, viewport first"""
+        self.highlight_job = None
+        if not self.is_code_mode:
+            return
+        
+        deadline = time.perf_counter() + HIGHLIGHT_CHUNK_SECONDS
+        first_line, last_line = self.get_visible_line_range()
+        self.highlighter.highlight(self.get_text_line, self.apply_line_tokens,
+                                   first_line, last_line, deadline)
+        if time.perf_counter() < deadline:
+            self.highlighter.highlight(self.get_text_line, self.apply_line_tokens,
+                                       deadline=deadline)
+        self.schedule_highlight_catchup()
+    
+    def get_text_line(self, line_num):
+        """Return the text of a single line"""
+        if self.large_file:
+            # Only the loaded window is in the widget; there is no document model
+            return self.text_area.get(f"{line_num}.0", f"{line_num}.end")
+        start = self.line_index.line_to_offset(line_num)
+        return self.document.slice(start, start + self.line_index.line_length(line_num))
+    
+    def apply_line_tokens(self, line_num, tokens):
+        """Replace the syntax tags on a line with the given tokens"""
+        line_start = f"{line_num}.0"
+        line_end = f"{line_num}.end"
+        for tag in SyntaxHighlighter.TAGS:
+            self.text_area.tag_remove(tag, line_start, line_end)
+        
+        for tag, start, end in tokens:
+            self.text_area.tag_add(tag, f"{line_num}.{start}", f"{line_num}.{end}")
     
     def clear_syntax_highlighting(self):
         """Clear all syntax highlighting"""
-        for tag in ['keyword', 'string', 'comment', 'number', 'function']:
+        if self.highlight_job is not None:
+            self.root.after_cancel(self.highlight_job)
+            self.highlight_job = None
+        for tag in SyntaxHighlighter.TAGS:
             self.text_area.tag_remove(tag, '1.0', tk.END)
     
     def get_language_keywords(self):
         """Get keywords for the selected programming language"""
-        language_keywords = {
-            "Python": ['def', 'class', 'if', 'else', 'elif', 'for', 'while', 'try', 'except', 
-                      'finally', 'with', 'as', 'import', 'from', 'return', 'yield', 'break', 
-                      'continue', 'pass', 'and', 'or', 'not', 'in', 'is', 'lambda', 'True', 
-                      'False', 'None', 'self', 'super', 'print'],
-            
-            "JavaScript": ['function', 'var', 'let', 'const', 'if', 'else', 'for', 'while', 'do', 
-                         'switch', 'case', 'default', 'break', 'continue', 'return', 'try', 
-                         'catch', 'finally', 'throw', 'new', 'this', 'typeof', 'instanceof', 
-                         'null', 'undefined', 'true', 'false', 'class', 'extends', 'super', 
-                         'import', 'export', 'async', 'await'],
-            
-            "Java": ['abstract', 'assert', 'boolean', 'break', 'byte', 'case', 'catch', 'char', 
-                    'class', 'const', 'continue', 'default', 'do', 'double', 'else', 'enum', 
-                    'extends', 'final', 'finally', 'float', 'for', 'if', 'implements', 'import', 
-                    'instanceof', 'int', 'interface', 'long', 'native', 'new', 'package', 'private', 
-                    'protected', 'public', 'return', 'short', 'static', 'strictfp', 'super', 'switch', 
-                    'synchronized', 'this', 'throw', 'throws', 'transient', 'try', 'void', 'volatile', 'while'],
-            
-            "C++": ['auto', 'break', 'case', 'char', 'class', 'const', 'continue', 'default', 
-                   'delete', 'do', 'double', 'else', 'enum', 'extern', 'float', 'for', 'friend', 
-                   'goto', 'if', 'inline', 'int', 'long', 'namespace', 'new', 'operator', 'private', 
-                   'protected', 'public', 'register', 'return', 'short', 'signed', 'sizeof', 'static', 
-                   'struct', 'switch', 'template', 'this', 'throw', 'try', 'typedef', 'union', 
-                   'unsigned', 'virtual', 'void', 'volatile', 'while'],
-            
-            "SQL": ['SELECT', 'FROM', 'WHERE', 'INSERT', 'UPDATE', 'DELETE', 'CREATE', 'ALTER', 
-                   'DROP', 'TABLE', 'DATABASE', 'VIEW', 'INDEX', 'JOIN', 'INNER', 'LEFT', 'RIGHT', 
-                   'FULL', 'OUTER', 'ON', 'GROUP', 'BY', 'HAVING', 'ORDER', 'ASC', 'DESC', 'LIMIT', 
-                   'OFFSET', 'UNION', 'ALL', 'AS', 'DISTINCT', 'INTO', 'VALUES', 'SET', 'CONSTRAINT', 
-                   'PRIMARY', 'KEY', 'FOREIGN', 'REFERENCES', 'NOT', 'NULL', 'DEFAULT', 'AUTO_INCREMENT']
-        }
-        
         # Return keywords for selected language or Python as fallback
-        return language_keywords.get(self.current_language, language_keywords["Python"])
+        return LANGUAGE_KEYWORDS.get(self.current_language, LANGUAGE_KEYWORDS["Python"])
+    
+    def on_key_press(self, event):
+        """Handle key press events"""
+        self.on_key_press_format(event)
+        return self.handle_text_replacement(event)
     
     def on_key_release(self, event=None):
         """Handle key release events"""
-        self.update_status()
+        # Key-repeat and fast typing collapse into one refresh of each kind
+        self.scheduler.request('status', 'formatting')
         if self.is_code_mode:
-            self.apply_syntax_highlighting()
-            self.update_line_numbers()
+            self.scheduler.request('line_numbers', 'highlight')
     
     def on_click(self, event=None):
         """Handle click events"""
-        self.update_status()
+        # Deferred, so the class binding has already moved the cursor
+        self.scheduler.request('status', 'formatting')
         if self.is_code_mode:
-            self.update_line_numbers()
+            self.scheduler.request('line_numbers')
     
     def change_theme(self, theme_name):
         """Change the application theme"""
@@ -1522,91 +5236,29 @@ class ModernNotepad:
     
     def toggle_bold(self):
         """Toggle bold formatting for selected text"""
-        try:
-            if self.text_area.tag_ranges(tk.SEL):
-                # Store selection range
-                sel_start = self.text_area.index(tk.SEL_FIRST)
-                sel_end = self.text_area.index(tk.SEL_LAST)
-                
-                current_tags = self.text_area.tag_names(tk.SEL_FIRST)
-                if "bold" in current_tags:
-                    self.text_area.tag_remove("bold", sel_start, sel_end)
-                    self.current_formatting['bold'] = False
-                else:
-                    self.text_area.tag_add("bold", sel_start, sel_end)
-                    self.text_area.tag_configure("bold", font=("Segoe UI", 12, "bold"))
-                    self.current_formatting['bold'] = True
-                
-                # Restore selection
-                self.text_area.tag_add(tk.SEL, sel_start, sel_end)
-                self.text_area.mark_set(tk.INSERT, sel_end)
-                
-                # Update button states based on selection
-                self.update_current_formatting()
-            else:
-                # Toggle for future text input
-                self.current_formatting['bold'] = not self.current_formatting['bold']
-                self.update_button_states()
-        except tk.TclError:
-            pass
+        self.toggle_style_flag('bold')
     
     def toggle_italic(self):
         """Toggle italic formatting for selected text"""
-        try:
-            if self.text_area.tag_ranges(tk.SEL):
-                # Store selection range
-                sel_start = self.text_area.index(tk.SEL_FIRST)
-                sel_end = self.text_area.index(tk.SEL_LAST)
-                
-                current_tags = self.text_area.tag_names(tk.SEL_FIRST)
-                if "italic" in current_tags:
-                    self.text_area.tag_remove("italic", sel_start, sel_end)
-                    self.current_formatting['italic'] = False
-                else:
-                    self.text_area.tag_add("italic", sel_start, sel_end)
-                    self.text_area.tag_configure("italic", font=("Segoe UI", 12, "italic"))
-                    self.current_formatting['italic'] = True
-                
-                # Restore selection
-                self.text_area.tag_add(tk.SEL, sel_start, sel_end)
-                self.text_area.mark_set(tk.INSERT, sel_end)
-                
-                # Update button states based on selection
-                self.update_current_formatting()
-            else:
-                # Toggle for future text input
-                self.current_formatting['italic'] = not self.current_formatting['italic']
-                self.update_button_states()
-        except tk.TclError:
-            pass
+        self.toggle_style_flag('italic')
     
     def toggle_underline(self):
         """Toggle underline formatting for selected text"""
+        self.toggle_style_flag('underline')
+    
+    def toggle_style_flag(self, field):
+        """Toggle bold, italic or underline on the selection or for future typing"""
         try:
             if self.text_area.tag_ranges(tk.SEL):
-                # Store selection range
-                sel_start = self.text_area.index(tk.SEL_FIRST)
-                sel_end = self.text_area.index(tk.SEL_LAST)
-                
-                current_tags = self.text_area.tag_names(tk.SEL_FIRST)
-                if "underline" in current_tags:
-                    self.text_area.tag_remove("underline", sel_start, sel_end)
-                    self.current_formatting['underline'] = False
-                else:
-                    self.text_area.tag_add("underline", sel_start, sel_end)
-                    self.text_area.tag_configure("underline", underline=True)
-                    self.current_formatting['underline'] = True
-                
-                # Restore selection
-                self.text_area.tag_add(tk.SEL, sel_start, sel_end)
-                self.text_area.mark_set(tk.INSERT, sel_end)
-                
-                # Update button states based on selection
-                self.update_current_formatting()
+                # The selection's first character decides whether to set or clear
+                start = self.text_offset(tk.SEL_FIRST)
+                enable = not self.style_of(self.style_runs.style_at(start))[field]
+                self.restyle_selection(field, enable)
+                self.current_formatting[field] = enable
             else:
                 # Toggle for future text input
-                self.current_formatting['underline'] = not self.current_formatting['underline']
-                self.update_button_states()
+                self.current_formatting[field] = not self.current_formatting[field]
+            self.update_button_states()
         except tk.TclError:
             pass
     
@@ -1615,19 +5267,8 @@ class ModernNotepad:
         try:
             size = int(self.size_var.get())
             self.current_formatting['size'] = size
-            
             if self.text_area.tag_ranges(tk.SEL):
-                # Store selection range
-                sel_start = self.text_area.index(tk.SEL_FIRST)
-                sel_end = self.text_area.index(tk.SEL_LAST)
-                
-                tag_name = f"size_{size}"
-                self.text_area.tag_add(tag_name, sel_start, sel_end)
-                self.text_area.tag_configure(tag_name, font=("Segoe UI", size))
-                
-                # Restore selection
-                self.text_area.tag_add(tk.SEL, sel_start, sel_end)
-                self.text_area.mark_set(tk.INSERT, sel_end)
+                self.restyle_selection('size', size)
         except (tk.TclError, ValueError):
             pass
     
@@ -1638,19 +5279,8 @@ class ModernNotepad:
             color = colorchooser.askcolor(title="Choose text color")
             if color[1]:  # If a color was selected
                 self.current_formatting['color'] = color[1]
-                tag_name = f"color_{color[1].replace('#', '')}"
-                
                 if self.text_area.tag_ranges(tk.SEL):
-                    # Store selection range
-                    sel_start = self.text_area.index(tk.SEL_FIRST)
-                    sel_end = self.text_area.index(tk.SEL_LAST)
-                    
-                    self.text_area.tag_add(tag_name, sel_start, sel_end)
-                    self.text_area.tag_configure(tag_name, foreground=color[1])
-                    
-                    # Restore selection
-                    self.text_area.tag_add(tk.SEL, sel_start, sel_end)
-                    self.text_area.mark_set(tk.INSERT, sel_end)
+                    self.restyle_selection('color', color[1])
         except tk.TclError:
             pass
     
@@ -1661,49 +5291,108 @@ class ModernNotepad:
             color = colorchooser.askcolor(title="Choose highlight color")
             if color[1]:  # If a color was selected
                 self.current_formatting['highlight'] = color[1]
-                tag_name = f"highlight_{color[1].replace('#', '')}"
-                
                 if self.text_area.tag_ranges(tk.SEL):
-                    # Store selection range
-                    sel_start = self.text_area.index(tk.SEL_FIRST)
-                    sel_end = self.text_area.index(tk.SEL_LAST)
-                    
-                    self.text_area.tag_add(tag_name, sel_start, sel_end)
-                    self.text_area.tag_configure(tag_name, background=color[1])
-                    
-                    # Restore selection
-                    self.text_area.tag_add(tk.SEL, sel_start, sel_end)
-                    self.text_area.mark_set(tk.INSERT, sel_end)
+                    self.restyle_selection('highlight', color[1])
         except tk.TclError:
             pass
-     
+    
+    def style_of(self, style_id):
+        """Return an interned style as a formatting dict"""
+        return dict(zip(STYLE_FIELDS, self.style_table.style(style_id)))
+    
+    def current_style_id(self):
+        """Intern the formatting that newly typed text should get"""
+        return self.style_table.intern(tuple(self.current_formatting[field] for field in STYLE_FIELDS))
+    
+    def style_tag(self, style_id):
+        """Return the text tag for a style, configuring it the first time it is used"""
+        tag_name = f"style_{style_id}"
+        if style_id not in self.configured_styles:
+            style = self.style_of(style_id)
+            font_options = tuple(option for option, on in (("bold", style['bold']),
+                                                           ("italic", style['italic'])) if on)
+            self.text_area.tag_configure(tag_name,
+                                         font=("Segoe UI", style['size']) + font_options,
+                                         underline=style['underline'],
+                                         foreground=style['color'] or "",
+                                         background=style['highlight'] or "")
+            # Below the selection so selected text still shows as selected
+            self.text_area.tag_lower(tag_name)
+            self.configured_styles.add(style_id)
+        return tag_name
+    
+    def text_offset(self, index):
+        """Return the document offset of a text widget index"""
+        if self.text_area.compare(index, '>', 'end-1c'):
+            # The widget's final newline is not part of the document
+            index = 'end-1c'
+        line, column = map(int, self.text_area.index(index).split('.'))
+        return self.line_index.line_to_offset(line) + column
+    
+    def offset_index(self, offset):
+        """Return the text widget index of a document offset"""
+        return "%d.%d" % self.line_index.offset_to_line(offset)
+    
+    def retag_styles(self, start, end, old_id, new_id):
+        """Move a range of text from one style tag to another"""
+        start_index = self.offset_index(start)
+        end_index = self.offset_index(end)
+        if old_id:
+            self.text_area.tag_remove(self.style_tag(old_id), start_index, end_index)
+        if new_id:
+            self.text_area.tag_add(self.style_tag(new_id), start_index, end_index)
+    
+    def restyle_selection(self, field, value):
+        """Set one formatting field on every style run in the selection"""
+        start = self.text_offset(tk.SEL_FIRST)
+        end = self.text_offset(tk.SEL_LAST)
+        field_number = STYLE_FIELDS.index(field)
+        
+        def change(style_id):
+            style = list(self.style_table.style(style_id))
+            style[field_number] = value
+            return self.style_table.intern(tuple(style))
+        
+        for run_start, run_end, old_id, new_id in self.style_runs.restyle(start, end, change):
+            self.retag_styles(run_start, run_end, old_id, new_id)
+    
+    def style_edit(self, operation, offset, value):
+        """Keep the style runs in step with an edit to the text widget"""
+        if operation == 'insert':
+            # Tk gives inserted text the tags shared by both neighbours
+            length = len(value)
+            left = self.style_runs.style_at(offset - 1) if offset > 0 else None
+            right = self.style_runs.style_at(offset) if offset < len(self.style_runs) else None
+            inherited = left if left == right and left is not None else 0
+            
+            style_id = inherited if self.typing_style is None else self.typing_style
+            self.typing_style = None
+            self.style_runs.insert(offset, length, style_id)
+            if style_id != inherited:
+                self.retag_styles(offset, offset + length, inherited, style_id)
+        elif operation == 'delete':
+            self.style_runs.delete(offset, value)
+        else:
+            self.rebuild_style_runs()
+    
+    def rebuild_style_runs(self):
+        """Read the style runs back from the widget's style tags"""
+        self.style_runs.load(len(self.document))
+        for style_id in self.configured_styles:
+            ranges = self.text_area.tag_ranges(self.style_tag(style_id))
+            for start, end in zip(ranges[::2], ranges[1::2]):
+                start = self.text_offset(start)
+                self.style_runs.restyle(start, self.text_offset(end), lambda old: style_id)
+    
     def update_current_formatting(self, event=None):
         """Update current formatting state based on cursor position"""
         try:
-            cursor_pos = self.text_area.index(tk.INSERT)
-            tags_at_cursor = self.text_area.tag_names(cursor_pos)
-            
-            # Update formatting state based on tags at cursor
-            self.current_formatting['bold'] = 'bold' in tags_at_cursor
-            self.current_formatting['italic'] = 'italic' in tags_at_cursor
-            self.current_formatting['underline'] = 'underline' in tags_at_cursor
-            
-            # Check for size tags
-            for tag in tags_at_cursor:
-                if tag.startswith('size_'):
-                    try:
-                        size = int(tag.split('_')[1])
-                        self.current_formatting['size'] = size
-                        self.size_var.set(str(size))
-                    except (ValueError, IndexError):
-                        pass
-            
-            # Check for color tags
-            for tag in tags_at_cursor:
-                if tag.startswith('color_'):
-                    self.current_formatting['color'] = f"#{tag.split('_')[1]}"
-                elif tag.startswith('highlight_'):
-                    self.current_formatting['highlight'] = f"#{tag.split('_')[1]}"
+            # Typing continues the style of the character before the cursor
+            offset = self.text_offset(tk.INSERT)
+            if offset and not self.text_area.compare(tk.INSERT, '==', 'insert linestart'):
+                offset -= 1
+            self.current_formatting = self.style_of(self.style_runs.style_at(offset))
+            self.size_var.set(str(self.current_formatting['size']))
             
             self.update_button_states()
         except tk.TclError:
@@ -1724,53 +5413,12 @@ class ModernNotepad:
             pass
      
     def on_key_press_format(self, event):
-        """Apply current formatting to newly typed characters"""
-        try:
-            # Only apply formatting to printable characters
-            if event.char and event.char.isprintable() and not self.is_code_mode:
-                # Get current cursor position
-                cursor_pos = self.text_area.index(tk.INSERT)
-                
-                # Schedule formatting application after character is inserted
-                self.root.after_idle(lambda: self.apply_formatting_to_new_char(cursor_pos))
-        except Exception:
-            pass
-     
-    def apply_formatting_to_new_char(self, start_pos):
-        """Apply current formatting to the newly inserted character"""
-        try:
-            # Calculate end position (one character after start)
-            end_pos = f"{start_pos}+1c"
-            
-            # Apply active formatting
-            if self.current_formatting['bold']:
-                self.text_area.tag_add("bold", start_pos, end_pos)
-                self.text_area.tag_configure("bold", font=("Segoe UI", self.current_formatting['size'], "bold"))
-            
-            if self.current_formatting['italic']:
-                self.text_area.tag_add("italic", start_pos, end_pos)
-                self.text_area.tag_configure("italic", font=("Segoe UI", self.current_formatting['size'], "italic"))
-            
-            if self.current_formatting['underline']:
-                self.text_area.tag_add("underline", start_pos, end_pos)
-                self.text_area.tag_configure("underline", underline=True)
-            
-            if self.current_formatting['size'] != 12:
-                tag_name = f"size_{self.current_formatting['size']}"
-                self.text_area.tag_add(tag_name, start_pos, end_pos)
-                self.text_area.tag_configure(tag_name, font=("Segoe UI", self.current_formatting['size']))
-            
-            if self.current_formatting['color']:
-                tag_name = f"color_{self.current_formatting['color'].replace('#', '')}"
-                self.text_area.tag_add(tag_name, start_pos, end_pos)
-                self.text_area.tag_configure(tag_name, foreground=self.current_formatting['color'])
-            
-            if self.current_formatting['highlight']:
-                tag_name = f"highlight_{self.current_formatting['highlight'].replace('#', '')}"
-                self.text_area.tag_add(tag_name, start_pos, end_pos)
-                self.text_area.tag_configure(tag_name, background=self.current_formatting['highlight'])
-        except tk.TclError:
-            pass
+        """Give newly typed characters the current formatting"""
+        # Only printable characters typed in normal mode; the edit hook
+        # applies the style when the class binding inserts the character
+        self.typing_style = None
+        if event.char and event.char.isprintable() and not self.is_code_mode:
+            self.typing_style = self.current_style_id()
     
     def handle_text_replacement(self, event):
         """Handle typing over selected text"""
@@ -1787,11 +5435,9 @@ class ModernNotepad:
                 self.text_area.delete(tk.SEL_FIRST, tk.SEL_LAST)
                 
                 # Insert the new character with inherited formatting
-                insert_pos = self.text_area.index(tk.INSERT)
-                self.text_area.insert(insert_pos, event.char)
-                
-                # Apply formatting to the new character
-                self.apply_formatting_to_new_char(insert_pos)
+                if not self.is_code_mode:
+                    self.typing_style = self.current_style_id()
+                self.text_area.insert(tk.INSERT, event.char)
                 
                 # Prevent the default behavior
                 return "break"
@@ -1839,42 +5485,9 @@ class ModernNotepad:
         """Inherit formatting from the selected text"""
         try:
             if self.text_area.tag_ranges(tk.SEL):
-                start_pos = self.text_area.index(tk.SEL_FIRST)
-                
-                # Get all tags at the start of selection
-                tags = self.text_area.tag_names(start_pos)
-                
-                # Reset current formatting
-                self.current_formatting = {
-                    'bold': False,
-                    'italic': False,
-                    'underline': False,
-                    'size': 12,
-                    'color': None,
-                    'highlight': None
-                }
-                
-                # Check for formatting tags
-                for tag in tags:
-                    if tag == 'bold':
-                        self.current_formatting['bold'] = True
-                    elif tag == 'italic':
-                        self.current_formatting['italic'] = True
-                    elif tag == 'underline':
-                        self.current_formatting['underline'] = True
-                    elif tag.startswith('size_'):
-                        try:
-                            size = int(tag.split('_')[1])
-                            self.current_formatting['size'] = size
-                            self.size_var.set(str(size))
-                        except (ValueError, IndexError):
-                            pass
-                    elif tag.startswith('color_'):
-                        color = '#' + tag.split('_')[1]
-                        self.current_formatting['color'] = color
-                    elif tag.startswith('highlight_'):
-                        color = '#' + tag.split('_')[1]
-                        self.current_formatting['highlight'] = color
+                start = self.text_offset(tk.SEL_FIRST)
+                self.current_formatting = self.style_of(self.style_runs.style_at(start))
+                self.size_var.set(str(self.current_formatting['size']))
                 
                 # Update button states
                 self.update_button_states()
@@ -1884,13 +5497,60 @@ class ModernNotepad:
     
     def on_closing(self):
         """Handle window closing"""
+        # Every modified tab gets its chance to be saved
+        modified = [tab for tab in self.tabs if tab is not self.active_tab and tab.text_modified]
+        if modified:
+            # Queued files would only open into tabs that are being closed
+            self.open_queue.clear()
+            if not self.release_editor():
+                return
+        for tab in modified:
+            if not self.check_unsaved_changes():
+                return
+            self.activate_tab(tab)
+            if self.active_tab is not tab:
+                return
         if self.check_unsaved_changes():
+            self.finish_saves()
+            self.discard_journal()
+            for tab in self.tabs:
+                tab.discard()
+            self.stop_find_in_files()
+            if self.instance_server:
+                self.instance_job.cancel()
+                self.instance_server.close()
+            self.scheduler.cancel()
+            self.close_large_file()
             self.root.destroy()
     
-    def run(self):
+    def run(self, profile_startup=False):
         """Start the application"""
+        if profile_startup:
+            self.root.after_idle(self.report_startup)
         self.root.mainloop()
+    
+    def report_startup(self):
+        """Print the startup timings once the first window has been laid out and drawn"""
+        self.root.update_idletasks()
+        self.startup.mark('first window')
+        print(self.startup.report(), flush=True)
 
 if __name__ == "__main__":
-    app = ModernNotepad()
-    app.run()
\ No newline at end of file
+    # In a frozen build, Find in Files workers re-run this entry point and
+    # must be diverted here; multiprocessing otherwise loads on first use
+    if getattr(sys, 'frozen', False):
+        import multiprocessing
+        multiprocessing.freeze_support()
+    startup = StartupProfile()
+    startup.mark('imports')
+    arguments = parse_arguments()
+    # A running instance opens the files itself; this launch just exits
+    if arguments.new_instance or not forward_to_instance(arguments.files):
+        startup.mark('instance check')
+        app = ModernNotepad(startup, arguments.profile_handlers)
+        if arguments.profile_handlers:
+            app.toggle_performance_hud()
+        if not arguments.new_instance:
+            app.serve_instance()
+        app.open_files(arguments.files)
+        app.run(arguments.profile_startup)
\ No newline at end of file
@@ -0,0 +1,64 @@
+"""LineIndex against line positions computed from a plain string"""
+import random
+
+from notepad import LineIndex, LINE_INDEX_BLOCK_LINES
+
+
+def position(text, offset):
+    """Reference (line, column) of an offset"""
+    return text.count('\n', 0, offset) + 1, offset - (text.rfind('\n', 0, offset) + 1)
+
+
+def line_start(text, line):
+    """Reference offset at which a 1-based line starts"""
+    offset = 0
+    for _ in range(line - 1):
+        offset = text.index('\n', offset) + 1
+    return offset
+
+
+def check(index, text, rng):
+    assert index.line_count == text.count('\n') + 1
+    assert index.char_count == len(text)
+    for _ in range(5):
+        offset = rng.randint(0, len(text))
+        assert index.offset_to_line(offset) == position(text, offset)
+        line = rng.randint(1, index.line_count)
+        assert index.line_to_offset(line) == line_start(text, line)
+        assert index.line_length(line) == len(text.split('\n')[line - 1])
+
+
+def test_load():
+    text = "first\n\nthird line\n"
+    index = LineIndex(text)
+    assert index.line_count == 4
+    assert index.char_count == len(text)
+    assert [index.line_length(line) for line in range(1, 5)] == [5, 0, 10, 0]
+    assert LineIndex().line_count == 1
+
+
+def test_random_edits_match_string():
+    rng = random.Random(7)
+    text = '\n'.join('x' * rng.randint(0, 30) for _ in range(LINE_INDEX_BLOCK_LINES * 3))
+    index = LineIndex(text)
+    inserts = ['a', '\n', 'ab\ncd', '\n' * LINE_INDEX_BLOCK_LINES]
+    for _ in range(400):
+        offset = rng.randint(0, len(text))
+        line, column = position(text, offset)
+        if rng.random() < 0.5:
+            inserted = rng.choice(inserts)
+            index.insert(line, column, inserted)
+            text = text[:offset] + inserted + text[offset:]
+        else:
+            end = min(len(text), offset + rng.randint(0, 2 * LINE_INDEX_BLOCK_LINES))
+            index.delete(line, column, *position(text, end))
+            text = text[:offset] + text[end:]
+        check(index, text, rng)
+
+
+def test_delete_everything():
+    text = '\n'.join(['line'] * (LINE_INDEX_BLOCK_LINES * 2))
+    index = LineIndex(text)
+    index.delete(1, 0, *position(text, len(text)))
+    assert index.line_count == 1
+    assert index.char_count == 0
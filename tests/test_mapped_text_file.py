@@ -0,0 +1,41 @@
+"""MappedTextFile against line offsets of the same bytes"""
+from notepad import MappedTextFile
+
+
+def make_file(tmp_path, data):
+    path = tmp_path / "large.txt"
+    path.write_bytes(data)
+    return str(path)
+
+
+def test_lines_match_bytes(tmp_path):
+    lines = [("line %d " % number) * (number % 7) for number in range(3000)]
+    data = '\n'.join(lines).encode('utf-8')
+    # Small blocks so lookups cross many of them
+    mapped = MappedTextFile(make_file(tmp_path, data), block_size=256)
+    try:
+        mapped.build_index()
+        assert mapped.line_count == len(lines)
+        offsets = [0]
+        for line in lines[:-1]:
+            offsets.append(offsets[-1] + len(line) + 1)
+        for number in (1, 2, 100, 1234, len(lines)):
+            assert mapped.line_offset(number) == offsets[number - 1]
+            assert mapped.offset_line(offsets[number - 1]) == number
+        assert mapped.read_lines(10, 12) == '\n'.join(lines[9:12]) + '\n'
+        assert mapped.read_lines(len(lines), len(lines)) == lines[-1]
+    finally:
+        mapped.close()
+
+
+def test_trailing_newline_and_empty_file(tmp_path):
+    mapped = MappedTextFile(make_file(tmp_path, b"a\nb\n"))
+    mapped.build_index()
+    assert mapped.line_count == 3
+    assert mapped.read_lines(3, 3) == ""
+    mapped.close()
+
+    empty = MappedTextFile(make_file(tmp_path, b""))
+    empty.build_index()
+    assert empty.line_count == 1
+    empty.close()
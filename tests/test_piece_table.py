@@ -0,0 +1,44 @@
+"""PieceTable against the same edits applied to a plain string"""
+import random
+
+from notepad import PieceTable
+
+
+def test_random_edits_match_string():
+    rng = random.Random(3)
+    text = "The quick brown fox\njumps over the lazy dog\n" * 50
+    table = PieceTable(text)
+    for _ in range(2000):
+        offset = rng.randint(0, len(text))
+        if rng.random() < 0.6:
+            inserted = rng.choice(["a", "xyz", "\n", "long insert " * 20])
+            table.insert(offset, inserted)
+            text = text[:offset] + inserted + text[offset:]
+        else:
+            length = rng.randint(0, min(40, len(text) - offset))
+            table.delete(offset, length)
+            text = text[:offset] + text[offset + length:]
+        assert len(table) == len(text)
+    assert table.text() == text
+    assert ''.join(table.chunks()) == text
+    for _ in range(50):
+        start = rng.randint(0, len(text))
+        end = rng.randint(start, len(text))
+        assert table.slice(start, end) == text[start:end]
+
+
+def test_snapshot_is_independent():
+    table = PieceTable("hello world")
+    copy = table.snapshot()
+    table.insert(5, ",")
+    table.delete(0, 1)
+    assert copy.text() == "hello world"
+    assert table.text() == "ello, world"
+
+
+def test_write(tmp_path):
+    table = PieceTable("first\n")
+    table.insert(6, "second ünïcode\n")
+    path = tmp_path / "out.txt"
+    table.write(str(path))
+    assert path.read_text(encoding='utf-8') == "first\nsecond ünïcode\n"
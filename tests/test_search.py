@@ -0,0 +1,68 @@
+"""Find/replace helpers against re.sub and re.finditer"""
+import re
+
+import pytest
+
+from notepad import compile_search, iter_match_batches, list_replacements, replace_matches
+
+TEXT = "Foo foo food\nbar.foo\nfoo-bar FOO\n" * 20
+
+
+def apply(text, result):
+    """Rebuild the document from replace_matches' result"""
+    first, last, middle, _ = result
+    return text[:first] + middle + text[last:]
+
+
+@pytest.mark.parametrize("pattern, regex, match_case, whole_word, replacement", [
+    ("foo", False, False, False, "baz"),
+    ("foo", False, True, True, "baz"),
+    (".", False, False, False, "!"),
+    (r"(\w+)-(\w+)", True, False, False, r"\2-\1"),
+    (r"^foo", True, True, False, "start"),
+    (r"(?<=\.)foo", True, False, False, "X"),
+])
+def test_replace_matches_agrees_with_re_sub(pattern, regex, match_case, whole_word, replacement):
+    compiled = compile_search(pattern, regex, match_case, whole_word)
+    expected_pattern = pattern if regex else re.escape(pattern)
+    if whole_word:
+        expected_pattern = r"\b(?:%s)\b" % expected_pattern
+    flags = re.MULTILINE if match_case else re.MULTILINE | re.IGNORECASE
+    expected, count = re.subn(expected_pattern, replacement if regex else replacement.replace('\\', r'\\'),
+                              TEXT, flags=flags)
+    result = replace_matches(TEXT, compiled, replacement, regex)
+    assert apply(TEXT, result) == expected
+    assert result[3] == count
+
+    # Per-match replacements describe the same edit
+    pieces = list_replacements(TEXT, compiled, replacement, regex)
+    assert len(pieces) == count
+    rebuilt, position = [], 0
+    for start, end, new in pieces:
+        rebuilt += [TEXT[position:start], new]
+        position = end
+    assert ''.join(rebuilt) + TEXT[position:] == expected
+
+
+def test_empty_matches_are_skipped():
+    compiled = compile_search(r"x*", regex=True)
+    assert replace_matches("abc", compiled, "-", regex=True) == (0, 0, '', 0)
+    assert list(iter_match_batches("axxb", compiled)) == [[(1, 3)]]
+
+
+def test_match_batches_cover_every_match():
+    compiled = compile_search("foo")
+    batches = list(iter_match_batches(TEXT, compiled, batch_size=7))
+    assert all(len(batch) <= 7 for batch in batches)
+    assert [span for batch in batches for span in batch] == \
+        [match.span() for match in re.finditer("foo", TEXT, re.IGNORECASE)]
+
+
+def test_bytes_patterns():
+    compiled = compile_search(b"foo", whole_word=True)
+    assert [match.span() for match in compiled.finditer(b"foo food foo")] == [(0, 3), (9, 12)]
+
+
+def test_invalid_regex_raises():
+    with pytest.raises(re.error):
+        compile_search("(", regex=True)
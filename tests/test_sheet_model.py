@@ -0,0 +1,57 @@
+"""SheetModel and the spreadsheet readers round-tripping through files"""
+import pytest
+
+from notepad import SheetModel, iter_csv_chunks, iter_xlsx_chunks
+
+
+def load(reader, path):
+    """Read a file into a new sheet the way spreadsheet mode does"""
+    sheet = SheetModel()
+    row = 1
+    for rows, _ in reader(path):
+        for values in rows:
+            sheet.set_row(row, values)
+            row += 1
+    return sheet
+
+
+def test_set_and_clear_cells():
+    sheet = SheetModel(10, 5)
+    sheet.set(20, 8, "far")
+    assert (sheet.row_count, sheet.col_count) == (20, 8)
+    assert sheet.get(20, 8) == "far"
+    sheet.set(20, 8, "")
+    assert sheet.cell_count() == 0
+    assert sheet.get(1, 1) == ""
+
+
+def test_csv_round_trip_keeps_rows_and_widths(tmp_path):
+    source = 'a,b,c\r\n\r\nx\r\n,,y\r\n\r\n"quoted, comma",z\r\n'
+    path = tmp_path / "in.csv"
+    path.write_bytes(source.encode('utf-8'))
+    sheet = load(iter_csv_chunks, str(path))
+    out = tmp_path / "out.csv"
+    sheet.export_csv(str(out))
+    assert out.read_bytes().decode('utf-8') == source
+
+
+def test_snapshot_is_independent(tmp_path):
+    sheet = SheetModel()
+    sheet.set(1, 1, "before")
+    copy = sheet.snapshot()
+    sheet.set(1, 1, "after")
+    path = tmp_path / "copy.csv"
+    copy.export_csv(str(path))
+    assert path.read_bytes() == b"before\r\n"
+
+
+def test_xlsx_round_trip_keeps_first_row(tmp_path):
+    pytest.importorskip('openpyxl')
+    sheet = SheetModel()
+    sheet.set(1, 1, "A")
+    sheet.set(1, 2, "B")
+    sheet.set(3, 2, "data")
+    path = tmp_path / "sheet.xlsx"
+    sheet.export_xlsx(str(path))
+    loaded = load(iter_xlsx_chunks, str(path))
+    assert loaded.rows == sheet.rows
@@ -0,0 +1,54 @@
+"""StyleRuns against a plain list holding one style id per character"""
+import random
+
+from notepad import StyleRuns
+
+
+def expand(runs):
+    """Per-character style ids described by the runs"""
+    styles = []
+    for start, end, style_id in runs.iter_runs():
+        styles.extend([style_id] * (end - start))
+    return styles
+
+
+def test_random_edits_match_list():
+    rng = random.Random(5)
+    runs = StyleRuns(100)
+    reference = [0] * 100
+    for _ in range(1000):
+        offset = rng.randint(0, len(reference))
+        action = rng.random()
+        if action < 0.4:
+            length, style_id = rng.randint(1, 10), rng.randint(0, 3)
+            runs.insert(offset, length, style_id)
+            reference[offset:offset] = [style_id] * length
+        elif action < 0.7:
+            length = rng.randint(0, min(15, len(reference) - offset))
+            runs.delete(offset, length)
+            del reference[offset:offset + length]
+        else:
+            end = rng.randint(offset, len(reference))
+            runs.restyle(offset, end, lambda style_id: (style_id + 1) % 4)
+            reference[offset:end] = [(style_id + 1) % 4 for style_id in reference[offset:end]]
+        assert len(runs) == len(reference)
+        assert expand(runs) == reference
+        # Equal neighbours are always merged
+        styles = [style_id for _, _, style_id in runs.iter_runs()]
+        assert all(a != b for a, b in zip(styles, styles[1:]))
+    for offset in range(len(reference)):
+        assert runs.style_at(offset) == reference[offset]
+
+
+def test_restyle_reports_changed_pieces():
+    runs = StyleRuns(10)
+    runs.restyle(2, 5, lambda style_id: 1)
+    changed = runs.restyle(0, 10, lambda style_id: 2 if style_id == 1 else style_id)
+    assert changed == [(2, 5, 1, 2)]
+
+
+def test_snapshot_is_independent():
+    runs = StyleRuns(5)
+    copy = runs.snapshot()
+    runs.insert(0, 3, 1)
+    assert expand(copy) == [0] * 5